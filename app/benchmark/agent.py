@@ -0,0 +1,368 @@
+"""Multi-turn tool-calling episodes for agent prompts.
+
+A prompt revision's agent_tools declares the tools the model may call:
+
+    [{"type": "calculator"},
+     {"type": "lookup", "name": "get_weather", "description": "Current weather by city",
+      "parameter": "city", "data": {"paris": "Sunny, 21C", "oslo": "Rain, 9C"}},
+     {"type": "python", "timeout": 5}]
+
+An episode sends the prompt with the tool definitions, runs the tool calls of each reply locally,
+sends their results back and repeats until the model answers without calling a tool, or gives up
+after AGENT_MAX_STEPS model turns. Tool calls run in a thread pool shared by all episodes
+(AGENT_TOOL_WORKERS threads); the calls of one turn run concurrently and each is cut off after
+AGENT_TOOL_TIMEOUT seconds. At most AGENT_CONCURRENCY episodes run at once. Per-step latency,
+tokens and tool time are kept in the run's run_metadata["agent"].
+"""
+import ast
+import asyncio
+import json
+import operator
+import os
+import shutil
+import tempfile
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from benchmark import code_execution
+import metrics
+
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "8"))
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "10"))
+AGENT_TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", str(os.cpu_count() or 4)))
+AGENT_TOOL_TIMEOUT = float(os.getenv("AGENT_TOOL_TIMEOUT", "10"))
+# Tool output beyond this many characters is cut before it goes back to the model
+TOOL_OUTPUT_CHARS = 4000
+
+
+class ToolError(Exception):
+    """A tool call the tool refused; the message goes back to the model as the call's result"""
+
+
+TOOLS: Dict[str, type] = {}
+
+
+def register(name: str):
+    def decorator(cls):
+        cls.type_name = name
+        TOOLS[name] = cls
+        return cls
+    return decorator
+
+
+class Tool:
+    """One callable tool. Subclasses validate their options in __init__ and run a call in call()"""
+
+    description = ""
+    parameters: Dict[str, Any] = {"type": "object", "properties": {}}
+    # Whether it executes model-written code, which needs CODE_EXECUTION=true
+    runs_code = False
+
+    def __init__(self, name: str = None, description: str = None):
+        self.name = name or self.type_name
+        if description:
+            self.description = description
+
+    def definition(self) -> Dict[str, Any]:
+        return {"type": "function", "function": {
+            "name": self.name, "description": self.description, "parameters": self.parameters,
+        }}
+
+    def call(self, arguments: Dict[str, Any]) -> str:
+        """Run in a worker thread; raise ToolError for bad arguments"""
+        raise NotImplementedError
+
+
+_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+    ast.USub: operator.neg, ast.UAdd: operator.pos,
+}
+# Big-int arithmetic holds the GIL, so integer results are bounded before they are computed
+MAX_RESULT_BITS = 4096
+
+
+@register("calculator")
+class Calculator(Tool):
+    description = "Evaluate an arithmetic expression with + - * / // % ** and parentheses"
+    parameters = {
+        "type": "object",
+        "properties": {"expression": {"type": "string", "examples": ["2 * (3 + 4)"]}},
+        "required": ["expression"],
+    }
+
+    def call(self, arguments):
+        try:
+            tree = ast.parse(str(arguments.get("expression", "")), mode="eval")
+        except SyntaxError as e:
+            raise ToolError(f"Invalid expression: {e.msg}")
+        value = self._evaluate(tree.body)
+        return str(int(value) if isinstance(value, float) and value.is_integer() else value)
+
+    def _evaluate(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](self._evaluate(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            left, right = self._evaluate(node.left), self._evaluate(node.right)
+            if _result_bits(node.op, left, right) > MAX_RESULT_BITS:
+                raise ToolError("Result too large")
+            try:
+                return _OPERATORS[type(node.op)](left, right)
+            except ZeroDivisionError:
+                raise ToolError("Division by zero")
+            except OverflowError:
+                raise ToolError("Result too large")
+        raise ToolError(f"Unsupported syntax: {ast.dump(node)[:80]}")
+
+
+def _result_bits(op, left, right) -> int:
+    """Upper bound on the bit length of an integer product or power; 0 for everything else"""
+    if not (isinstance(left, int) and isinstance(right, int)):
+        return 0
+    if isinstance(op, ast.Pow):
+        return left.bit_length() * abs(right)
+    if isinstance(op, ast.Mult):
+        return left.bit_length() + right.bit_length()
+    return 0
+
+
+@register("lookup")
+class Lookup(Tool):
+    """Answers from a fixed table, matched case-insensitively; stands in for search or API tools"""
+
+    def __init__(self, name: str, data: Dict[str, Any], parameter: str = "key", description: str = None):
+        if not isinstance(data, dict) or not data:
+            raise ValueError("'data' must be a non-empty mapping")
+        super().__init__(name, description or f"Look up a value by {parameter}")
+        self.parameter = parameter
+        self.data = {str(key).strip().lower(): value for key, value in data.items()}
+        self.parameters = {
+            "type": "object",
+            "properties": {parameter: {"type": "string", "examples": [next(iter(data))]}},
+            "required": [parameter],
+        }
+
+    def call(self, arguments):
+        key = str(arguments.get(self.parameter, "")).strip().lower()
+        if key not in self.data:
+            raise ToolError(f"No entry for {key!r}")
+        value = self.data[key]
+        return value if isinstance(value, str) else json.dumps(value)
+
+
+@register("python")
+class Python(Tool):
+    """Runs a snippet through code_execution, with the code evaluator's resource limits"""
+
+    runs_code = True
+    description = "Run a Python 3 program and return what it prints"
+    parameters = {
+        "type": "object",
+        "properties": {"code": {"type": "string", "examples": ["print(sum(range(10)))"]}},
+        "required": ["code"],
+    }
+
+    def __init__(self, name: str = None, description: str = None, timeout: float = None):
+        super().__init__(name, description)
+        # Never outlive the call's own deadline, so a timed-out call frees its worker thread
+        self.timeout = min(float(timeout), AGENT_TOOL_TIMEOUT) if timeout is not None else AGENT_TOOL_TIMEOUT
+
+    def call(self, arguments):
+        try:
+            code_execution.check_enabled()
+        except ValueError as e:
+            raise ToolError(str(e))
+        workdir = tempfile.mkdtemp(prefix="bench-agent-")
+        try:
+            result = code_execution.run(["-c", str(arguments.get("code", ""))], self.timeout, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if result.timed_out:
+            raise ToolError(f"Timed out after {self.timeout:g}s")
+        output = result.stdout.decode("utf-8", "replace")
+        if result.returncode != 0:
+            lines = result.stderr.decode("utf-8", "replace").strip().splitlines()
+            raise ToolError(output + (lines[-1] if lines else f"Exited with status {result.returncode}"))
+        return output
+
+
+class ToolSet:
+    """The tools of one agent_tools config, by name"""
+
+    def __init__(self, tools: List[Tool]):
+        self.tools = {tool.name: tool for tool in tools}
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        return [tool.definition() for tool in self.tools.values()]
+
+    async def call(self, name: str, raw_arguments: str) -> Dict[str, Any]:
+        """Run one tool call in the worker pool: {"name", "ms", "outcome", "output"}"""
+        start = time.perf_counter()
+        tool = self.tools.get(name)
+        try:
+            if tool is None:
+                raise ToolError(f"Unknown tool {name!r}; available: {', '.join(self.tools)}")
+            try:
+                arguments = json.loads(raw_arguments or "{}")
+            except ValueError as e:
+                raise ToolError(f"Arguments are not valid JSON: {e}")
+            if not isinstance(arguments, dict):
+                raise ToolError("Arguments must be a JSON object")
+            loop = asyncio.get_running_loop()
+            output = await asyncio.wait_for(
+                loop.run_in_executor(_tool_pool(), tool.call, arguments), AGENT_TOOL_TIMEOUT
+            )
+            outcome = "ok"
+        except asyncio.TimeoutError:
+            output, outcome = f"Error: timed out after {AGENT_TOOL_TIMEOUT:g}s", "timeout"
+        except ToolError as e:
+            output, outcome = f"Error: {e}", "error"
+        except Exception as e:
+            output, outcome = f"Error: {type(e).__name__}: {e}", "error"
+        elapsed = time.perf_counter() - start
+        metrics.agent_tool_seconds.observe(elapsed, tool=name)
+        metrics.agent_tool_calls.inc(tool=name, outcome=outcome)
+        return {"name": name, "ms": round(elapsed * 1000, 1), "outcome": outcome, "output": output[:TOOL_OUTPUT_CHARS]}
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _tool_pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+    return _executor
+
+
+# One pool of episode slots per event loop, shared by every suite
+_episode_slots = weakref.WeakKeyDictionary()
+
+
+def episode_slot() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _episode_slots:
+        _episode_slots[loop] = asyncio.Semaphore(AGENT_CONCURRENCY)
+    return _episode_slots[loop]
+
+
+def build(config) -> ToolSet:
+    """ToolSet for an agent_tools config; raises ValueError if invalid"""
+    specs = config if isinstance(config, list) else [config]
+    if not specs:
+        raise ValueError("Agent tools config has no tools")
+    tools = []
+    for spec in specs:
+        if not isinstance(spec, dict) or "type" not in spec:
+            raise ValueError(f"Each tool needs a 'type', got {spec!r}")
+        if spec["type"] not in TOOLS:
+            raise ValueError(f"Unknown tool '{spec['type']}'; available: {', '.join(TOOLS)}")
+        try:
+            tools.append(TOOLS[spec["type"]](**{key: value for key, value in spec.items() if key != "type"}))
+        except TypeError as e:
+            raise ValueError(f"Bad options for '{spec['type']}': {e}")
+    names = [tool.name for tool in tools]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Tool names must be unique; repeated: {', '.join(duplicates)}")
+    return ToolSet(tools)
+
+
+def parse_config(value) -> Optional[Any]:
+    """Validated agent_tools from form text (JSON) or an already decoded object; None if empty"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError as e:
+            raise ValueError(f"Agent tools config is not valid JSON: {e}")
+    if any(tool.runs_code for tool in build(value).tools.values()):
+        code_execution.check_enabled()
+    return value
+
+
+async def run_episode(client, model_name: str, prompt_content: Union[str, List[Dict[str, Any]]], tools: ToolSet,
+                      calculate_cost: Callable[..., float]) -> Dict[str, Any]:
+    """One tool-calling episode from the first user message's content; returns a run result dict with run_metadata["agent"]"""
+    messages: List[Dict[str, Any]] = [{"role": "user", "content": prompt_content}]
+    steps: List[Dict[str, Any]] = []
+    totals = {"input_tokens": 0, "output_tokens": 0, "cached_input_tokens": 0, "cost_usd": 0.0}
+    start = time.perf_counter()
+    response_text, stop_reason = None, "max_steps"
+
+    for step in range(1, AGENT_MAX_STEPS + 1):
+        step_start = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                tools=tools.definitions(),
+                max_tokens=8192,
+                temperature=0.7,
+            )
+        except Exception as e:
+            metrics.provider_request_seconds.observe(time.perf_counter() - step_start, model=model_name)
+            metrics.errors.inc(stage="generation", model=model_name)
+            response_text, stop_reason = f"Error: {str(e)}", "error"
+            break
+        latency = time.perf_counter() - step_start
+        metrics.provider_request_seconds.observe(latency, model=model_name)
+
+        usage = response.usage
+        input_tokens = usage.prompt_tokens if usage else 0
+        output_tokens = usage.completion_tokens if usage else 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_input_tokens = getattr(details, "cached_tokens", None) or 0
+        cost_usd = calculate_cost(model_name, input_tokens, output_tokens, cached_input_tokens)
+        metrics.tokens.inc(input_tokens, model=model_name, direction="input")
+        metrics.tokens.inc(output_tokens, model=model_name, direction="output")
+        metrics.tokens.inc(cached_input_tokens, model=model_name, direction="cached_input")
+        metrics.cost_usd.inc(cost_usd, model=model_name)
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cached_input_tokens"] += cached_input_tokens
+        totals["cost_usd"] += cost_usd
+
+        message = response.choices[0].message
+        record = {"step": step, "latency_ms": round(latency * 1000, 1),
+                  "input_tokens": input_tokens, "output_tokens": output_tokens}
+        steps.append(record)
+        if not message.tool_calls:
+            response_text, stop_reason = message.content or "", "answer"
+            break
+
+        messages.append({"role": "assistant", "content": message.content, "tool_calls": [
+            {"id": call.id, "type": "function",
+             "function": {"name": call.function.name, "arguments": call.function.arguments}}
+            for call in message.tool_calls
+        ]})
+        tools_start = time.perf_counter()
+        results = await asyncio.gather(*(
+            tools.call(call.function.name, call.function.arguments) for call in message.tool_calls
+        ))
+        record["tool_ms"] = round((time.perf_counter() - tools_start) * 1000, 1)
+        record["tool_calls"] = [{key: result[key] for key in ("name", "ms", "outcome")} for result in results]
+        for call, result in zip(message.tool_calls, results):
+            messages.append({"role": "tool", "tool_call_id": call.id, "content": result["output"]})
+
+    if stop_reason == "max_steps":
+        response_text = f"Error: no final answer after {AGENT_MAX_STEPS} steps"
+    metrics.agent_steps.observe(len(steps), stop_reason=stop_reason)
+
+    return {
+        "response_text": response_text,
+        **totals,
+        "run_time_ms": int((time.perf_counter() - start) * 1000),
+        "run_metadata": {"agent": {
+            "stop_reason": stop_reason,
+            "steps": steps,
+            "tool_calls": sum(len(step.get("tool_calls", [])) for step in steps),
+            "tool_time_ms": round(sum(step.get("tool_ms", 0) for step in steps), 1),
+            "model_time_ms": round(sum(step["latency_ms"] for step in steps), 1),
+        }},
+    }
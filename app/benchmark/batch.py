@@ -0,0 +1,348 @@
+"""Provider batch API mode for non-urgent queue items.
+
+Pending items with is_urgent=False are grouped by endpoint and API key, written as one JSONL
+file of chat completion requests per group (one line per run, custom_id "q<item>-r<run>"),
+uploaded through the files API and submitted as a batch. The worker polls open batches every
+BATCH_POLL_SECONDS; once a batch finishes, its output and error files are ingested into a suite
+per queue item and the worker scores them like any other suite.
+
+Batch suites run a fixed number of runs (the adaptive maximum for adaptive items, since a
+second round trip would wait for another completion window) and are priced at the pricing
+table's batch discount. Per-request latency is not reported by batch APIs, so run_time_ms is
+left empty. If a group cannot be submitted, its items fall back to the regular worker, as do
+agent prompts, whose episodes need each reply before the next request.
+
+Ingested items are committed as "running" before they are scored. If the service stops in between,
+recover() finds them and their suites at the next start so that scoring resumes where it stopped.
+"""
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import crud, models
+from benchmark import budget, images, scheduling
+from benchmark.pricing import get_pricing
+from benchmark.sampling import max_runs
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+# OpenAI's per-batch request limit
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+
+ENDPOINT = "/v1/chat/completions"
+OPEN_STATUSES = ("submitted", "validating", "in_progress", "finalizing", "cancelling")
+# Statuses after which the provider has produced all the output it ever will
+DONE_STATUSES = ("completed", "expired", "cancelled")
+
+
+def build_requests(item: models.RunQueue, content=None) -> List[Dict]:
+    """Batch input lines for one queue item, matching BenchmarkRunner.run_benchmark's request.
+
+    content is the user message content when it differs from the prompt text (prompts with images).
+    """
+    return [
+        {
+            "custom_id": f"q{item.id}-r{run_index}",
+            "method": "POST",
+            "url": ENDPOINT,
+            "body": {
+                "model": item.model.name,
+                "messages": [{"role": "user", "content": content or item.prompt_revision.content}],
+                "max_tokens": 8192,
+                "temperature": 0.7,
+            },
+        }
+        for run_index in range(1, max_runs(item.sampling_mode or "fixed") + 1)
+    ]
+
+
+def _parse_custom_id(custom_id: str) -> Tuple[int, int]:
+    item_part, run_part = custom_id.split("-")
+    return int(item_part[1:]), int(run_part[1:])
+
+
+def _jsonl(rows: List[Dict]) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+
+async def submit_pending(db: Session, runner) -> List[models.RunQueue]:
+    """Submit every pending non-urgent item; returns the items whose status changed"""
+    items = (
+        db.query(models.RunQueue)
+        .filter(models.RunQueue.status == "pending", models.RunQueue.is_urgent.is_(False))
+        .order_by(models.RunQueue.created_at)
+        .all()
+    )
+    # Tool-calling episodes need a reply before the next request, so a batch cannot carry them
+    for item in [item for item in items if item.prompt_revision.agent_tools]:
+        item.is_urgent = True
+        item.status_reason = "Agent prompts run through the worker"
+        items.remove(item)
+    if not items:
+        db.commit()
+        return []
+
+    admitted, over_budget = budget.admit(db, items, len(items))
+    for item in over_budget:
+        item.status = "paused"
+
+    # Requests sharing a prompt prefix sit next to each other in the file (see benchmark.scheduling)
+    groups: Dict[Tuple[str, str], List[models.RunQueue]] = defaultdict(list)
+    for item in scheduling.order_for_cache(admitted):
+        groups[(item.model.api_endpoint, item.model.api_key_name)].append(item)
+
+    for (base_url, api_key_name), group in groups.items():
+        # Split groups that would exceed the provider's per-batch request limit
+        chunk, lines = [], []
+        for item in group:
+            content = None
+            if item.prompt_revision.attachments:
+                encoded, _ = await images.prepare(item.prompt_revision.attachments)
+                content = images.message_content(item.prompt_revision.content, encoded)
+            item_lines = build_requests(item, content)
+            if chunk and len(lines) + len(item_lines) > BATCH_MAX_REQUESTS:
+                await _submit(db, runner, base_url, api_key_name, chunk, lines)
+                chunk, lines = [], []
+            chunk.append(item)
+            lines.extend(item_lines)
+        await _submit(db, runner, base_url, api_key_name, chunk, lines)
+
+    db.commit()
+    return over_budget + admitted
+
+
+async def _submit(db: Session, runner, base_url: str, api_key_name: str,
+                  items: List[models.RunQueue], lines: List[Dict]) -> None:
+    provider_batch = models.ProviderBatch(base_url=base_url, api_key_name=api_key_name, request_count=len(lines))
+    db.add(provider_batch)
+    try:
+        client = runner.get_client({"api_endpoint": base_url, "api_key_name": api_key_name})
+        input_file = await client.files.create(file=("benchmark-batch.jsonl", _jsonl(lines)), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata={"queue_items": ",".join(str(item.id) for item in items)[:500]},
+        )
+    except Exception as e:
+        logger.warning(f"Batch submission to {base_url or 'default endpoint'} failed, running {len(items)} items directly: {e}")
+        metrics.errors.inc(stage="batch", model="")
+        provider_batch.status = "failed"
+        provider_batch.error = str(e)
+        for item in items:
+            item.is_urgent = True
+            item.status_reason = f"Batch submission failed: {e}"
+        return
+
+    provider_batch.provider_batch_id = batch.id
+    provider_batch.input_file_id = input_file.id
+    provider_batch.status = batch.status
+    for item in items:
+        item.status = "batched"
+        item.status_reason = f"Provider batch {batch.id}"
+        item.started_at = models.func.now()
+        item.provider_batch = provider_batch
+    logger.info(f"Submitted batch {batch.id} with {len(lines)} requests for {len(items)} queue items")
+
+
+async def _read_file(client, file_id: str) -> List[Dict]:
+    if not file_id:
+        return []
+    content = await client.files.content(file_id)
+    return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+
+def _run_result(line: Dict, model_name: str, provider_batch_id: str) -> Dict:
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    run_metadata = {"execution": "batch", "provider_batch_id": provider_batch_id}
+    if response.get("status_code") == 200 and body.get("choices"):
+        usage = body.get("usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        cost = get_pricing().cost(model_name, input_tokens, output_tokens, cached, batch=True)
+        metrics.tokens.inc(input_tokens, model=model_name, direction="input")
+        metrics.tokens.inc(output_tokens, model=model_name, direction="output")
+        metrics.tokens.inc(cached, model=model_name, direction="cached_input")
+        metrics.cost_usd.inc(cost, model=model_name)
+        return {
+            "response_text": body["choices"][0]["message"]["content"],
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_input_tokens": cached,
+            "cost_usd": cost,
+            "run_time_ms": None,
+            "run_metadata": run_metadata,
+        }
+
+    error = line.get("error") or body.get("error") or {}
+    message = error.get("message") if isinstance(error, dict) else str(error)
+    metrics.errors.inc(stage="generation", model=model_name)
+    return _failed_run(message or f"HTTP {response.get('status_code')}", run_metadata)
+
+
+def _failed_run(message: str, run_metadata: Dict) -> Dict:
+    return {
+        "response_text": f"Error: {message}",
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cost_usd": 0.0,
+        "run_time_ms": None,
+        "run_metadata": run_metadata,
+    }
+
+
+async def poll(db: Session, runner) -> List[Tuple[models.RunQueue, models.BenchmarkSuite]]:
+    """Check open batches and ingest finished ones.
+
+    Returns (queue item, suite) pairs whose runs are saved and now need scoring; the items are
+    left in "running". Items of batches the provider failed go back to the regular worker.
+    """
+    ready = []
+    open_batches = db.query(models.ProviderBatch).filter(models.ProviderBatch.status.in_(OPEN_STATUSES)).all()
+    for provider_batch in open_batches:
+        client = runner.get_client({"api_endpoint": provider_batch.base_url, "api_key_name": provider_batch.api_key_name})
+        try:
+            batch = await client.batches.retrieve(provider_batch.provider_batch_id)
+        except Exception as e:
+            logger.warning(f"Could not poll batch {provider_batch.provider_batch_id}: {e}")
+            metrics.errors.inc(stage="batch", model="")
+            continue
+
+        provider_batch.status = batch.status
+        if batch.request_counts:
+            provider_batch.completed_count = batch.request_counts.completed
+            provider_batch.failed_count = batch.request_counts.failed
+        provider_batch.output_file_id = batch.output_file_id
+        provider_batch.error_file_id = batch.error_file_id
+
+        if batch.status == "failed":
+            errors = getattr(batch, "errors", None)
+            provider_batch.error = str(errors.data if errors else "Batch failed")
+            provider_batch.completed_at = datetime.utcnow()
+            for item in provider_batch.queue_items:
+                item.status = "pending"
+                item.is_urgent = True
+                item.status_reason = f"Provider batch failed: {provider_batch.error}"
+            logger.warning(f"Batch {batch.id} failed, running its items directly: {provider_batch.error}")
+            db.commit()
+            continue
+        if batch.status not in DONE_STATUSES:
+            db.commit()
+            continue
+
+        try:
+            lines = await _read_file(client, batch.output_file_id) + await _read_file(client, batch.error_file_id)
+        except Exception as e:
+            logger.warning(f"Could not download results of batch {batch.id}: {e}")
+            metrics.errors.inc(stage="batch", model="")
+            provider_batch.status = "in_progress"
+            db.commit()
+            continue
+
+        ready.extend(_ingest(db, runner, provider_batch, lines))
+        provider_batch.completed_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"Ingested batch {batch.id} ({batch.status}): {len(lines)} results")
+    return ready
+
+
+def _ingest(db: Session, runner, provider_batch: models.ProviderBatch,
+            lines: List[Dict]) -> List[Tuple[models.RunQueue, models.BenchmarkSuite]]:
+    by_item: Dict[int, Dict[int, Dict]] = defaultdict(dict)
+    for line in lines:
+        try:
+            item_id, run_index = _parse_custom_id(line["custom_id"])
+        except (KeyError, ValueError):
+            logger.warning(f"Ignoring batch result with unexpected custom_id: {line.get('custom_id')!r}")
+            continue
+        by_item[item_id][run_index] = line
+
+    ready = []
+    for item in provider_batch.queue_items:
+        run_count = max_runs(item.sampling_mode or "fixed")
+        model_name = item.model.name
+        run_results = []
+        for run_index in range(1, run_count + 1):
+            line = by_item[item.id].get(run_index)
+            if line is None:
+                result = _failed_run(f"No result in batch ({provider_batch.status})",
+                                     {"execution": "batch", "provider_batch_id": provider_batch.provider_batch_id})
+            else:
+                result = _run_result(line, model_name, provider_batch.provider_batch_id)
+            result["run_index"] = run_index
+            run_results.append(result)
+
+        suite = crud.create_benchmark_suite(db, item.prompt_revision_id, item.model_id, run_count=run_count)
+        suite.status = "running"
+        runner.save_suite_results(db, suite.id, run_results, complete=False)
+        for result in run_results:
+            runner.publish_run(suite.id, model_name, run_count, result)
+
+        item.status = "running"
+        item.status_reason = None
+        ready.append((item, suite))
+    return ready
+
+
+def recover(db: Session) -> List[Tuple[models.RunQueue, models.BenchmarkSuite]]:
+    """(queue item, suite) pairs of ingested batch items that a restart left unscored.
+
+    Only call this before the worker starts scoring, as every such item still "running" is taken
+    to be orphaned. Items whose suite cannot be found go back to the regular worker.
+    """
+    items = (
+        db.query(models.RunQueue)
+        .join(models.ProviderBatch)
+        .filter(
+            models.RunQueue.status == "running",
+            models.RunQueue.is_urgent.is_(False),
+            models.ProviderBatch.status.in_(DONE_STATUSES),
+        )
+        .order_by(models.RunQueue.id)
+        .all()
+    )
+    ready, claimed = [], set()
+    for item in items:
+        suite = _ingested_suite(db, item, claimed)
+        if suite is None:
+            item.status = "pending"
+            item.is_urgent = True
+            item.status_reason = "Batch results were not found after a restart"
+            logger.warning(f"Queue item {item.id} has no suite for batch {item.provider_batch.provider_batch_id}, running it directly")
+            continue
+        claimed.add(suite.id)
+        ready.append((item, suite))
+    db.commit()
+    if ready:
+        logger.info(f"Resuming scoring of {len(ready)} batched queue items")
+    return ready
+
+
+def _ingested_suite(db: Session, item: models.RunQueue, claimed) -> Optional[models.BenchmarkSuite]:
+    """The unfinished suite _ingest saved the item's batch results to, skipping suites in claimed"""
+    suites = (
+        db.query(models.BenchmarkSuite)
+        .filter(
+            models.BenchmarkSuite.model_id == item.model_id,
+            models.BenchmarkSuite.prompt_revision_id == item.prompt_revision_id,
+            models.BenchmarkSuite.status == "running",
+            models.BenchmarkSuite.id.notin_(claimed),
+        )
+        .order_by(models.BenchmarkSuite.id)
+        .all()
+    )
+    for suite in suites:
+        run = db.query(models.BenchmarkRun).filter(models.BenchmarkRun.suite_id == suite.id).first()
+        if run and (run.run_metadata or {}).get("provider_batch_id") == item.provider_batch.provider_batch_id:
+            return suite
+    return None
@@ -0,0 +1,275 @@
+"""Pre-flight cost estimates for queue items and the daily spend caps the queue worker enforces.
+
+Prompt tokens are counted with tiktoken when it is installed (chars / 4 otherwise). Output
+tokens come from the model's historical avg_output_tokens on this revision, then on any
+revision, then DEFAULT_OUTPUT_TOKENS. Caps: DAILY_BUDGET_USD across all models, and
+Model.daily_budget_usd (or MODEL_DAILY_BUDGET_USD as the default) per model. Days are UTC.
+Re-judge items are charged for their judge calls only. Items still in flight (in a provider batch,
+or running with their suite's cost not all recorded yet) count at their estimated cost.
+"""
+import os
+from datetime import datetime, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import models
+from benchmark.pricing import get_pricing
+from benchmark.sampling import FIXED_RUN_COUNT, max_runs
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_OUTPUT_TOKENS = 500
+DEFAULT_JUDGE_OUTPUT_TOKENS = 200
+# Queue items whose cost is committed but not (fully) recorded on a suite yet
+IN_FLIGHT_STATUSES = ("batched", "running")
+# The judge prompt wraps the original prompt, the response and the rubric in ~120 tokens of instructions
+JUDGE_OVERHEAD_TOKENS = 120
+
+_encodings = {}
+
+
+def count_tokens(text: str, model_name: str = "") -> int:
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+
+    name = model_name.rsplit("/", 1)[-1]
+    if name not in _encodings:
+        try:
+            _encodings[name] = tiktoken.encoding_for_model(name)
+        except KeyError:
+            _encodings[name] = tiktoken.get_encoding("o200k_base")
+    return len(_encodings[name].encode(text, disallowed_special=()))
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def daily_budget() -> Optional[float]:
+    return _env_float("DAILY_BUDGET_USD")
+
+
+def model_budget(model: models.Model) -> Optional[float]:
+    if model.daily_budget_usd is not None:
+        return model.daily_budget_usd
+    return _env_float("MODEL_DAILY_BUDGET_USD")
+
+
+def caps_configured(db: Session) -> bool:
+    if daily_budget() is not None or _env_float("MODEL_DAILY_BUDGET_USD") is not None:
+        return True
+    return db.query(models.Model.id).filter(models.Model.daily_budget_usd.isnot(None)).first() is not None
+
+
+def spent_today(db: Session, estimator: "Estimator" = None) -> Tuple[float, Dict[int, float]]:
+    """(total, per model id) spend in USD on suites created since midnight UTC, judge calls included,
+    plus the estimated rest of every item in flight"""
+    midnight = datetime.combine(datetime.utcnow().date(), time.min)
+    suite = models.BenchmarkSuite
+    suite_cost = func.coalesce(suite.total_cost_usd, 0) + func.coalesce(suite.judge_cost_usd, 0)
+    rows = db.query(suite.model_id, func.sum(suite_cost)).filter(
+        suite.created_at >= midnight
+    ).group_by(suite.model_id).all()
+    per_model = {model_id: spent or 0.0 for model_id, spent in rows}
+
+    in_flight = db.query(models.RunQueue).filter(models.RunQueue.status.in_(IN_FLIGHT_STATUSES)).all()
+    if in_flight:
+        estimator = estimator or Estimator(db)
+        # What running items' open suites have recorded so far is already counted above
+        recorded: Dict[Tuple[int, int], float] = {}
+        for model_id, revision_id, spent in db.query(suite.model_id, suite.prompt_revision_id, suite_cost).filter(
+            suite.created_at >= midnight, suite.status.in_(("pending", "running"))
+        ):
+            recorded[(model_id, revision_id)] = recorded.get((model_id, revision_id), 0.0) + (spent or 0.0)
+        for item in in_flight:
+            already = recorded.pop((item.model_id, item.prompt_revision_id), 0.0)
+            remaining = max(0.0, item_cost(estimator, item) - already)
+            per_model[item.model_id] = per_model.get(item.model_id, 0.0) + remaining
+    return sum(per_model.values()), per_model
+
+
+class Estimator:
+    """Estimates suite costs, caching the historical averages it looks up"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.pricing = get_pricing()
+        self._output_tokens: Dict[Tuple[int, Optional[int]], Optional[float]] = {}
+        self._judge_output_tokens: Dict[str, Optional[float]] = {}
+
+    def expected_output_tokens(self, model_id: int, revision_id: int) -> float:
+        for key in ((model_id, revision_id), (model_id, None)):
+            if key not in self._output_tokens:
+                query = self.db.query(func.avg(models.BenchmarkSuite.avg_output_tokens)).filter(
+                    models.BenchmarkSuite.model_id == model_id,
+                    models.BenchmarkSuite.avg_output_tokens > 0,
+                )
+                if key[1] is not None:
+                    query = query.filter(models.BenchmarkSuite.prompt_revision_id == revision_id)
+                self._output_tokens[key] = query.scalar()
+            if self._output_tokens[key]:
+                return self._output_tokens[key]
+        return DEFAULT_OUTPUT_TOKENS
+
+    def expected_judge_output_tokens(self, judge_model: str) -> float:
+        if judge_model not in self._judge_output_tokens:
+            average = self.db.query(func.avg(models.JudgeScore.output_tokens)).filter(
+                models.JudgeScore.judge_model == judge_model,
+                models.JudgeScore.output_tokens > 0,
+            ).scalar()
+            if average is None:
+                # Runs judged before verdicts were stored per judge
+                average = self.db.query(func.avg(models.BenchmarkRun.judge_output_tokens)).filter(
+                    models.BenchmarkRun.judge_model == judge_model,
+                    models.BenchmarkRun.judge_output_tokens > 0,
+                ).scalar()
+            self._judge_output_tokens[judge_model] = average
+        return self._judge_output_tokens[judge_model] or DEFAULT_JUDGE_OUTPUT_TOKENS
+
+    def estimate(self, model: models.Model, revision: models.PromptRevision, judge_models: List[str] = (),
+                 run_count: int = FIXED_RUN_COUNT, batch: bool = False, generate: bool = True) -> Dict[str, float]:
+        """Cost of a suite; generate=False prices only the judge calls, as for a re-judge"""
+        input_tokens = count_tokens(revision.content, model.name)
+        output_tokens = self.expected_output_tokens(model.id, revision.id)
+        generation = 0.0
+        if generate:
+            generation = run_count * self.pricing.cost(model.name, input_tokens, output_tokens, batch=batch)
+
+        judge = 0.0
+        # Revisions with local checks are scored without judge calls
+        if revision.rubric_prompt and not revision.evaluator_config:
+            for judge_model in judge_models:
+                judge_input = (JUDGE_OVERHEAD_TOKENS + input_tokens + output_tokens
+                               + count_tokens(revision.rubric_prompt, judge_model))
+                judge += run_count * self.pricing.cost(
+                    judge_model, judge_input, self.expected_judge_output_tokens(judge_model)
+                )
+
+        return {
+            "priced": self.pricing.price(model.name) is not None,
+            "input_tokens": input_tokens * run_count,
+            "output_tokens": round(output_tokens * run_count),
+            "generation_usd": generation,
+            "judge_usd": judge,
+            "total_usd": generation + judge,
+        }
+
+
+def estimate_targets(db: Session, targets: Iterable[Tuple[models.Model, models.PromptRevision]],
+                     judge_models: List[str] = (), sampling_mode: str = "fixed", batch: bool = False) -> Dict:
+    """Estimated spend for queueing a suite for every (model, revision) pair, with today's budget state.
+
+    Adaptive suites are estimated at their maximum run count; batch generation at the batch discount.
+    """
+    run_count = max_runs(sampling_mode)
+    estimator = Estimator(db)
+    totals = {"suites": 0, "runs": 0, "input_tokens": 0, "output_tokens": 0,
+              "generation_usd": 0.0, "judge_usd": 0.0, "total_usd": 0.0}
+    per_model: Dict[str, float] = {}
+    unpriced = set()
+    for model, revision in targets:
+        estimate = estimator.estimate(model, revision, judge_models, run_count, batch)
+        totals["suites"] += 1
+        totals["runs"] += run_count
+        for key in ("input_tokens", "output_tokens", "generation_usd", "judge_usd", "total_usd"):
+            totals[key] += estimate[key]
+        per_model[model.name] = per_model.get(model.name, 0.0) + estimate["total_usd"]
+        if not estimate["priced"]:
+            unpriced.add(model.name)
+
+    spent, _ = spent_today(db, estimator)
+    cap = daily_budget()
+    return {
+        **totals,
+        "per_model_usd": per_model,
+        "unpriced_models": sorted(unpriced),
+        "spent_today_usd": spent,
+        "daily_budget_usd": cap,
+        "exceeds_daily_budget": cap is not None and spent + totals["total_usd"] > cap,
+    }
+
+
+def item_cost(estimator: Estimator, item: models.RunQueue) -> float:
+    """Estimated cost of a queue item: a whole suite, or only the judge calls for a re-judge"""
+    judges = [name for name, _ in item.judges]
+    if item.job_type == "rejudge":
+        run_count = item.source_suite.run_count if item.source_suite else FIXED_RUN_COUNT
+        return estimator.estimate(item.model, item.prompt_revision, judges, run_count, generate=False)["total_usd"]
+    return estimator.estimate(
+        item.model, item.prompt_revision, judges, max_runs(item.sampling_mode), batch=item.is_urgent is False,
+    )["total_usd"]
+
+
+def admit(db: Session, items: List[models.RunQueue], limit: int,
+          rejudge_limit: int = 0) -> Tuple[List[models.RunQueue], List[models.RunQueue]]:
+    """Split pending items into up to `limit` to run now (plus up to `rejudge_limit` re-judges) and
+    those that would break a daily cap.
+
+    The caller marks the second list as paused. Items admitted earlier in the same call count
+    against the caps, so one batch cannot overshoot them together.
+    """
+    limits = {"generate": limit, "rejudge": rejudge_limit}
+    counts = {"generate": 0, "rejudge": 0}
+    capped = caps_configured(db)
+    if capped:
+        estimator = Estimator(db)
+        spent, per_model = spent_today(db, estimator)
+        cap = daily_budget()
+    admitted, over_budget = [], []
+    for item in items:
+        kind = "rejudge" if item.job_type == "rejudge" else "generate"
+        if counts[kind] >= limits[kind]:
+            continue
+        if capped:
+            cost = item_cost(estimator, item)
+            reason = _over_cap(item.model, cost, spent, per_model.get(item.model_id, 0.0), cap)
+            if reason:
+                item.status_reason = reason
+                over_budget.append(item)
+                continue
+            spent += cost
+            per_model[item.model_id] = per_model.get(item.model_id, 0.0) + cost
+        admitted.append(item)
+        counts[kind] += 1
+    return admitted, over_budget
+
+
+def resumable(db: Session, items: List[models.RunQueue]) -> List[models.RunQueue]:
+    """Paused items that fit within today's caps again (new day, raised cap or cheaper prices)"""
+    if not items:
+        return []
+    if not caps_configured(db):
+        return items
+
+    estimator = Estimator(db)
+    spent, per_model = spent_today(db, estimator)
+    cap = daily_budget()
+    fits = []
+    for item in items:
+        cost = item_cost(estimator, item)
+        if not _over_cap(item.model, cost, spent, per_model.get(item.model_id, 0.0), cap):
+            fits.append(item)
+            spent += cost
+            per_model[item.model_id] = per_model.get(item.model_id, 0.0) + cost
+    return fits
+
+
+def _usd(value: float) -> str:
+    return f"${value:,.2f}" if value >= 1 else f"${value:.4f}"
+
+
+def _over_cap(model: models.Model, cost: float, spent: float, model_spent: float, cap: Optional[float]) -> Optional[str]:
+    if cap is not None and spent + cost > cap:
+        return f"Daily budget of {_usd(cap)} reached ({_usd(spent)} spent, next suite ~{_usd(cost)})"
+    model_cap = model_budget(model)
+    if model_cap is not None and model_spent + cost > model_cap:
+        return f"Daily budget of {_usd(model_cap)} for {model.name} reached ({_usd(model_spent)} spent)"
+    return None
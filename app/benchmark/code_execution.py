@@ -0,0 +1,131 @@
+"""Running model-written Python in a child process, for code tests and the agent python tool.
+
+Nothing runs unless CODE_EXECUTION=true. This is not a sandbox: the code runs as the service's
+user, can read whatever that user can (the .env file and the database included) and can reach the
+network. Enable it only for models and prompts you trust with the machine, or run the service in a
+container or VM of its own.
+
+What it does bound is resource use. A small launcher sets rlimits on CPU time, address space,
+processes (CODE_EVAL_MAX_PROCESSES), open files (CODE_EVAL_MAX_OPEN_FILES) and written file size
+(CODE_EVAL_MAX_FILE_MB), then execs the interpreter, so no preexec_fn runs in the multi-threaded
+server. The program gets a session and process group of its own, and the whole group is killed when
+it exits or times out, so background processes it started do not outlive it. RLIMIT_NPROC counts
+every process of the user and is not enforced for root, so run the service as a dedicated user.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+from typing import List, NamedTuple, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CODE_EXECUTION = os.getenv("CODE_EXECUTION", "false").lower() == "true"
+CODE_EVAL_MEMORY_MB = int(os.getenv("CODE_EVAL_MEMORY_MB", "512"))
+CODE_EVAL_MAX_PROCESSES = int(os.getenv("CODE_EVAL_MAX_PROCESSES", "256"))
+CODE_EVAL_MAX_OPEN_FILES = int(os.getenv("CODE_EVAL_MAX_OPEN_FILES", "64"))
+CODE_EVAL_MAX_FILE_MB = int(os.getenv("CODE_EVAL_MAX_FILE_MB", "16"))
+
+DISABLED_MESSAGE = "Code execution is disabled; set CODE_EXECUTION=true to run model-written code"
+
+# Applies "RLIMIT_<NAME>=<value>" arguments up to "--" (capped at the hard limits), then execs the rest
+_LAUNCHER = """\
+import os, resource, sys
+end = sys.argv.index("--")
+for spec in sys.argv[1:end]:
+    name, value = spec.split("=")
+    limit, value = getattr(resource, name), int(value)
+    hard = resource.getrlimit(limit)[1]
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(limit, (value, value))
+os.execv(sys.argv[end + 1], sys.argv[end + 1:])
+"""
+
+
+class Completed(NamedTuple):
+    returncode: Optional[int]
+    stdout: bytes
+    stderr: bytes
+    timed_out: bool = False
+
+
+def check_enabled() -> None:
+    """Raise ValueError unless code execution is switched on and possible here"""
+    if not CODE_EXECUTION:
+        raise ValueError(DISABLED_MESSAGE)
+    if resource is None or not hasattr(os, "killpg"):
+        raise ValueError("Code execution needs a POSIX system")
+
+
+def _command(python_args: List[str], timeout: float) -> List[str]:
+    cpu_seconds = int(timeout) + 1
+    limits = {
+        "RLIMIT_CPU": cpu_seconds,
+        "RLIMIT_AS": CODE_EVAL_MEMORY_MB * 1024 * 1024,
+        "RLIMIT_NPROC": CODE_EVAL_MAX_PROCESSES,
+        "RLIMIT_NOFILE": CODE_EVAL_MAX_OPEN_FILES,
+        "RLIMIT_FSIZE": CODE_EVAL_MAX_FILE_MB * 1024 * 1024,
+    }
+    return [sys.executable, "-I", "-S", "-c", _LAUNCHER, *(f"{name}={value}" for name, value in limits.items()),
+            "--", sys.executable, "-I", *python_args]
+
+
+def _env():
+    return {"PATH": os.environ.get("PATH", ""), "PYTHONDONTWRITEBYTECODE": "1"}
+
+
+def kill_group(pid: int) -> None:
+    """SIGKILL the process group led by pid, if any of it is still running"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_async(python_args: List[str], timeout: float, cwd: str, capture_stdout: bool = False) -> Completed:
+    """Run `python -I <python_args>` under the limits; the caller checks check_enabled first"""
+    process = await asyncio.create_subprocess_exec(
+        *_command(python_args, timeout),
+        cwd=cwd,
+        env=_env(),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        kill_group(process.pid)
+        await process.wait()
+        return Completed(None, b"", b"", timed_out=True)
+    finally:
+        kill_group(process.pid)
+    return Completed(process.returncode, stdout or b"", stderr or b"")
+
+
+def run(python_args: List[str], timeout: float, cwd: str, capture_stdout: bool = True) -> Completed:
+    """Blocking run_async, for worker threads"""
+    with subprocess.Popen(
+        _command(python_args, timeout),
+        cwd=cwd,
+        env=_env(),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    ) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_group(process.pid)
+            process.wait()
+            return Completed(None, b"", b"", timed_out=True)
+        finally:
+            kill_group(process.pid)
+    return Completed(process.returncode, stdout or b"", stderr or b"")
@@ -0,0 +1,92 @@
+"""How consistent a model's responses within one suite are.
+
+- response_similarity: mean pairwise Jaccard similarity of the responses' word 3-gram sets,
+  estimated from MinHash signatures. Comparing all pairs costs one (runs x runs x MINHASH_PERMUTATIONS)
+  array comparison, so it stays cheap at 50+ runs.
+- duplicate_rate: share of responses that repeat an earlier one once whitespace is normalized.
+  The same duplicate test lets the judge panel score each distinct response only once.
+- std_dev_output_tokens: spread of the response lengths.
+
+Failed runs ("Error: ..." responses) are left out. MinHash needs NumPy; without it
+response_similarity is None.
+"""
+import re
+import statistics
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MINHASH_PERMUTATIONS = 128
+SHINGLE_SIZE = 3
+# Universal hash family h(x) = (a * x + b) mod p over 32-bit shingle hashes. With a < 2^29 the
+# product stays below 2^61, so uint64 arithmetic cannot overflow.
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+if np is not None:
+    _rng = np.random.default_rng(20240601)
+    _A = _rng.integers(1, 1 << 29, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+    _B = _rng.integers(0, 1 << 32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_response(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def duplicate_of(texts: List[str]) -> List[Optional[int]]:
+    """For each text, the index of the first earlier text it duplicates, or None"""
+    first: Dict[str, int] = {}
+    result = []
+    for index, text in enumerate(texts):
+        key = normalize_response(text)
+        result.append(first.get(key))
+        first.setdefault(key, index)
+    return result
+
+
+def _shingles(text: str) -> "np.ndarray":
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64)
+
+
+def minhash_signatures(texts: List[str]) -> "np.ndarray":
+    """(len(texts), MINHASH_PERMUTATIONS) signatures; empty texts get all-max rows"""
+    signatures = np.full((len(texts), MINHASH_PERMUTATIONS), _MAX_HASH, dtype=np.uint64)
+    for row, text in enumerate(texts):
+        shingles = _shingles(text)
+        if len(shingles):
+            hashed = (shingles[:, None] * _A[None, :] + _B[None, :]) % np.uint64(_PRIME) & np.uint64(_MAX_HASH)
+            signatures[row] = hashed.min(axis=0)
+    return signatures
+
+
+def mean_pairwise_similarity(texts: List[str]) -> Optional[float]:
+    if np is None or len(texts) < 2:
+        return None
+    signatures = minhash_signatures(texts)
+    agreement = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+    upper = np.triu_indices(len(texts), k=1)
+    return float(agreement[upper].mean())
+
+
+def suite_consistency(texts: List[str], output_tokens: List[int]) -> Dict[str, Optional[float]]:
+    """Consistency metrics over the successful runs of a suite"""
+    ok = [i for i, text in enumerate(texts) if text and not text.startswith("Error:")]
+    texts = [texts[i] for i in ok]
+    lengths = [output_tokens[i] or 0 for i in ok]
+    if not texts:
+        return {"response_similarity": None, "duplicate_rate": None, "std_dev_output_tokens": None}
+    duplicates = sum(1 for first in duplicate_of(texts) if first is not None)
+    return {
+        "response_similarity": mean_pairwise_similarity(texts),
+        "duplicate_rate": duplicates / len(texts),
+        "std_dev_output_tokens": statistics.stdev(lengths) if len(lengths) > 1 else 0.0,
+    }
@@ -1,16 +1,195 @@
-from typing import Optional, Tuple, List
-import openai
+from typing import Dict, NamedTuple, Optional, Tuple, List
 import os
 import json
 import re
+import statistics
+import time
 import asyncio
+import weakref
+import logging
+import metrics
+import tracing
+from benchmark.pricing import get_pricing
+from benchmark import local_evaluators
+from benchmark.consistency import normalize_response
+from benchmark.local_evaluators import LocalResult
+
+logger = logging.getLogger(__name__)
+
+class JudgeResult(NamedTuple):
+    score: Optional[float]
+    reasoning: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    # Structured-output protocol of the last request, and "parsed", "repaired" or "failed"
+    protocol: Optional[str] = None
+    parse_outcome: Optional[str] = None
+
+class PanelResult(NamedTuple):
+    score: Optional[float]
+    reasoning: str
+    judge_results: List[JudgeResult]
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+
+AGGREGATIONS = ("mean", "median", "majority")
+# Scores at or above this count as a pass for majority voting
+PASS_THRESHOLD = 0.5
+
+JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", "25"))
+JUDGE_REQUESTS_PER_SECOND = float(os.getenv("JUDGE_REQUESTS_PER_SECOND", "0"))
+
+
+class RateLimiter:
+    """Caps concurrent judge calls and, optionally, how many start per second"""
+
+    def __init__(self, concurrency: int, requests_per_second: float = 0):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self._interval:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self._interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+# One limiter per event loop, shared by every judge of every panel
+_limiters = weakref.WeakKeyDictionary()
+
+
+def judge_limiter() -> RateLimiter:
+    loop = asyncio.get_running_loop()
+    if loop not in _limiters:
+        _limiters[loop] = RateLimiter(JUDGE_CONCURRENCY, JUDGE_REQUESTS_PER_SECOND)
+    return _limiters[loop]
+
+
+# Structured-output protocols in order of preference; JUDGE_PROTOCOL forces one of them
+JUDGE_PROTOCOLS = ("json_schema", "tools", "text")
+JUDGE_PROTOCOL = os.getenv("JUDGE_PROTOCOL", "auto")
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number", "minimum": 0, "maximum": 1},
+        "reasoning": {"type": "string"},
+    },
+    "required": ["score", "reasoning"],
+    "additionalProperties": False,
+}
+VERDICT_TOOL = "submit_verdict"
+
+REPAIR_PROMPT = (
+    "Your reply could not be parsed. Format your response as JSON with exactly two keys, "
+    '"score" (a number as given by the rubric) and "reasoning" (a string), and nothing else.'
+)
+
+# (base_url, judge model) -> protocol the endpoint accepted
+_protocols: Dict[Tuple[str, str], str] = {}
+
+
+def _protocol_options(protocol: str) -> Dict:
+    if protocol == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "verdict", "strict": True, "schema": VERDICT_SCHEMA},
+        }}
+    if protocol == "tools":
+        return {
+            "tools": [{"type": "function", "function": {
+                "name": VERDICT_TOOL,
+                "description": "Submit the score and reasoning for the evaluated response",
+                "parameters": VERDICT_SCHEMA,
+            }}],
+            "tool_choice": {"type": "function", "function": {"name": VERDICT_TOOL}},
+        }
+    return {}
+
+
+def _reply_text(message) -> str:
+    """The judge's answer: forced tool-call arguments if present, else the message text"""
+    if getattr(message, "tool_calls", None):
+        return message.tool_calls[0].function.arguments or ""
+    return message.content or ""
+
+
+def extract_verdict(text: str) -> Optional[Tuple[float, str]]:
+    """(score clipped to [0, 1], reasoning) from a judge reply, or None if there is no score in it.
+
+    Accepts bare JSON, JSON in a fenced code block or surrounded by prose, and as a last
+    resort a "score": n pair anywhere in the text.
+    """
+    if not text:
+        return None
+
+    candidates = [text.strip()]
+    candidates += re.findall(r"```(?:json|JSON)?\s*(.*?)```", text, re.DOTALL)
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        candidates.append(text[start:end + 1])
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+            score = float(data["score"])
+        except (ValueError, TypeError, KeyError):
+            continue
+        return max(0.0, min(1.0, score)), str(data.get("reasoning") or "No reasoning provided")
+
+    match = re.search(r'"?score"?\s*[:=]\s*([0-9]*\.?[0-9]+)', text)
+    if match:
+        return max(0.0, min(1.0, float(match.group(1)))), text
+    return None
+
+
+def aggregate_scores(scores: List[Optional[float]], aggregation: str = "mean") -> Optional[float]:
+    """Combine panel scores; judges that returned no score are left out"""
+    scores = [score for score in scores if score is not None]
+    if not scores:
+        return None
+    if aggregation == "median":
+        return statistics.median(scores)
+    if aggregation == "majority":
+        passes = sum(score >= PASS_THRESHOLD for score in scores)
+        fails = len(scores) - passes
+        return 1.0 if passes > fails else 0.0 if fails > passes else 0.5
+    return statistics.mean(scores)
+
+
+def judge_agreement(score_sets: List[List[Optional[float]]]) -> Optional[float]:
+    """1 - mean absolute difference between every pair of judges' scores on the same run.
+
+    1.0 means the judges always agree; None if no run was scored by two judges.
+    """
+    differences = []
+    for scores in score_sets:
+        scores = [score for score in scores if score is not None]
+        differences.extend(
+            abs(a - b) for i, a in enumerate(scores) for b in scores[i + 1:]
+        )
+    if not differences:
+        return None
+    return 1.0 - statistics.mean(differences)
+
 
 class LLMJudgeEvaluator:
     def __init__(self, judge_model: str = "gpt-4", judge_base_url: Optional[str] = None):
         self.judge_model = judge_model
         self.judge_base_url = judge_base_url or "https://openrouter.ai/api/v1"
         self.api_key = self._get_api_key()
-        self._semaphore = asyncio.Semaphore(5)
     
     def _get_api_key(self):
         if "localhost" in self.judge_base_url or "127.0.0.1" in self.judge_base_url:
@@ -18,18 +197,20 @@ class LLMJudgeEvaluator:
         return os.getenv("OPENROUTER_API_KEY")
     
     def get_client(self):
+        import openai
+
         return openai.AsyncOpenAI(
             api_key=self.api_key,
             base_url=self.judge_base_url
         )
     
-    async def evaluate_response(self, response_text: str, original_prompt: str, rubric_prompt: str) -> Tuple[Optional[float], str]:
-        async with self._semaphore:
+    async def evaluate_response(self, response_text: str, original_prompt: str, rubric_prompt: str) -> JudgeResult:
+        async with judge_limiter():
             if not response_text or response_text.startswith("Error:"):
-                return 0.0, "Response contains errors"
+                return JudgeResult(0.0, "Response contains errors")
             
             if not rubric_prompt:
-                return None, "No rubric provided"
+                return JudgeResult(None, "No rubric provided")
             
             judge_prompt = f"""You are an expert evaluator. Please evaluate the following response based on the given criteria.
 
@@ -52,38 +233,88 @@ Format your response as JSON:
     "reasoning": "Your detailed explanation here..."
 }}"""
 
+            messages = [{"role": "user", "content": judge_prompt}]
+            usage = [0, 0]
             try:
                 client = self.get_client()
-                response = await client.chat.completions.create(
-                    model=self.judge_model,
-                    messages=[{"role": "user", "content": judge_prompt}],
-                    max_tokens=8192,
-                    temperature=0.1
-                )
-                
-                judge_response = response.choices[0].message.content
-                
-                try:
-                    result = json.loads(judge_response)
-                    score = float(result.get("score", 0.0))
-                    reasoning = result.get("reasoning", "No reasoning provided")
-                    
-                    score = max(0.0, min(1.0, score))
-                    return score, reasoning
-                    
-                except (json.JSONDecodeError, ValueError):
-                    score_match = re.search(r'"?score"?\s*:\s*([0-9]*\.?[0-9]+)', judge_response)
-                    if score_match:
-                        score = float(score_match.group(1))
-                        score = max(0.0, min(1.0, score))
-                        return score, judge_response
-                    else:
-                        return None, f"Could not parse judge response: {judge_response}"
-                        
+                message, protocol = await self._request(client, messages, usage)
+                reply = _reply_text(message)
+                verdict = extract_verdict(reply)
+                outcome = "parsed"
+                if verdict is None:
+                    # One targeted repair request instead of re-running the evaluation
+                    metrics.retries.inc(stage="judge_repair", model=self.judge_model)
+                    messages += [
+                        {"role": "assistant", "content": reply},
+                        {"role": "user", "content": REPAIR_PROMPT},
+                    ]
+                    message, protocol = await self._request(client, messages, usage)
+                    repaired = _reply_text(message)
+                    verdict = extract_verdict(repaired)
+                    outcome = "repaired" if verdict else "failed"
+                    reply = repaired or reply
+
+                input_tokens, output_tokens = usage
+                cost_usd = get_pricing().cost(self.judge_model, input_tokens, output_tokens)
+                metrics.cost_usd.inc(cost_usd, model=self.judge_model)
+                metrics.judge_verdicts.inc(judge=self.judge_model, outcome=outcome)
+                usage = (input_tokens, output_tokens, cost_usd)
+
+                if verdict is None:
+                    metrics.errors.inc(stage="judge_parse", model=self.judge_model)
+                    return JudgeResult(None, f"Could not parse judge response: {reply}", *usage, protocol, outcome)
+                score, reasoning = verdict
+                return JudgeResult(score, reasoning, *usage, protocol, outcome)
+
             except Exception as e:
-                return None, f"Error during evaluation: {str(e)}"
-    
-    async def evaluate_responses_batch(self, evaluation_data: List[Tuple[str, str, str]]) -> List[Tuple[Optional[float], str]]:
+                metrics.errors.inc(stage="judge", model=self.judge_model)
+                return JudgeResult(None, f"Error during evaluation: {str(e)}")
+
+    async def _request(self, client, messages, usage: List[int]):
+        """Send a judge request with the best structured-output protocol the endpoint accepts.
+
+        Protocols are tried in JUDGE_PROTOCOLS order until one is not rejected, and the one that
+        worked is remembered per endpoint and judge. Adds the call's tokens to usage.
+        """
+        import openai
+
+        key = (self.judge_base_url, self.judge_model)
+        if JUDGE_PROTOCOL != "auto":
+            protocols = [JUDGE_PROTOCOL]
+        elif key in _protocols:
+            protocols = [_protocols[key]]
+        else:
+            protocols = list(JUDGE_PROTOCOLS)
+
+        for attempt, protocol in enumerate(protocols):
+            start_time = time.perf_counter()
+            try:
+                with tracing.span("judge.request", judge=self.judge_model, protocol=protocol):
+                    response = await client.chat.completions.create(
+                        model=self.judge_model,
+                        messages=messages,
+                        max_tokens=8192,
+                        temperature=0.1,
+                        **_protocol_options(protocol)
+                    )
+            except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+                if attempt == len(protocols) - 1:
+                    raise
+                metrics.retries.inc(stage="judge_protocol", model=self.judge_model)
+                logger.info(f"{self.judge_model} rejected {protocol} judge output, trying {protocols[attempt + 1]}: {e}")
+                continue
+            finally:
+                metrics.judge_request_seconds.observe(time.perf_counter() - start_time, judge=self.judge_model)
+
+            _protocols[key] = protocol
+            if response.usage:
+                usage[0] += response.usage.prompt_tokens
+                usage[1] += response.usage.completion_tokens
+                metrics.tokens.inc(response.usage.prompt_tokens, model=self.judge_model, direction="judge_input")
+                metrics.tokens.inc(response.usage.completion_tokens, model=self.judge_model, direction="judge_output")
+            return response.choices[0].message, protocol
+
+    async def evaluate_responses_batch(self, evaluation_data: List[Tuple[str, str, str]]) -> List[JudgeResult]:
         """Evaluate multiple responses concurrently"""
         tasks = []
         for response_text, original_prompt, rubric_prompt in evaluation_data:
@@ -92,7 +323,72 @@ Format your response as JSON:
         
         return await asyncio.gather(*tasks)
 
-class TextEvaluator:
+class JudgePanel:
+    """Several judges scoring the same responses concurrently, combined with an aggregation rule"""
+
+    def __init__(self, judges: List[Tuple[str, Optional[str]]], aggregation: str = "mean"):
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregation!r}; expected one of {', '.join(AGGREGATIONS)}")
+        self.judges = [LLMJudgeEvaluator(name, base_url) for name, base_url in judges]
+        self.aggregation = aggregation
+
+    async def evaluate_responses_batch(self, evaluation_data: List[Tuple[str, str, str]],
+                                       known: List[Dict[str, JudgeResult]] = None) -> List[PanelResult]:
+        """Score every response with every judge; `known` holds per-response results to reuse by judge name.
+
+        Responses that repeat an earlier one (ignoring whitespace) for the same prompt and rubric are sent
+        to each judge once; the copies share its verdict at no extra cost.
+        """
+        known = known or [{} for _ in evaluation_data]
+        pending: Dict[tuple, asyncio.Task] = {}
+
+        async def evaluate(index, judge):
+            if judge.judge_model in known[index]:
+                return known[index][judge.judge_model]
+            response_text, original_prompt, rubric_prompt = evaluation_data[index]
+            key = (judge.judge_model, normalize_response(response_text), original_prompt, rubric_prompt)
+            if key in pending:
+                metrics.judge_dedup.inc(judge=judge.judge_model)
+                result = await pending[key]
+                return result._replace(input_tokens=0, output_tokens=0, cost_usd=0.0)
+            pending[key] = asyncio.ensure_future(judge.evaluate_response(*evaluation_data[index]))
+            return await pending[key]
+
+        # All judge calls go out together and share the judge rate limiter
+        flat = await asyncio.gather(*[
+            evaluate(index, judge) for index in range(len(evaluation_data)) for judge in self.judges
+        ])
+
+        results = []
+        for index in range(len(evaluation_data)):
+            judge_results = flat[index * len(self.judges):(index + 1) * len(self.judges)]
+            if len(self.judges) == 1:
+                reasoning = judge_results[0].reasoning
+            else:
+                reasoning = "\n\n".join(
+                    f"[{judge.judge_model}: {result.score if result.score is not None else 'no score'}]\n{result.reasoning}"
+                    for judge, result in zip(self.judges, judge_results)
+                )
+            # Reused verdicts were paid for before, so they add no cost here
+            fresh = [result for judge, result in zip(self.judges, judge_results) if judge.judge_model not in known[index]]
+            results.append(PanelResult(
+                score=aggregate_scores([result.score for result in judge_results], self.aggregation),
+                reasoning=reasoning,
+                judge_results=list(judge_results),
+                input_tokens=sum(result.input_tokens for result in fresh),
+                output_tokens=sum(result.output_tokens for result in fresh),
+                cost_usd=sum(result.cost_usd for result in fresh),
+            ))
+        return results
+
+class BasicEvaluator:
+    """Model-type scoring used when a prompt has neither local checks nor a judge"""
+
+    @classmethod
+    async def evaluate_batch(cls, responses: List[str]) -> List[LocalResult]:
+        return [LocalResult(cls.evaluate_response(response)) for response in responses]
+
+class TextEvaluator(BasicEvaluator):
     @staticmethod
     def evaluate_response(response_text: str, expected_output: str = None, criteria: str = None) -> Optional[float]:
         if not response_text or response_text.startswith("Error:"):
@@ -106,17 +402,23 @@ class TextEvaluator:
         
         return len(response_text) / 1000.0
 
-class VisionEvaluator:
+class VisionEvaluator(BasicEvaluator):
     @staticmethod
     def evaluate_response(response_text: str, expected_output: str = None, criteria: str = None) -> Optional[float]:
         return None
 
-class AgentEvaluator:
+class AgentEvaluator(BasicEvaluator):
     @staticmethod
     def evaluate_response(response_text: str, expected_output: str = None, criteria: str = None) -> Optional[float]:
+        # Episodes that failed or never reached an answer score 0; anything else needs a judge or local checks
+        if not response_text or response_text.startswith("Error:"):
+            return 0.0
         return None
 
-def get_evaluator(eval_type: str):
+def get_evaluator(eval_type: str, config=None, reference: str = None):
+    """Local checks from a revision's evaluator_config if it has one, else the model type's basic evaluator"""
+    if config:
+        return local_evaluators.build(config, reference)
     evaluators = {
         "text": TextEvaluator,
         "vision": VisionEvaluator,
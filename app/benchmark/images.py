@@ -0,0 +1,179 @@
+"""Image attachments for vision prompts: storage on disk and a cached encoding pipeline.
+
+Uploaded images are stored once under ATTACHMENT_DIR, named by their SHA-256. Before a request,
+each image is downscaled so its longer side is at most IMAGE_MAX_SIDE pixels. It is re-encoded
+as JPEG at IMAGE_JPEG_QUALITY, or as PNG when it has transparency, and turned into a base64 data
+URL. Results are kept in memory by (hash, target size) up to IMAGE_CACHE_MB, so the 5 runs of
+N models on a prompt read and encode each file once. Concurrent requests for an image that is
+still encoding wait for that encode.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+import metrics
+
+ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR", "data/attachments")
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1568"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_CACHE_MB = int(os.getenv("IMAGE_CACHE_MB", "256"))
+
+
+class StoredImage(NamedTuple):
+    sha256: str
+    path: str
+    content_type: str
+    size_bytes: int
+    width: Optional[int]
+    height: Optional[int]
+
+
+class EncodedImage(NamedTuple):
+    data_url: str
+    payload_bytes: int
+    width: Optional[int]
+    height: Optional[int]
+
+
+def save(data: bytes, filename: str) -> StoredImage:
+    """Write an uploaded image under ATTACHMENT_DIR; raises ValueError if it is not an image"""
+    content_type = mimetypes.guess_type(filename or "")[0] or "application/octet-stream"
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            width, height = image.size
+            content_type = Image.MIME.get(image.format, content_type)
+    except Exception:
+        raise ValueError(f"{filename or 'Upload'} is not a readable image")
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    extension = mimetypes.guess_extension(content_type) or ""
+    path = os.path.join(sha256[:2], sha256 + extension)
+    target = full_path(path)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(target + ".tmp", target)
+    return StoredImage(sha256, path, content_type, len(data), width, height)
+
+
+def full_path(path: str) -> str:
+    return os.path.join(ATTACHMENT_DIR, path)
+
+
+def _encode(path: str, max_side: int) -> EncodedImage:
+    with Image.open(full_path(path)) as image:
+        image.load()
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        output = io.BytesIO()
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            content_type = "image/png"
+        else:
+            image.convert("RGB").save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+            content_type = "image/jpeg"
+        width, height = image.size
+    data = output.getvalue()
+    data_url = f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+    return EncodedImage(data_url, len(data_url), width, height)
+
+
+class _Cache:
+    """LRU of encoded images bounded by the total size of their data URLs"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[str, int], EncodedImage]" = OrderedDict()
+
+    def get(self, key) -> Optional[EncodedImage]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: EncodedImage) -> None:
+        if key in self._entries or entry.payload_bytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += entry.payload_bytes
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.payload_bytes
+
+
+_cache = _Cache(IMAGE_CACHE_MB * 1024 * 1024)
+_inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+
+async def encode(attachment, max_side: int = None) -> Tuple[EncodedImage, bool]:
+    """Encoded image for a PromptAttachment and whether it came from the cache"""
+    max_side = max_side or IMAGE_MAX_SIDE
+    key = (attachment.sha256, max_side)
+    cached = _cache.get(key)
+    if cached is not None:
+        metrics.image_cache.inc(result="hit")
+        return cached, True
+    while key in _inflight:
+        metrics.image_cache.inc(result="hit")
+        leader = _inflight[key]
+        try:
+            return await asyncio.shield(leader), True
+        except asyncio.CancelledError:
+            if not leader.cancelled():
+                raise
+            # The encode we waited for was cancelled; the first waiter to get here takes it over
+
+    metrics.image_cache.inc(result="miss")
+    future = _inflight[key] = asyncio.get_running_loop().create_future()
+    start = time.perf_counter()
+    try:
+        encoded = await asyncio.to_thread(_encode, attachment.path, max_side)
+        metrics.image_encode_seconds.observe(time.perf_counter() - start)
+        _cache.put(key, encoded)
+        future.set_result(encoded)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Waiters re-raise it; don't warn when there are none
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+    return encoded, False
+
+
+async def prepare(attachments, max_side: int = None) -> Tuple[List[EncodedImage], Dict[str, Any]]:
+    """Encode a revision's attachments; returns them with payload and timing stats for run_metadata"""
+    start = time.perf_counter()
+    results = await asyncio.gather(*(encode(attachment, max_side) for attachment in attachments))
+    encoded = [image for image, _ in results]
+    stats = {
+        "count": len(encoded),
+        "payload_bytes": sum(image.payload_bytes for image in encoded),
+        "encode_ms": round((time.perf_counter() - start) * 1000, 1),
+        "cache_hits": sum(1 for _, hit in results if hit),
+    }
+    return encoded, stats
+
+
+def message_content(text: str, encoded: List[EncodedImage]) -> Union[str, List[Dict[str, Any]]]:
+    """User message content: plain text, or text followed by image parts"""
+    if not encoded:
+        return text
+    return [{"type": "text", "text": text}] + [
+        {"type": "image_url", "image_url": {"url": image.data_url}} for image in encoded
+    ]
@@ -0,0 +1,243 @@
+"""Model leaderboard with bootstrap confidence intervals and Bradley-Terry ratings.
+
+The input is one cell per (model, prompt revision) holding every scored run of that model's
+completed suites on the revision (database.models.LeaderboardCell, refreshed as suites complete).
+
+- mean_score: mean over the model's prompts of its mean score per prompt, so each prompt counts once.
+- Pairwise win rates: on the prompts two models share, the share where one has the higher mean
+  score (ties count half).
+- rating: Bradley-Terry strength fitted to those wins by the MM algorithm, on an Elo-like scale
+  (1000 is average, +400 means 10:1 odds of winning a prompt). Each compared pair also gets one
+  virtual tie, so a model that won every comparison still has a finite rating.
+
+Intervals are the 2.5th and 97.5th percentiles over BOOTSTRAP_SAMPLES replicates, drawn in NumPy
+for all cells at once. For mean_score, each cell's runs are resampled with replacement, so the
+interval reflects run-to-run noise on these prompts. For ratings, the prompts are resampled with
+replacement and the ratings refitted on each replicate's wins. Resampling runs would also flip close
+head-to-heads and pull every rating towards 1000.
+
+Results are cached per model type until a cell changes (see get). Without NumPy only the point
+estimates are reported.
+"""
+import os
+import threading
+import time
+import warnings
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import crud
+import metrics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BOOTSTRAP_SAMPLES = int(os.getenv("LEADERBOARD_BOOTSTRAP_SAMPLES", "1000"))
+BT_ITERATIONS = 100
+BT_TOLERANCE = 1e-6
+# Virtual tie added to every compared pair (half a win each way)
+BT_PRIOR_WINS = 0.5
+ELO_SCALE = 400 / np.log(10) if np is not None else None
+ELO_BASE = 1000
+# Upper bound on replicate array elements held at once while resampling
+_CHUNK_ELEMENTS = 4_000_000
+_SEED = 20240601
+
+
+def _percentiles(values) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """2.5th and 97.5th percentiles per column of a (replicates x n) array, ignoring NaN"""
+    with warnings.catch_warnings():
+        # Models that shared no prompt with another have no rating in any replicate
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanpercentile(values, [2.5, 97.5], axis=0)
+    return [_float(v) for v in low], [_float(v) for v in high]
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None or value != value else float(value)
+
+
+def bradley_terry(wins, games):
+    """Bradley-Terry log-strengths from win and game counts of shape (..., m, m).
+
+    wins[..., i, j] is how often i beat j and games[..., i, j] how often they met. Leading axes
+    are independent problems (bootstrap replicates) fitted together. Returns (..., m) log-strengths
+    centred on 0; NaN for models that met nobody.
+    """
+    wins = wins + BT_PRIOR_WINS * (games > 0)
+    games = games + 2 * BT_PRIOR_WINS * (games > 0)
+    total_wins = wins.sum(axis=-1)
+    played = games.sum(axis=-1) > 0
+    strength = np.ones(wins.shape[:-1])
+    for _ in range(BT_ITERATIONS):
+        pair_sums = strength[..., :, None] + strength[..., None, :]
+        denominator = (games / pair_sums).sum(axis=-1)
+        updated = np.where(played, total_wins / np.where(denominator > 0, denominator, 1), 1.0)
+        # Fix the scale: geometric mean 1 over the models that played
+        log_updated = np.log(updated)
+        centre = np.where(played, log_updated, 0).sum(axis=-1, keepdims=True) / np.maximum(
+            played.sum(axis=-1, keepdims=True), 1)
+        updated = np.exp(log_updated - centre)
+        converged = np.max(np.abs(updated - strength)) < BT_TOLERANCE
+        strength = updated
+        if converged:
+            break
+    return np.where(played, np.log(strength), np.nan)
+
+
+def _pairwise(means):
+    """Per-prompt win and shared-prompt indicators (m, m, prompts) from mean scores (m, prompts), NaN where missing"""
+    present = ~np.isnan(means)
+    a, b = means[:, None, :], means[None, :, :]
+    shared = present[:, None, :] & present[None, :, :]
+    shared &= ~np.eye(len(means), dtype=bool)[:, :, None]
+    wins = np.where(shared, (a > b) + 0.5 * (a == b), 0.0)
+    return wins, shared.astype(float)
+
+
+def _bootstrap_means(cells: Dict[Tuple[int, int], Sequence[float]], m: int, samples: int, rng):
+    """Model mean scores (samples x m) with every cell's runs resampled with replacement"""
+    sizes: Dict[int, List[Tuple[int, Sequence[float]]]] = defaultdict(list)
+    for (i, _), scores in cells.items():
+        sizes[len(scores)].append((i, scores))
+
+    sums = np.zeros((samples, m))
+    counts = np.zeros(m)
+    # Cells with the same number of runs are resampled in one draw, in chunks of bounded size
+    for n, group in sizes.items():
+        data = np.array([scores for _, scores in group], dtype=float)
+        rows = np.array([i for i, _ in group])
+        counts += np.bincount(rows, minlength=m)
+        per_draw = max(1, _CHUNK_ELEMENTS // (samples * n))
+        for start in range(0, len(group), per_draw):
+            part = data[start:start + per_draw]
+            index = rng.integers(0, n, size=(samples, len(part), n))
+            cell_means = part[np.arange(len(part))[None, :, None], index].mean(axis=-1)
+            owner = np.zeros((len(part), m))
+            owner[np.arange(len(part)), rows[start:start + per_draw]] = 1
+            sums += cell_means @ owner
+    return sums / counts
+
+
+def _bootstrap_pairs(wins, shared, samples: int, rng):
+    """Win and game counts (samples x m x m) over prompt sets drawn with replacement"""
+    m, _, p = wins.shape
+    weights = rng.multinomial(p, np.full(p, 1 / p), size=samples).astype(float)
+    replicate_wins = np.zeros((samples, m, m))
+    replicate_games = np.zeros((samples, m, m))
+    chunk = max(1, _CHUNK_ELEMENTS // (m * m))
+    for start in range(0, p, chunk):
+        part = slice(start, start + chunk)
+        replicate_wins += np.einsum("ijp,bp->bij", wins[:, :, part], weights[:, part])
+        replicate_games += np.einsum("ijp,bp->bij", shared[:, :, part], weights[:, part])
+    return replicate_wins, replicate_games
+
+
+def compute(rows, samples: int = None, seed: int = _SEED) -> Dict[str, Any]:
+    """Leaderboard from (model_id, model_name, prompt_revision_id, scores) rows"""
+    samples = BOOTSTRAP_SAMPLES if samples is None else samples
+    model_ids = sorted({row.model_id for row in rows})
+    names = {row.model_id: row.model_name for row in rows}
+    revision_ids = sorted({row.prompt_revision_id for row in rows})
+    model_index = {model_id: i for i, model_id in enumerate(model_ids)}
+    revision_index = {revision_id: j for j, revision_id in enumerate(revision_ids)}
+    cells = {
+        (model_index[row.model_id], revision_index[row.prompt_revision_id]): row.scores
+        for row in rows if row.scores
+    }
+    m, p = len(model_ids), len(revision_ids)
+
+    cell_means = {key: sum(scores) / len(scores) for key, scores in cells.items()}
+    per_model: Dict[int, List[float]] = defaultdict(list)
+    runs: Dict[int, int] = defaultdict(int)
+    for (i, j), scores in cells.items():
+        per_model[i].append(cell_means[(i, j)])
+        runs[i] += len(scores)
+    entries = [{
+        "model_id": model_id,
+        "model_name": names[model_id],
+        "mean_score": sum(per_model[i]) / len(per_model[i]) if per_model[i] else None,
+        "prompts": len(per_model[i]),
+        "runs": runs[i],
+        "ci_low": None, "ci_high": None,
+        "rating": None, "rating_ci_low": None, "rating_ci_high": None,
+    } for i, model_id in enumerate(model_ids)]
+    win_rates = shared = None
+
+    if np is not None and m:
+        means = np.full((m, p), np.nan)
+        for (i, j), mean in cell_means.items():
+            means[i, j] = mean
+        prompt_wins, prompt_shared = _pairwise(means)
+        wins, games = prompt_wins.sum(axis=-1), prompt_shared.sum(axis=-1)
+        ratings = bradley_terry(wins, games) * ELO_SCALE + ELO_BASE
+        with np.errstate(invalid="ignore", divide="ignore"):
+            win_rates = np.where(games > 0, wins / games, np.nan)
+        shared = games.astype(int)
+
+        if samples:
+            rng = np.random.default_rng(seed)
+            mean_low, mean_high = _percentiles(_bootstrap_means(cells, m, samples, rng))
+            replicate_wins, replicate_games = _bootstrap_pairs(prompt_wins, prompt_shared, samples, rng)
+            rating_low, rating_high = _percentiles(
+                bradley_terry(replicate_wins, replicate_games) * ELO_SCALE + ELO_BASE)
+        else:
+            mean_low = mean_high = rating_low = rating_high = [None] * m
+        for i, entry in enumerate(entries):
+            entry.update(
+                ci_low=mean_low[i], ci_high=mean_high[i], rating=_float(ratings[i]),
+                rating_ci_low=rating_low[i], rating_ci_high=rating_high[i],
+            )
+
+    order = sorted(range(m), key=lambda i: (
+        -(entries[i]["rating"] if entries[i]["rating"] is not None else float("-inf")),
+        -(entries[i]["mean_score"] or 0),
+    ))
+    for rank, i in enumerate(order, start=1):
+        entries[i]["rank"] = rank
+    return {
+        "models": [entries[i] for i in order],
+        "pairwise": {
+            "model_names": [entries[i]["model_name"] for i in order],
+            "win_rates": [[_float(win_rates[i, j]) if win_rates is not None else None for j in order] for i in order],
+            "shared_prompts": [[int(shared[i, j]) if shared is not None else None for j in order] for i in order],
+        },
+        "prompt_count": p,
+        "bootstrap_samples": samples if np is not None else 0,
+    }
+
+
+_cache: Dict[Optional[int], Tuple[Any, Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+
+def get(db: Session, model_type_id: int = None) -> Dict[str, Any]:
+    """Leaderboard for one model type (or all), recomputed only when a leaderboard cell has changed"""
+    version = crud.get_leaderboard_version(db)
+    cached = _cache.get(model_type_id)
+    if cached is not None and cached[0] == version:
+        metrics.leaderboard_cache.inc(result="hit")
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get(model_type_id)
+        if cached is not None and cached[0] == version:
+            metrics.leaderboard_cache.inc(result="hit")
+            return cached[1]
+        metrics.leaderboard_cache.inc(result="miss")
+        start = time.perf_counter()
+        result = compute(crud.get_leaderboard_cells(db, model_type_id))
+        elapsed = time.perf_counter() - start
+        metrics.leaderboard_compute_seconds.observe(elapsed)
+        result.update(
+            model_type_id=model_type_id,
+            computed_at=datetime.now(timezone.utc).isoformat(),
+            compute_ms=round(elapsed * 1000, 1),
+        )
+        _cache[model_type_id] = (version, result)
+        return result
@@ -0,0 +1,392 @@
+"""Deterministic evaluators that score responses locally, without a judge call.
+
+A prompt revision's evaluator_config picks one check or a list of them:
+
+    {"type": "exact", "expected": "Paris"}
+    [{"type": "regex", "pattern": "\\bParis\\b", "flags": "i"},
+     {"type": "numeric", "expected": 3.14, "tolerance": 0.01}]
+
+Every check scores a whole batch of responses in one call. With several checks, a response's
+score is the mean of the checks that could score it. The "reference" check compares responses
+with the revision's reference answer (see reference_metrics). Code answers run against the
+configured tests only when CODE_EXECUTION=true, in a child process with resource limits (see
+code_execution). At most CODE_EVAL_CONCURRENCY run at once, and each is killed with anything it
+started after its timeout (CODE_EVAL_TIMEOUT seconds by default).
+"""
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+import weakref
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from benchmark import code_execution, reference_metrics
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+CODE_EVAL_CONCURRENCY = int(os.getenv("CODE_EVAL_CONCURRENCY", str(os.cpu_count() or 4)))
+CODE_EVAL_TIMEOUT = float(os.getenv("CODE_EVAL_TIMEOUT", "10"))
+
+
+class LocalResult(NamedTuple):
+    score: Optional[float]
+    detail: Optional[str] = None
+
+
+EVALUATORS: Dict[str, type] = {}
+
+
+def register(name: str):
+    def decorator(cls):
+        cls.name = name
+        EVALUATORS[name] = cls
+        return cls
+    return decorator
+
+
+class LocalEvaluator:
+    """One check. Subclasses validate their options in __init__ and score a response in evaluate"""
+
+    name = ""
+    # Whether build() passes the revision's reference answer as the `reference` option
+    uses_reference = False
+    # Whether it executes model-written code, which needs CODE_EXECUTION=true
+    runs_code = False
+
+    async def evaluate_batch(self, responses: List[str]) -> List[LocalResult]:
+        return [self.evaluate(response) for response in responses]
+
+    def evaluate(self, response: str) -> LocalResult:
+        raise NotImplementedError
+
+
+def _expected_list(expected) -> List[str]:
+    if isinstance(expected, str):
+        return [expected]
+    if isinstance(expected, list) and expected and all(isinstance(value, str) for value in expected):
+        return expected
+    raise ValueError("'expected' must be a string or a list of strings")
+
+
+@register("exact")
+class ExactMatch(LocalEvaluator):
+    """Response equals one of the expected answers, ignoring surrounding whitespace"""
+
+    def __init__(self, expected):
+        self.expected = {value.strip() for value in _expected_list(expected)}
+
+    def evaluate(self, response: str) -> LocalResult:
+        if response.strip() in self.expected:
+            return LocalResult(1.0)
+        return LocalResult(0.0, "No exact match")
+
+
+def normalize(text: str) -> str:
+    """Case-, accent-, punctuation- and whitespace-insensitive form of text"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+@register("normalized")
+class NormalizedMatch(LocalEvaluator):
+    """Normalized response equals (or with contains=true, contains) a normalized expected answer"""
+
+    def __init__(self, expected, contains: bool = False):
+        self.expected = [normalize(value) for value in _expected_list(expected)]
+        self.contains = bool(contains)
+
+    def evaluate(self, response: str) -> LocalResult:
+        text = normalize(response)
+        for expected in self.expected:
+            if text == expected or (self.contains and re.search(rf"(^| ){re.escape(expected)}( |$)", text)):
+                return LocalResult(1.0)
+        return LocalResult(0.0, "No normalized match")
+
+
+REGEX_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}
+
+
+@register("regex")
+class RegexMatch(LocalEvaluator):
+    """Pattern found anywhere in the response (fullmatch=true to require the whole response)"""
+
+    def __init__(self, pattern: str, flags: str = "", fullmatch: bool = False):
+        unknown = set(flags) - set(REGEX_FLAGS)
+        if unknown:
+            raise ValueError(f"Unknown regex flags: {''.join(sorted(unknown))}")
+        compiled_flags = 0
+        for flag in flags:
+            compiled_flags |= REGEX_FLAGS[flag]
+        try:
+            self.pattern = re.compile(pattern, compiled_flags)
+        except (re.error, TypeError) as e:
+            raise ValueError(f"Invalid regex: {e}")
+        self.fullmatch = bool(fullmatch)
+
+    def evaluate(self, response: str) -> LocalResult:
+        match = self.pattern.fullmatch(response.strip()) if self.fullmatch else self.pattern.search(response)
+        if match:
+            return LocalResult(1.0)
+        return LocalResult(0.0, f"No match for /{self.pattern.pattern}/")
+
+
+NUMBER = re.compile(r"[-+]?(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.\d+|\d+)(?:[eE][-+]?\d+)?")
+
+
+@register("numeric")
+class NumericTolerance(LocalEvaluator):
+    """Last number in the response is within an absolute or relative tolerance of the expected value"""
+
+    def __init__(self, expected, tolerance: float = 1e-6, rel_tolerance: float = 0.0):
+        try:
+            self.expected = float(expected)
+            self.tolerance = float(tolerance)
+            self.rel_tolerance = float(rel_tolerance)
+        except (TypeError, ValueError):
+            raise ValueError("'expected', 'tolerance' and 'rel_tolerance' must be numbers")
+
+    def evaluate(self, response: str) -> LocalResult:
+        numbers = NUMBER.findall(response)
+        if not numbers:
+            return LocalResult(0.0, "No number in response")
+        value = float(numbers[-1].replace(",", ""))
+        allowed = max(self.tolerance, self.rel_tolerance * abs(self.expected))
+        if abs(value - self.expected) <= allowed:
+            return LocalResult(1.0)
+        return LocalResult(0.0, f"Got {value:g}, expected {self.expected:g} ± {allowed:g}")
+
+
+def json_candidates(text: str) -> List[str]:
+    """Bare text, fenced code blocks, then the outermost {...} or [...] span"""
+    candidates = [text.strip()]
+    candidates += re.findall(r"```(?:json|JSON)?\s*(.*?)```", text, re.DOTALL)
+    for opening, closing in ("{}", "[]"):
+        start, end = text.find(opening), text.rfind(closing)
+        if 0 <= start < end:
+            candidates.append(text[start:end + 1])
+    return candidates
+
+
+SCHEMA_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+
+def _schema_errors(instance: Any, schema: Dict, path: str = "$") -> List[str]:
+    """Subset of JSON Schema (type, enum, required, properties, additionalProperties, items), used
+    when the jsonschema package is not installed"""
+    expected_type = schema.get("type")
+    if expected_type:
+        types = expected_type if isinstance(expected_type, list) else [expected_type]
+        matches = [
+            isinstance(instance, SCHEMA_TYPES[name]) and not (name in ("integer", "number") and isinstance(instance, bool))
+            for name in types if name in SCHEMA_TYPES
+        ]
+        if not any(matches):
+            return [f"{path}: expected {expected_type}"]
+    if "enum" in schema and instance not in schema["enum"]:
+        return [f"{path}: not one of {schema['enum']}"]
+
+    errors = []
+    if isinstance(instance, dict):
+        properties = schema.get("properties", {})
+        errors += [f"{path}: missing '{key}'" for key in schema.get("required", []) if key not in instance]
+        for key, value in instance.items():
+            if key in properties:
+                errors += _schema_errors(value, properties[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected '{key}'")
+    if isinstance(instance, list) and isinstance(schema.get("items"), dict):
+        for index, value in enumerate(instance):
+            errors += _schema_errors(value, schema["items"], f"{path}[{index}]")
+    return errors
+
+
+@register("json_schema")
+class JSONSchemaValid(LocalEvaluator):
+    """Response contains JSON (bare, fenced or embedded) that validates against the schema"""
+
+    def __init__(self, schema: Dict):
+        if not isinstance(schema, dict):
+            raise ValueError("'schema' must be an object")
+        if jsonschema is not None:
+            try:
+                jsonschema.validators.validator_for(schema).check_schema(schema)
+            except jsonschema.SchemaError as e:
+                raise ValueError(f"Invalid JSON schema: {e.message}")
+            self.validator = jsonschema.validators.validator_for(schema)(schema)
+        self.schema = schema
+
+    def evaluate(self, response: str) -> LocalResult:
+        for candidate in json_candidates(response):
+            try:
+                instance = json.loads(candidate)
+            except ValueError:
+                continue
+            if jsonschema is not None:
+                errors = [f"{'.'.join(map(str, error.absolute_path)) or '$'}: {error.message}"
+                          for error in self.validator.iter_errors(instance)]
+            else:
+                errors = _schema_errors(instance, self.schema)
+            if errors:
+                return LocalResult(0.0, "; ".join(errors[:3]))
+            return LocalResult(1.0)
+        return LocalResult(0.0, "No JSON in response")
+
+
+# One pool of subprocess slots per event loop
+_code_slots = weakref.WeakKeyDictionary()
+
+
+def _code_slot() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _code_slots:
+        _code_slots[loop] = asyncio.Semaphore(CODE_EVAL_CONCURRENCY)
+    return _code_slots[loop]
+
+
+def extract_code(response: str) -> str:
+    """The last fenced code block of the response, or the whole response if it has none"""
+    blocks = re.findall(r"```[\w+-]*\n(.*?)```", response, re.DOTALL)
+    return blocks[-1] if blocks else response
+
+
+@register("code")
+class CodeTests(LocalEvaluator):
+    """Python answer passes the configured tests (asserts appended to the extracted code)"""
+
+    runs_code = True
+
+    def __init__(self, tests: str, timeout: float = None):
+        if not isinstance(tests, str) or not tests.strip():
+            raise ValueError("'tests' must be Python source")
+        self.tests = tests
+        self.timeout = float(timeout) if timeout is not None else CODE_EVAL_TIMEOUT
+
+    async def evaluate_batch(self, responses: List[str]) -> List[LocalResult]:
+        return await asyncio.gather(*(self.run(response) for response in responses))
+
+    async def run(self, response: str) -> LocalResult:
+        try:
+            code_execution.check_enabled()
+        except ValueError as e:
+            # Revisions saved while it was enabled are left unscored rather than failed
+            return LocalResult(None, str(e))
+        async with _code_slot():
+            workdir = tempfile.mkdtemp(prefix="bench-code-")
+            try:
+                path = os.path.join(workdir, "answer.py")
+                with open(path, "w") as f:
+                    f.write(extract_code(response) + "\n\n" + self.tests + "\n")
+                result = await code_execution.run_async([path], self.timeout, workdir)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        if result.timed_out:
+            return LocalResult(0.0, f"Timed out after {self.timeout:g}s")
+        if result.returncode == 0:
+            return LocalResult(1.0)
+        lines = result.stderr.decode("utf-8", "replace").strip().splitlines()
+        return LocalResult(0.0, lines[-1] if lines else f"Exited with status {result.returncode}")
+
+
+@register("reference")
+class ReferenceSimilarity(LocalEvaluator):
+    """Similarity to the revision's reference answer (see reference_metrics), or 1/0 against a threshold"""
+
+    uses_reference = True
+
+    def __init__(self, metric: str = "rouge_l", threshold: float = None, reference: str = None):
+        if metric not in reference_metrics.METRICS:
+            raise ValueError(f"'metric' must be one of {', '.join(reference_metrics.METRICS)}")
+        if not reference_metrics.available():
+            raise ValueError("Reference similarity requires numpy")
+        self.metric = metric
+        self.threshold = float(threshold) if threshold is not None else None
+        self.reference = reference
+
+    async def evaluate_batch(self, responses: List[str]) -> List[LocalResult]:
+        if not self.reference:
+            return [LocalResult(None, "Revision has no reference answer")] * len(responses)
+        results = []
+        for scores in reference_metrics.score_pairs([(response, self.reference) for response in responses]):
+            value = scores[self.metric]
+            if self.threshold is None:
+                results.append(LocalResult(value))
+            elif value >= self.threshold:
+                results.append(LocalResult(1.0))
+            else:
+                results.append(LocalResult(0.0, f"{self.metric} {value:.3f} < {self.threshold:g}"))
+        return results
+
+
+class EvaluatorSet:
+    """The checks of one evaluator_config, applied together to a batch of responses"""
+
+    def __init__(self, checks: List[LocalEvaluator]):
+        self.checks = checks
+
+    @property
+    def name(self) -> str:
+        return "+".join(check.name for check in self.checks)
+
+    async def evaluate_batch(self, responses: List[str]) -> List[LocalResult]:
+        valid = [i for i, response in enumerate(responses) if response and not response.startswith("Error:")]
+        results = [LocalResult(0.0, "Response contains errors")] * len(responses)
+        if not valid:
+            return results
+
+        per_check = await asyncio.gather(*(
+            check.evaluate_batch([responses[i] for i in valid]) for check in self.checks
+        ))
+        for position, index in enumerate(valid):
+            check_results = [check_result[position] for check_result in per_check]
+            details = [f"{check.name}: {result.detail}" for check, result in zip(self.checks, check_results)
+                       if result.detail]
+            scores = [result.score for result in check_results if result.score is not None]
+            results[index] = LocalResult(sum(scores) / len(scores) if scores else None, "; ".join(details) or None)
+        return results
+
+
+def build(config, reference: str = None) -> EvaluatorSet:
+    """EvaluatorSet for an evaluator_config, given the revision's reference answer; raises ValueError if invalid"""
+    specs = config if isinstance(config, list) else [config]
+    if not specs:
+        raise ValueError("Evaluator config has no checks")
+    checks = []
+    for spec in specs:
+        if not isinstance(spec, dict) or "type" not in spec:
+            raise ValueError(f"Each check needs a 'type', got {spec!r}")
+        options = {key: value for key, value in spec.items() if key != "type"}
+        if spec["type"] not in EVALUATORS:
+            raise ValueError(f"Unknown evaluator '{spec['type']}'; available: {', '.join(EVALUATORS)}")
+        if EVALUATORS[spec["type"]].uses_reference:
+            options["reference"] = reference
+        try:
+            checks.append(EVALUATORS[spec["type"]](**options))
+        except TypeError as e:
+            raise ValueError(f"Bad options for '{spec['type']}': {e}")
+    return EvaluatorSet(checks)
+
+
+def parse_config(value) -> Optional[Any]:
+    """Validated evaluator_config from form text (JSON) or an already decoded object; None if empty"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError as e:
+            raise ValueError(f"Evaluator config is not valid JSON: {e}")
+    if any(check.runs_code for check in build(value).checks):
+        code_execution.check_enabled()
+    return value
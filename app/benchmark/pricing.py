@@ -0,0 +1,140 @@
+"""Per-model token prices, loaded from a JSON file (PRICING_FILE, default: pricing.json next to this module).
+
+Each entry gives USD per million input, output and cached-input tokens from an effective date
+onwards. Model names are matched exactly, then by alias, then with the provider prefix dropped
+("openai/gpt-4o" -> "gpt-4o"), then by the longest entry that is a prefix of the name at a
+"-", ":" or "@" boundary, so dated snapshots like "gpt-4o-2024-08-06" or variants like
+"claude-3.5-sonnet:beta" share the base model's price. Requests sent through a provider's
+batch API are charged at "batch_discount" times the listed price (0.5 unless the file says otherwise).
+"""
+import bisect
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICING_FILE = os.path.join(os.path.dirname(__file__), "pricing.json")
+NAME_BOUNDARIES = ("-", ":", "@")
+DEFAULT_BATCH_DISCOUNT = 0.5
+
+
+class ModelPrice(NamedTuple):
+    input: float
+    output: float
+    cached_input: float
+    effective_from: datetime
+
+
+class PricingTable:
+    def __init__(self, entries: List[Dict], batch_discount: float = DEFAULT_BATCH_DISCOUNT):
+        self.batch_discount = batch_discount
+        # name -> prices sorted by effective date
+        self._prices: Dict[str, List[ModelPrice]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._match_cache: Dict[str, Optional[str]] = {}
+        self._warned = set()
+
+        for entry in entries:
+            name = entry["model"].lower()
+            price = ModelPrice(
+                input=float(entry["input"]),
+                output=float(entry["output"]),
+                cached_input=float(entry.get("cached_input", entry["input"])),
+                effective_from=datetime.fromisoformat(entry.get("effective_from", "1970-01-01")),
+            )
+            self._prices.setdefault(name, []).append(price)
+            for alias in entry.get("aliases", []):
+                self._aliases[alias.lower()] = name
+        for prices in self._prices.values():
+            prices.sort(key=lambda p: p.effective_from)
+
+    @classmethod
+    def load(cls, path: str = None) -> "PricingTable":
+        path = path or os.getenv("PRICING_FILE", DEFAULT_PRICING_FILE)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["models"], float(data.get("batch_discount", DEFAULT_BATCH_DISCOUNT)))
+
+    def _match(self, model_name: str) -> Optional[str]:
+        key = model_name.lower()
+        if key in self._match_cache:
+            return self._match_cache[key]
+
+        match = None
+        for candidate in (key, key.rsplit("/", 1)[-1]):
+            if candidate in self._prices:
+                match = candidate
+            elif candidate in self._aliases:
+                match = self._aliases[candidate]
+            else:
+                prefix = self._longest_prefix(candidate)
+                if prefix:
+                    match = self._aliases.get(prefix, prefix)
+            if match:
+                break
+
+        self._match_cache[key] = match
+        return match
+
+    def _longest_prefix(self, name: str) -> Optional[str]:
+        best = None
+        for known in list(self._prices) + list(self._aliases):
+            if (
+                name.startswith(known)
+                and name[len(known):len(known) + 1] in NAME_BOUNDARIES
+                and (best is None or len(known) > len(best))
+            ):
+                best = known
+        return best
+
+    def price(self, model_name: str, at: datetime = None) -> Optional[ModelPrice]:
+        """Price in effect for the model at the given time (default now), or None if it is unknown"""
+        match = self._match(model_name)
+        if match is None:
+            return None
+        prices = self._prices[match]
+        at = at or datetime.utcnow()
+        index = bisect.bisect_right([p.effective_from for p in prices], at) - 1
+        # Runs from before the first known price are charged at that earliest price
+        return prices[max(index, 0)]
+
+    def cost(self, model_name: str, input_tokens: int, output_tokens: int,
+             cached_input_tokens: int = 0, at: datetime = None, batch: bool = False) -> float:
+        """Cost in USD; unknown models cost 0.0 and are logged once and counted in bench_errors_total"""
+        price = self.price(model_name, at)
+        if price is None:
+            if model_name not in self._warned:
+                self._warned.add(model_name)
+                logger.warning(f"No price for model {model_name!r}; add it to the pricing file and run `cli.py reprice`")
+            metrics.errors.inc(stage="pricing", model=model_name)
+            return 0.0
+
+        input_tokens = input_tokens or 0
+        cached_input_tokens = min(cached_input_tokens or 0, input_tokens)
+        cost = (
+            (input_tokens - cached_input_tokens) * price.input
+            + cached_input_tokens * price.cached_input
+            + (output_tokens or 0) * price.output
+        ) / 1_000_000
+        return cost * self.batch_discount if batch else cost
+
+
+_table: Optional[PricingTable] = None
+
+
+def get_pricing() -> PricingTable:
+    global _table
+    if _table is None:
+        _table = PricingTable.load()
+    return _table
+
+
+def reload_pricing(path: str = None) -> PricingTable:
+    global _table
+    _table = PricingTable.load(path)
+    return _table
@@ -0,0 +1,290 @@
+"""Similarity of responses to a prompt revision's reference answer, computed locally.
+
+score_pairs() scores many (response, reference) pairs at once. This can be every run of a
+suite, or every run of a re-score job. Texts are tokenized once, and the metrics are then
+computed with NumPy array operations across all pairs:
+
+- bleu: sentence BLEU-4 with add-one smoothing for n > 1
+- rouge_l: ROUGE-L F1 (longest common subsequence of tokens)
+- chrf: chrF (character 1-6 grams, beta 2)
+- tfidf: TF-IDF cosine similarity, with IDF over the texts being scored
+- bm25: BM25 score of the response's terms against the reference, divided by the reference's
+  score against itself
+
+All values are in [0, 1]. The module needs NumPy; without it, available() is False and
+nothing is scored.
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+METRICS = ("bleu", "rouge_l", "chrf", "tfidf", "bm25")
+BLEU_ORDER = 4
+CHRF_ORDER = 6
+CHRF_BETA = 2.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Pairs per block in the ROUGE-L recurrence, bounding its (pairs x response length) working arrays
+ROUGE_BLOCK = 256
+
+TOKEN = re.compile(r"\w+")
+
+
+def available() -> bool:
+    return np is not None
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall((text or "").lower())
+
+
+class _Corpus:
+    """Every distinct text of a scoring pass as one flat array of token ids plus per-text offsets"""
+
+    def __init__(self, sequences: List[Sequence[int]]):
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        self.lengths = lengths
+        self.ids = (np.concatenate([np.asarray(sequence, dtype=np.int64) for sequence in sequences])
+                    if sequences else np.empty(0, dtype=np.int64))
+        self.doc = np.repeat(np.arange(len(sequences), dtype=np.int64), lengths)
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        self._grams: Dict[int, "np.ndarray"] = {}
+
+    def _gram_ids(self, n: int) -> "np.ndarray":
+        """Id of the n-gram starting at each position, -1 where it would cross a text boundary.
+
+        Built from the (n-1)-gram ids so every step is a 1-D unique over int64 keys.
+        """
+        if n not in self._grams:
+            if n == 1:
+                _, grams = np.unique(self.ids, return_inverse=True)
+                grams = grams.reshape(-1).astype(np.int64)
+            else:
+                previous = self._gram_ids(n - 1)
+                unigrams = self._gram_ids(1)
+                grams = np.full(len(self.ids), -1, dtype=np.int64)
+                starts = np.arange(max(len(self.ids) - n + 1, 0))
+                starts = starts[(previous[starts] >= 0) & (self.doc[starts] == self.doc[starts + n - 1])]
+                keys = previous[starts] * (int(unigrams.max(initial=0)) + 1) + unigrams[starts + n - 1]
+                _, inverse = np.unique(keys, return_inverse=True)
+                grams[starts] = inverse.reshape(-1)
+            self._grams[n] = grams
+        return self._grams[n]
+
+    def ngrams(self, n: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """(text index, n-gram id) of every n-gram that does not cross a text boundary"""
+        grams = self._gram_ids(n)
+        within = grams >= 0
+        return self.doc[within], grams[within]
+
+
+def _count_table(doc: "np.ndarray", term: "np.ndarray", n_terms: int):
+    """Sorted (doc * n_terms + term) keys with their counts"""
+    keys, counts = np.unique(doc * n_terms + term, return_counts=True)
+    return keys, counts.astype(np.float64)
+
+
+def _lookup(keys: "np.ndarray", values: "np.ndarray", query: "np.ndarray") -> "np.ndarray":
+    """values[keys == query] for each query key, 0 where absent"""
+    if len(keys) == 0:
+        return np.zeros(len(query))
+    position = np.clip(np.searchsorted(keys, query), 0, len(keys) - 1)
+    return np.where(keys[position] == query, values[position], 0.0)
+
+
+def _sum_by(index: "np.ndarray", weights: "np.ndarray", size: int) -> "np.ndarray":
+    """Sum of weights per index; always float (np.bincount returns int64 when index is empty)"""
+    return np.bincount(index, weights, minlength=size).astype(np.float64, copy=False)
+
+
+def _overlap(corpus: "_Corpus", n: int, response_docs, reference_docs):
+    """Per pair: clipped n-gram matches, response n-gram count, reference n-gram count"""
+    doc, gram = corpus.ngrams(n)
+    n_pairs = len(response_docs)
+    if len(gram) == 0:
+        zeros = np.zeros(n_pairs)
+        return zeros, zeros, zeros
+    n_grams = int(gram.max()) + 1
+    keys, counts = _count_table(doc, gram, n_grams)
+    key_doc = keys // n_grams
+    key_gram = keys % n_grams
+
+    # Response texts are unique per pair, so their rows can be credited to that pair directly
+    pair_of_response = np.full(len(corpus.lengths), -1, dtype=np.int64)
+    pair_of_response[response_docs] = np.arange(n_pairs)
+    pair = pair_of_response[key_doc]
+    is_response = pair >= 0
+    reference_counts = _lookup(keys, counts, reference_docs[pair[is_response]] * n_grams + key_gram[is_response])
+    matches = _sum_by(pair[is_response], np.minimum(counts[is_response], reference_counts), n_pairs)
+
+    totals = np.maximum(corpus.lengths - n + 1, 0).astype(np.float64)
+    return matches, totals[response_docs], totals[reference_docs]
+
+
+def _bleu(corpus, response_docs, reference_docs):
+    log_precision = np.zeros(len(response_docs))
+    for n in range(1, BLEU_ORDER + 1):
+        matches, hypothesis, _ = _overlap(corpus, n, response_docs, reference_docs)
+        if n == 1:
+            precision = np.divide(matches, hypothesis, out=np.zeros_like(matches), where=hypothesis > 0)
+        else:
+            precision = (matches + 1) / (hypothesis + 1)
+        with np.errstate(divide="ignore"):
+            log_precision += np.log(precision) / BLEU_ORDER
+    hypothesis_length = corpus.lengths[response_docs].astype(np.float64)
+    reference_length = corpus.lengths[reference_docs].astype(np.float64)
+    brevity = np.exp(np.minimum(0.0, 1 - np.divide(reference_length, hypothesis_length,
+                                                   out=np.full_like(reference_length, np.inf),
+                                                   where=hypothesis_length > 0)))
+    return brevity * np.exp(log_precision)
+
+
+def _chrf(corpus, response_docs, reference_docs):
+    # Averaged over the orders both texts are long enough for, like sacreBLEU's effective order
+    precision, recall, orders = (np.zeros(len(response_docs)) for _ in range(3))
+    for n in range(1, CHRF_ORDER + 1):
+        matches, hypothesis, reference = _overlap(corpus, n, response_docs, reference_docs)
+        present = (hypothesis > 0) & (reference > 0)
+        precision += np.divide(matches, hypothesis, out=np.zeros_like(matches), where=present)
+        recall += np.divide(matches, reference, out=np.zeros_like(matches), where=present)
+        orders += present
+    precision = np.divide(precision, orders, out=np.zeros_like(precision), where=orders > 0)
+    recall = np.divide(recall, orders, out=np.zeros_like(recall), where=orders > 0)
+    beta2 = CHRF_BETA ** 2
+    denominator = beta2 * precision + recall
+    return np.divide((1 + beta2) * precision * recall, denominator,
+                     out=np.zeros_like(denominator), where=denominator > 0)
+
+
+def _rouge_l(corpus, response_docs, reference_docs):
+    scores = np.zeros(len(response_docs))
+    for block in range(0, len(response_docs), ROUGE_BLOCK):
+        responses = response_docs[block:block + ROUGE_BLOCK]
+        references = reference_docs[block:block + ROUGE_BLOCK]
+        hypothesis_length = corpus.lengths[responses]
+        reference_length = corpus.lengths[references]
+        width, height = int(hypothesis_length.max(initial=0)), int(reference_length.max(initial=0))
+        if width == 0 or height == 0:
+            continue
+
+        # Padded token matrices; padding ids never match (-1 vs -2)
+        def padded(docs, size, fill):
+            matrix = np.full((len(docs), size), fill, dtype=np.int64)
+            offsets = np.arange(size)
+            mask = offsets[None, :] < corpus.lengths[docs][:, None]
+            matrix[mask] = corpus.ids[(corpus.starts[docs][:, None] + offsets[None, :])[mask]]
+            return matrix
+
+        hypothesis = padded(responses, width, -1)
+        reference = padded(references, height, -2)
+
+        # LCS row recurrence: L[i][j] = cummax_j(max(L[i-1][j], L[i-1][j-1] + match))
+        row = np.zeros((len(responses), width + 1), dtype=np.int32)
+        for i in range(height):
+            match = hypothesis == reference[:, i:i + 1]
+            candidate = np.maximum(row[:, 1:], row[:, :-1] + match)
+            row[:, 1:] = np.maximum.accumulate(candidate, axis=1)
+        lcs = row[:, -1].astype(np.float64)
+
+        precision = np.divide(lcs, hypothesis_length, out=np.zeros_like(lcs), where=hypothesis_length > 0)
+        recall = np.divide(lcs, reference_length, out=np.zeros_like(lcs), where=reference_length > 0)
+        total = precision + recall
+        scores[block:block + len(responses)] = np.divide(2 * precision * recall, total,
+                                                         out=np.zeros_like(total), where=total > 0)
+    return scores
+
+
+def _term_tables(corpus):
+    doc, term = corpus.doc, corpus.ids
+    n_terms = int(term.max()) + 1 if len(term) else 1
+    keys, counts = _count_table(doc, term, n_terms)
+    return n_terms, keys, keys // n_terms, keys % n_terms, counts
+
+
+def _tfidf(corpus, response_docs, reference_docs):
+    n_terms, keys, key_doc, key_term, counts = _term_tables(corpus)
+    n_docs = len(corpus.lengths)
+    document_frequency = np.bincount(key_term, minlength=n_terms)
+    idf = np.log((1 + n_docs) / (1 + document_frequency)) + 1
+    weights = (1 + np.log(counts)) * idf[key_term]
+    norms = np.sqrt(_sum_by(key_doc, weights ** 2, n_docs))
+
+    pair_of_response = np.full(n_docs, -1, dtype=np.int64)
+    pair_of_response[response_docs] = np.arange(len(response_docs))
+    pair = pair_of_response[key_doc]
+    is_response = pair >= 0
+    reference_weights = _lookup(keys, weights, reference_docs[pair[is_response]] * n_terms + key_term[is_response])
+    dot = _sum_by(pair[is_response], weights[is_response] * reference_weights, len(response_docs))
+    denominator = norms[response_docs] * norms[reference_docs]
+    return np.divide(dot, denominator, out=np.zeros_like(dot), where=denominator > 0)
+
+
+def _bm25(corpus, response_docs, reference_docs):
+    n_terms, keys, key_doc, key_term, counts = _term_tables(corpus)
+    n_docs = len(corpus.lengths)
+    document_frequency = np.bincount(key_term, minlength=n_terms)
+    idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+    lengths = corpus.lengths.astype(np.float64)
+    average_length = lengths[np.unique(reference_docs)].mean() or 1.0
+
+    def term_score(docs, frequencies, terms):
+        saturation = frequencies * (BM25_K1 + 1) / (
+            frequencies + BM25_K1 * (1 - BM25_B + BM25_B * lengths[docs] / average_length)
+        )
+        return idf[terms] * saturation
+
+    # Response terms (each counted once, as a query) scored against the reference
+    pair_of_response = np.full(n_docs, -1, dtype=np.int64)
+    pair_of_response[response_docs] = np.arange(len(response_docs))
+    pair = pair_of_response[key_doc]
+    is_response = pair >= 0
+    query_pair, query_term = pair[is_response], key_term[is_response]
+    query_reference = reference_docs[query_pair]
+    frequencies = _lookup(keys, counts, query_reference * n_terms + query_term)
+    score = _sum_by(query_pair, term_score(query_reference, frequencies, query_term), len(response_docs))
+
+    # Upper bound: the reference used as its own query
+    self_score = _sum_by(key_doc, term_score(key_doc, counts, key_term), n_docs)[reference_docs]
+    return np.clip(np.divide(score, self_score, out=np.zeros_like(score), where=self_score > 0), 0.0, 1.0)
+
+
+def _encode(texts: List[List[str]]) -> List[List[int]]:
+    vocabulary: Dict[str, int] = {}
+    return [[vocabulary.setdefault(token, len(vocabulary)) for token in tokens] for tokens in texts]
+
+
+def score_pairs(pairs: List[Tuple[str, str]]) -> List[Optional[Dict[str, float]]]:
+    """Metrics for each (response, reference) pair; None where the reference is empty or NumPy is missing"""
+    if np is None or not pairs:
+        return [None] * len(pairs)
+
+    scored = [i for i, (_, reference) in enumerate(pairs) if reference and reference.strip()]
+    if not scored:
+        return [None] * len(pairs)
+
+    # Each response is its own text; identical references (a suite's runs share one) are stored once
+    references = sorted({pairs[i][1] for i in scored})
+    reference_index = {reference: len(scored) + position for position, reference in enumerate(references)}
+    texts = [pairs[i][0] or "" for i in scored] + references
+    response_docs = np.arange(len(scored), dtype=np.int64)
+    reference_docs = np.array([reference_index[pairs[i][1]] for i in scored], dtype=np.int64)
+
+    words = _Corpus(_encode([tokenize(text) for text in texts]))
+    characters = _Corpus([np.frombuffer("".join(text.split()).encode("utf-32-le"), dtype=np.uint32)
+                          for text in texts])
+    columns = {
+        "bleu": _bleu(words, response_docs, reference_docs),
+        "rouge_l": _rouge_l(words, response_docs, reference_docs),
+        "chrf": _chrf(characters, response_docs, reference_docs),
+        "tfidf": _tfidf(words, response_docs, reference_docs),
+        "bm25": _bm25(words, response_docs, reference_docs),
+    }
+
+    results: List[Optional[Dict[str, float]]] = [None] * len(pairs)
+    for position, index in enumerate(scored):
+        results[index] = {metric: round(float(columns[metric][position]), 4) for metric in METRICS}
+    return results
@@ -0,0 +1,206 @@
+"""Regression detection: compare every completed suite with the recent suites of the same model and prompt.
+
+Each completed suite adds a point to the (model, prompt) time series (database.models.ResultPoint)
+with the count, mean and standard deviation of its runs' score, latency and cost. The baseline is
+the REGRESSION_BASELINE_SUITES suites before it, pooled into one sample. That keeps the
+variation between suites, like a slower provider day, in the baseline's variance. Latency and cost
+are only compared with suites that ran the same way (direct or through a provider batch).
+
+A metric regresses when both of these hold:
+- the suite is worse than the baseline by at least the minimum effect: a score drop of
+  REGRESSION_MIN_SCORE_DROP, or a latency or cost increase of REGRESSION_MIN_LATENCY_INCREASE or
+  REGRESSION_MIN_COST_INCREASE (relative);
+- Welch's t-test puts the difference beyond the two-sided 95% critical value.
+
+An open regression is resolved by a later suite that is back within the minimum effect of the
+baseline it was flagged against. Failed runs (no output tokens) are left out of latency and cost.
+Re-judge suites generate nothing, so they are not added.
+"""
+import math
+import os
+import statistics
+from itertools import groupby
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from database import crud, models
+from benchmark.sampling import t_critical
+from events import broker
+import metrics
+
+BASELINE_SUITES = int(os.getenv("REGRESSION_BASELINE_SUITES", "5"))
+MIN_SCORE_DROP = float(os.getenv("REGRESSION_MIN_SCORE_DROP", "0.05"))
+MIN_LATENCY_INCREASE = float(os.getenv("REGRESSION_MIN_LATENCY_INCREASE", "0.25"))
+MIN_COST_INCREASE = float(os.getenv("REGRESSION_MIN_COST_INCREASE", "0.2"))
+
+METRICS = ("score", "latency", "cost")
+
+
+class Summary(NamedTuple):
+    n: int
+    mean: Optional[float]
+    std: Optional[float]
+
+
+class Finding(NamedTuple):
+    metric: str
+    baseline: Summary
+    current: Summary
+    t_statistic: Optional[float]
+    baseline_suites: int
+
+
+def summarize(values: Sequence[float]) -> Summary:
+    values = [value for value in values if value is not None]
+    if not values:
+        return Summary(0, None, None)
+    return Summary(len(values), statistics.mean(values), statistics.stdev(values) if len(values) > 1 else None)
+
+
+def pool(summaries: Sequence[Summary]) -> Summary:
+    """Summary of the union of several samples, including the spread between their means"""
+    summaries = [s for s in summaries if s.n]
+    n = sum(s.n for s in summaries)
+    if not n:
+        return Summary(0, None, None)
+    mean = sum(s.n * s.mean for s in summaries) / n
+    if n < 2:
+        return Summary(n, mean, None)
+    squares = sum((s.n - 1) * (s.std or 0.0) ** 2 + s.n * (s.mean - mean) ** 2 for s in summaries)
+    return Summary(n, mean, math.sqrt(squares / (n - 1)))
+
+
+def worsening(metric: str, baseline: Summary, current: Summary) -> float:
+    """How much worse the current mean is, in the unit the metric's minimum effect uses"""
+    if metric == "score":
+        return baseline.mean - current.mean
+    if not baseline.mean:
+        return 0.0
+    return (current.mean - baseline.mean) / baseline.mean
+
+
+def min_effect(metric: str) -> float:
+    return {"score": MIN_SCORE_DROP, "latency": MIN_LATENCY_INCREASE, "cost": MIN_COST_INCREASE}[metric]
+
+
+def welch_t(baseline: Summary, current: Summary):
+    """(t, degrees of freedom) for current minus baseline; t is None when neither sample varies"""
+    baseline_var = (baseline.std or 0.0) ** 2
+    # A single run has no spread of its own; assume the baseline's
+    current_var = current.std ** 2 if current.n > 1 else baseline_var
+    a, b = baseline_var / baseline.n, current_var / current.n
+    if a + b == 0:
+        return None, None
+    # Welch-Satterthwaite
+    denominator = a ** 2 / (baseline.n - 1) + (b ** 2 / (current.n - 1) if current.n > 1 else 0)
+    df = (a + b) ** 2 / denominator if denominator else 1
+    return (current.mean - baseline.mean) / math.sqrt(a + b), max(1, int(df))
+
+
+def evaluate(metric: str, baseline: Summary, current: Summary) -> Optional[Finding]:
+    """A finding when the current suite is significantly and meaningfully worse, else None"""
+    if baseline.n < 2 or not current.n:
+        return None
+    if worsening(metric, baseline, current) < min_effect(metric):
+        return None
+    t, df = welch_t(baseline, current)
+    # Higher is worse for latency and cost, lower for the score
+    if t is not None and (-t if metric == "score" else t) <= t_critical(df):
+        return None
+    return Finding(metric, baseline, current, t, 0)
+
+
+def suite_summaries(runs) -> Dict[str, Summary]:
+    """Summaries of a suite's runs (BenchmarkRun objects or rows with the same columns)"""
+    completed = [run for run in runs if run.output_tokens]
+    return {
+        "score": summarize([run.score for run in runs]),
+        "latency": summarize([run.run_time_ms for run in completed]),
+        "cost": summarize([run.cost_usd for run in completed]),
+    }
+
+
+def _point_summary(point: models.ResultPoint, metric: str) -> Summary:
+    return Summary(getattr(point, f"{metric}_n") or 0, getattr(point, f"{metric}_mean"), getattr(point, f"{metric}_std"))
+
+
+def _execution(runs) -> str:
+    return "batch" if any((run.run_metadata or {}).get("execution") == "batch" for run in runs) else "direct"
+
+
+def record_suite(db: Session, suite: models.BenchmarkSuite) -> List[models.Regression]:
+    """Add the suite to its (model, prompt) series and flag or resolve regressions; returns new regressions"""
+    runs = crud.get_suite_runs(db, suite.id)
+    execution = _execution(runs)
+    summaries = suite_summaries(runs)
+    prompt_id = suite.prompt_revision.prompt_id
+    previous = crud.get_result_points(db, suite.model_id, prompt_id, BASELINE_SUITES)
+    same_execution = crud.get_result_points(db, suite.model_id, prompt_id, BASELINE_SUITES, execution=execution)
+    point = crud.add_result_point(
+        db, suite.model_id, prompt_id, suite.prompt_revision_id, suite.id, execution, summaries
+    )
+
+    flagged = []
+    for metric in METRICS:
+        points = previous if metric == "score" else same_execution
+        baseline = pool([_point_summary(p, metric) for p in points])
+        current = summaries[metric]
+        if baseline.n < 2 or not current.n:
+            continue
+        crud.resolve_regressions(
+            db, suite.model_id, prompt_id, metric,
+            lambda regression: worsening(metric, Summary(0, regression.baseline_mean, None), current) < min_effect(metric),
+        )
+        finding = evaluate(metric, baseline, current)
+        if finding is None:
+            continue
+        flagged.append(crud.add_regression(
+            db, point, finding._replace(baseline_suites=len(points)),
+            revision_changed=points[0].prompt_revision_id != suite.prompt_revision_id,
+        ))
+        metrics.regressions.inc(metric=metric, model=suite.model.name)
+
+    db.commit()
+    for regression in flagged:
+        broker.publish("regression", describe(regression))
+    return flagged
+
+
+def backfill(db: Session) -> int:
+    """Build the series from completed suites that predate it, without flagging anything; returns points added"""
+    points = []
+    for suite_id, runs in groupby(crud.get_series_runs(db), key=lambda row: row.suite_id):
+        runs = list(runs)
+        if any("rejudge_of" in (run.run_metadata or {}) for run in runs):
+            continue
+        first = runs[0]
+        points.append((first.model_id, first.prompt_id, first.prompt_revision_id, suite_id, _execution(runs),
+                       suite_summaries(runs)))
+    # Written once the streaming query is done
+    for point in points:
+        crud.add_result_point(db, *point)
+    db.commit()
+    return len(points)
+
+
+def describe(regression: models.Regression) -> Dict:
+    return {
+        "id": regression.id,
+        "model_id": regression.model_id,
+        "model_name": regression.model.name,
+        "prompt_id": regression.prompt_id,
+        "prompt_name": regression.prompt.name,
+        "suite_id": regression.suite_id,
+        "metric": regression.metric,
+        "baseline_mean": regression.baseline_mean,
+        "current_mean": regression.current_mean,
+        "change": worsening(regression.metric, Summary(0, regression.baseline_mean, None),
+                            Summary(0, regression.current_mean, None)),
+        "t_statistic": regression.t_statistic,
+        "baseline_suites": regression.baseline_suites,
+        "revision_changed": regression.revision_changed,
+        "status": regression.status,
+        "created_at": regression.created_at.isoformat() if regression.created_at else None,
+        "resolved_at": regression.resolved_at.isoformat() if regression.resolved_at else None,
+    }
@@ -1,21 +1,32 @@
-import openai
 import time
 import os
 import asyncio
 import statistics
-from typing import Dict, Any, Tuple, List
-from dotenv import load_dotenv
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, Tuple, List
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database.models import BenchmarkSuite, BenchmarkRun
+from database.crud import store_content
+from benchmark.pricing import get_pricing
+from benchmark.sampling import confidence_interval
+from benchmark import agent, images
+from events import broker
+import metrics
+import tracing
 
-load_dotenv()
+if TYPE_CHECKING:
+    import openai
 
 class BenchmarkRunner:
     def __init__(self):
         self.openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
         self.openrouter_base_url = "https://openrouter.ai/api/v1"
     
-    def get_client(self, model_config: Dict[str, Any]) -> openai.AsyncOpenAI:
+    def get_client(self, model_config: Dict[str, Any]) -> "openai.AsyncOpenAI":
+        # The SDK takes about half a second to import, so it is loaded on the first request
+        import openai
+
         api_endpoint = model_config.get("api_endpoint")
         api_key_name = model_config.get("api_key_name")
         
@@ -31,7 +42,8 @@ class BenchmarkRunner:
                 base_url=self.openrouter_base_url
             )
     
-    async def run_benchmark(self, prompt_content: str, model_name: str, model_config: Dict[str, Any]) -> Tuple[str, int, int, float, int]:
+    async def run_benchmark(self, prompt_content: str, model_name: str, model_config: Dict[str, Any],
+                            encoded_images: List["images.EncodedImage"] = None) -> Tuple[str, int, int, float, int, int]:
         client = self.get_client(model_config)
         
         start_time = time.time()
@@ -40,7 +52,7 @@ class BenchmarkRunner:
             response = await client.chat.completions.create(
                 model=model_name,
                 messages=[
-                    {"role": "user", "content": prompt_content}
+                    {"role": "user", "content": images.message_content(prompt_content, encoded_images)}
                 ],
                 max_tokens=8192,
                 temperature=0.7
@@ -52,53 +64,85 @@ class BenchmarkRunner:
             response_text = response.choices[0].message.content
             input_tokens = response.usage.prompt_tokens
             output_tokens = response.usage.completion_tokens
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            cached_input_tokens = getattr(details, "cached_tokens", None) or 0
             
-            cost_usd = self.calculate_cost(model_name, input_tokens, output_tokens)
+            cost_usd = self.calculate_cost(model_name, input_tokens, output_tokens, cached_input_tokens)
+
+            metrics.provider_request_seconds.observe(end_time - start_time, model=model_name)
+            metrics.tokens.inc(input_tokens, model=model_name, direction="input")
+            metrics.tokens.inc(output_tokens, model=model_name, direction="output")
+            metrics.tokens.inc(cached_input_tokens, model=model_name, direction="cached_input")
+            metrics.cost_usd.inc(cost_usd, model=model_name)
             
-            return response_text, input_tokens, output_tokens, cost_usd, run_time_ms
+            return response_text, input_tokens, output_tokens, cost_usd, run_time_ms, cached_input_tokens
             
         except Exception as e:
             end_time = time.time()
             run_time_ms = int((end_time - start_time) * 1000)
-            return f"Error: {str(e)}", 0, 0, 0.0, run_time_ms
+            metrics.provider_request_seconds.observe(end_time - start_time, model=model_name)
+            metrics.errors.inc(stage="generation", model=model_name)
+            return f"Error: {str(e)}", 0, 0, 0.0, run_time_ms, 0
     
-    def calculate_cost(self, model_name: str, input_tokens: int, output_tokens: int) -> float:
-        pricing = {
-            "gpt-4": {"input": 0.03, "output": 0.06},
-            "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
-            "claude-3-opus": {"input": 0.015, "output": 0.075},
-            "claude-3-sonnet": {"input": 0.003, "output": 0.015},
-            "claude-3-haiku": {"input": 0.00025, "output": 0.00125},
-        }
-        
-        model_pricing = pricing.get(model_name, {"input": 0.001, "output": 0.002})
-        
-        input_cost = (input_tokens / 1000) * model_pricing["input"]
-        output_cost = (output_tokens / 1000) * model_pricing["output"]
-        
-        return input_cost + output_cost
+    def calculate_cost(self, model_name: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+        return get_pricing().cost(model_name, input_tokens, output_tokens, cached_input_tokens)
     
-    async def run_benchmark_suite(self, db: Session, suite_id: int, prompt_content: str, model_name: str, model_config: Dict[str, Any], run_count: int = 5) -> None:
-        """Run a benchmark suite with multiple runs and aggregate results"""
+    async def run_agent_benchmark(self, prompt_content, model_name: str, model_config: Dict[str, Any],
+                                  tools: "agent.ToolSet") -> Dict[str, Any]:
+        """One tool-calling episode, waiting for a free episode slot first"""
+        async with agent.episode_slot():
+            return await agent.run_episode(
+                self.get_client(model_config), model_name, prompt_content, tools, self.calculate_cost
+            )
+
+    async def run_benchmark_suite(self, db: Session, suite_id: int, prompt_content: str, model_name: str, model_config: Dict[str, Any],
+                                  run_count: int = 5, start_index: int = 1, complete: bool = True,
+                                  agent_tools=None, attachments=None, on_first_response=None) -> None:
+        """Run a batch of runs for a suite and aggregate results.
+
+        Adaptive suites call this repeatedly with increasing start_index and complete=False until the last batch.
+        With agent_tools, every run is a tool-calling episode and the batch's episodes run concurrently.
+        Image attachments are encoded once (see benchmark.images) and sent with every run.
+        on_first_response is called once the first run is back, so the provider has cached the prompt
+        prefix (see benchmark.scheduling).
+        """
         suite = db.query(BenchmarkSuite).filter(BenchmarkSuite.id == suite_id).first()
         if not suite:
             return
         
         suite.status = "running"
         db.commit()
+
+        encoded_images, image_stats = [], None
+        if attachments:
+            with tracing.span("encode_images", images=len(attachments)) as span:
+                encoded_images, image_stats = await images.prepare(attachments)
+                span.attributes.update(image_stats)
         
+        if agent_tools:
+            run_results = await self._run_agent_episodes(
+                suite_id, images.message_content(prompt_content, encoded_images), model_name, model_config,
+                agent.build(agent_tools), run_count, start_index, on_first_response
+            )
+            self._add_image_stats(run_results, model_name, image_stats)
+            with tracing.span("persist", runs=len(run_results)):
+                self.save_suite_results(db, suite_id, run_results, complete)
+            return
+
         run_results = []
         
-        for run_index in range(1, run_count + 1):
+        for run_index in range(start_index, start_index + run_count):
             try:
-                response_text, input_tokens, output_tokens, cost_usd, run_time_ms = await self.run_benchmark(
-                    prompt_content, model_name, model_config
-                )
+                with tracing.span("generation.request", model=model_name, run_index=run_index):
+                    response_text, input_tokens, output_tokens, cost_usd, run_time_ms, cached_input_tokens = await self.run_benchmark(
+                        prompt_content, model_name, model_config, encoded_images
+                    )
                 
                 run_results.append({
                     'response_text': response_text,
                     'input_tokens': input_tokens,
                     'output_tokens': output_tokens,
+                    'cached_input_tokens': cached_input_tokens,
                     'cost_usd': cost_usd,
                     'run_time_ms': run_time_ms,
                     'run_index': run_index
@@ -113,47 +157,102 @@ class BenchmarkRunner:
                     'run_time_ms': 0,
                     'run_index': run_index
                 })
+
+            self.publish_run(suite_id, model_name, start_index + run_count - 1, run_results[-1])
+            if on_first_response and run_index == start_index:
+                on_first_response()
         
-        self._save_suite_results(db, suite_id, run_results)
+        self._add_image_stats(run_results, model_name, image_stats)
+        with tracing.span("persist", runs=len(run_results)):
+            self.save_suite_results(db, suite_id, run_results, complete)
+
+    @staticmethod
+    def _add_image_stats(run_results: List[Dict[str, Any]], model_name: str, image_stats: Dict[str, Any]) -> None:
+        """Record the image payload of every run; the encode time is paid once per batch of runs"""
+        if not image_stats:
+            return
+        for result in run_results:
+            metrics.image_payload_bytes.observe(image_stats["payload_bytes"], model=model_name)
+            result['run_metadata'] = {**(result.get('run_metadata') or {}), "images": image_stats}
+
+    async def _run_agent_episodes(self, suite_id: int, prompt_content: str, model_name: str, model_config: Dict[str, Any],
+                                  tools: "agent.ToolSet", run_count: int, start_index: int,
+                                  on_first_response=None) -> List[Dict[str, Any]]:
+        async def run_one(run_index: int) -> Dict[str, Any]:
+            with tracing.span("agent.episode", model=model_name, run_index=run_index):
+                try:
+                    result = await self.run_agent_benchmark(prompt_content, model_name, model_config, tools)
+                except Exception as e:
+                    metrics.errors.inc(stage="generation", model=model_name)
+                    result = {
+                        'response_text': f"Error: {str(e)}",
+                        'input_tokens': 0,
+                        'output_tokens': 0,
+                        'cost_usd': 0.0,
+                        'run_time_ms': 0,
+                    }
+            result['run_index'] = run_index
+            self.publish_run(suite_id, model_name, start_index + run_count - 1, result)
+            if on_first_response:
+                on_first_response()
+            return result
+
+        return await asyncio.gather(*(run_one(run_index) for run_index in range(start_index, start_index + run_count)))
 
-    def _save_suite_results(self, db: Session, suite_id: int, run_results: List[Dict[str, Any]]) -> None:
-        """Save individual runs and calculate suite aggregates"""
+    def publish_run(self, suite_id: int, model_name: str, run_count: int, result: Dict[str, Any]) -> None:
+        """Announce a finished run on the live-update stream"""
+        broker.publish("run", {
+            "suite_id": suite_id,
+            "model_name": model_name,
+            "run_index": result['run_index'],
+            "run_count": run_count,
+            "input_tokens": result['input_tokens'],
+            "output_tokens": result['output_tokens'],
+            "cost_usd": result['cost_usd'],
+            "run_time_ms": result['run_time_ms'],
+            "failed": (result['response_text'] or "").startswith("Error:"),
+        })
+
+    def save_suite_results(self, db: Session, suite_id: int, run_results: List[Dict[str, Any]], complete: bool = True) -> None:
+        """Save individual runs and recalculate suite aggregates over all of the suite's runs"""
         suite = db.query(BenchmarkSuite).filter(BenchmarkSuite.id == suite_id).first()
         if not suite:
             return
         
-        scores = []
-        total_cost = 0.0
-        input_tokens_list = []
-        output_tokens_list = []
-        run_times_list = []
-        
         for result in run_results:
             benchmark_run = BenchmarkRun(
                 prompt_revision_id=suite.prompt_revision_id,
                 model_id=suite.model_id,
                 suite_id=suite_id,
                 run_index=result['run_index'],
-                response_text=result['response_text'],
+                response_hash=store_content(db, result['response_text']),
                 input_tokens=result['input_tokens'],
                 output_tokens=result['output_tokens'],
+                cached_input_tokens=result.get('cached_input_tokens'),
                 cost_usd=result['cost_usd'],
-                run_time_ms=result['run_time_ms']
+                run_time_ms=result['run_time_ms'],
+                run_metadata=result.get('run_metadata')
             )
             db.add(benchmark_run)
-            
-            total_cost += result['cost_usd']
-            input_tokens_list.append(result['input_tokens'])
-            output_tokens_list.append(result['output_tokens'])
-            run_times_list.append(result['run_time_ms'])
         
         db.commit()
         
-        suite.total_cost_usd = total_cost
-        suite.avg_input_tokens = statistics.mean(input_tokens_list) if input_tokens_list else 0
-        suite.avg_output_tokens = statistics.mean(output_tokens_list) if output_tokens_list else 0
-        suite.avg_run_time_ms = statistics.mean(run_times_list) if run_times_list else 0
-        suite.status = "completed"
+        run_count, total_cost, avg_input, avg_cached, avg_output, avg_run_time = db.query(
+            func.count(BenchmarkRun.id),
+            func.sum(BenchmarkRun.cost_usd),
+            func.avg(BenchmarkRun.input_tokens),
+            func.avg(BenchmarkRun.cached_input_tokens),
+            func.avg(BenchmarkRun.output_tokens),
+            func.avg(BenchmarkRun.run_time_ms),
+        ).filter(BenchmarkRun.suite_id == suite_id).one()
+        suite.run_count = run_count
+        suite.total_cost_usd = total_cost or 0.0
+        suite.avg_input_tokens = avg_input or 0
+        suite.avg_cached_input_tokens = avg_cached
+        suite.avg_output_tokens = avg_output or 0
+        suite.avg_run_time_ms = avg_run_time or 0
+        if complete:
+            suite.status = "completed"
         db.commit()
 
     def update_suite_scores(self, db: Session, suite_id: int) -> None:
@@ -174,9 +273,10 @@ class BenchmarkRunner:
             suite.avg_score = statistics.mean(scores)
             suite.min_score = min(scores)
             suite.std_dev_score = statistics.stdev(scores) if len(scores) > 1 else 0.0
+            suite.ci_low, suite.ci_high = confidence_interval(scores) or (None, None)
             db.commit()
 
-    async def run_benchmarks_batch(self, benchmark_data: List[Tuple[str, str, Dict[str, Any]]]) -> List[Tuple[str, int, int, float, int]]:
+    async def run_benchmarks_batch(self, benchmark_data: List[Tuple[str, str, Dict[str, Any]]]) -> List[Tuple[str, int, int, float, int, int]]:
         """Run multiple benchmarks concurrently, processing up to 5 at a time"""
         semaphore = asyncio.Semaphore(5)  # Limit to 5 concurrent requests
         
@@ -190,3 +290,9 @@ class BenchmarkRunner:
             tasks.append(task)
         
         return await asyncio.gather(*tasks)
+
+
+@lru_cache(maxsize=None)
+def get_runner() -> BenchmarkRunner:
+    """The runner shared by the app, created on first use"""
+    return BenchmarkRunner()
@@ -0,0 +1,68 @@
+"""Adaptive run counts: keep sampling a suite until the confidence interval on its mean score is tight enough.
+
+A suite in adaptive mode starts with ADAPTIVE_MIN_RUNS runs. After each scored batch, the 95%
+interval on the mean is checked. Sampling stops once its half-width is at most
+ADAPTIVE_TARGET_HALF_WIDTH or the suite reaches ADAPTIVE_MAX_RUNS. Otherwise the next batch is
+sized from the observed variance.
+"""
+import math
+import os
+import statistics
+from typing import List, Optional, Tuple
+
+FIXED_RUN_COUNT = 5
+MIN_RUNS = int(os.getenv("ADAPTIVE_MIN_RUNS", "3"))
+MAX_RUNS = int(os.getenv("ADAPTIVE_MAX_RUNS", "10"))
+TARGET_HALF_WIDTH = float(os.getenv("ADAPTIVE_TARGET_HALF_WIDTH", "0.05"))
+
+SAMPLING_MODES = ("fixed", "adaptive")
+
+# Two-sided 95% critical values of Student's t by degrees of freedom; the normal value beyond 30
+_T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def t_critical(df: int) -> float:
+    return _T_95[df - 1] if df <= len(_T_95) else 1.96
+
+
+def half_width(scores: List[float]) -> float:
+    """Half-width of the 95% interval on the mean (needs at least two scores)"""
+    return t_critical(len(scores) - 1) * statistics.stdev(scores) / math.sqrt(len(scores))
+
+
+def confidence_interval(scores: List[float]) -> Optional[Tuple[float, float]]:
+    """95% interval on the mean score, clipped to [0, 1]; None with fewer than two scores"""
+    if len(scores) < 2:
+        return None
+    mean, width = statistics.mean(scores), half_width(scores)
+    return max(0.0, mean - width), min(1.0, mean + width)
+
+
+def max_runs(sampling_mode: str) -> int:
+    return MAX_RUNS if sampling_mode == "adaptive" else FIXED_RUN_COUNT
+
+
+def initial_runs(sampling_mode: str) -> int:
+    return MIN_RUNS if sampling_mode == "adaptive" else FIXED_RUN_COUNT
+
+
+def next_batch_size(scores: List[float], runs_so_far: int, limit: int = None) -> int:
+    """How many more runs an adaptive suite needs; 0 means stop"""
+    limit = limit or MAX_RUNS
+    if runs_so_far >= limit:
+        return 0
+    if not scores:
+        # Nothing scored these runs, so more runs cannot narrow anything
+        return 0
+    if len(scores) < 2:
+        return 1
+
+    if half_width(scores) <= TARGET_HALF_WIDTH:
+        return 0
+
+    # n such that t * s / sqrt(n) <= target, with t at the current sample size
+    stdev = statistics.stdev(scores)
+    needed = math.ceil((t_critical(len(scores) - 1) * stdev / TARGET_HALF_WIDTH) ** 2)
+    return max(1, min(needed - len(scores), limit - runs_so_far))
@@ -0,0 +1,67 @@
+"""Prompt-cache-aware ordering of queue items.
+
+Providers cache long prompt prefixes per model for a few minutes. Cached input tokens cost less
+(`cached_input` in the pricing file) and come back faster. Two queue items share a cache entry
+when they use the same model and their prompts start with the same CACHE_PREFIX_CHARS characters.
+That covers the same prompt revision, and prompts that share a long system-style preamble.
+
+Pending items are ordered so that such items are admitted together; groups keep the order of their
+oldest item. Within a group, one leader starts first. Only once its first response is back does the
+rest of the group start, so their requests find the prefix cached. This wait is only worthwhile when
+the prompt is long enough to be cached (at least CACHE_PREFIX_CHARS characters, about 1024 tokens).
+Shorter prompts are grouped but start together. Followers stop waiting after CACHE_WARMUP_TIMEOUT seconds.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import metrics
+
+CACHE_AWARE_SCHEDULING = os.getenv("CACHE_AWARE_SCHEDULING", "true").lower() not in ("0", "false", "no")
+# About 1024 tokens, the shortest prefix providers cache
+CACHE_PREFIX_CHARS = int(os.getenv("CACHE_PREFIX_CHARS", "4096"))
+CACHE_WARMUP_TIMEOUT = float(os.getenv("CACHE_WARMUP_TIMEOUT", "60"))
+
+
+def cache_key(item) -> Optional[Hashable]:
+    """(model, prompt prefix) a queue item would hit in the provider cache; None for re-judges"""
+    if item.job_type == "rejudge":
+        return None
+    prefix = (item.prompt_revision.content or "")[:CACHE_PREFIX_CHARS]
+    return item.model_id, hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(item) -> bool:
+    return len(item.prompt_revision.content or "") >= CACHE_PREFIX_CHARS
+
+
+def order_for_cache(items: List) -> List:
+    """Items by created_at, with items sharing a cache key moved up next to the oldest of them"""
+    items = sorted(items, key=lambda item: item.created_at)
+    if not CACHE_AWARE_SCHEDULING:
+        return items
+    return [item for group in cache_groups(items) for item in group]
+
+
+def cache_groups(items: List) -> List[List]:
+    """Items split by cache key, in order of each group's first item; items without a key stand alone"""
+    groups: "OrderedDict[Hashable, List]" = OrderedDict()
+    for index, item in enumerate(items):
+        key = cache_key(item) if CACHE_AWARE_SCHEDULING else None
+        groups.setdefault(key if key is not None else ("single", index), []).append(item)
+    return list(groups.values())
+
+
+async def wait_for_warmup(warmed: asyncio.Event) -> str:
+    """Wait until the group leader's first response is back; returns 'warmed' or 'timeout'"""
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(warmed.wait(), CACHE_WARMUP_TIMEOUT)
+        outcome = "warmed"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    metrics.cache_warmup_seconds.observe(time.perf_counter() - start, outcome=outcome)
+    return outcome
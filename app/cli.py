@@ -0,0 +1,353 @@
+"""Command line maintenance tasks. Run from the app directory: python cli.py <command>"""
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+
+from database.database import engine, SessionLocal
+from database import models, crud, export, migrations
+from database.importer import parse_entries, import_entries
+import httpcache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate(args):
+    if args.status:
+        with engine.connect() as conn:
+            version = migrations.current_version(conn)
+        for migration in migrations.MIGRATIONS:
+            state = "applied" if migration.version <= version else "pending"
+            print(f"{migration.version:>4}  {state:<8} {migration.description}")
+        return
+    start = time.perf_counter()
+    applied = migrations.migrate(engine)
+    logger.info(f"Schema at version {migrations.LATEST}; applied {len(applied)} migration(s) "
+                f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def offload_content(args):
+    migrations.migrate(engine)
+
+    db = SessionLocal()
+    try:
+        migrated = crud.offload_inline_text(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"Moved inline text of {migrated} runs into the content table")
+
+
+def export_rows(args):
+    filters = {
+        "model_id": args.model_id,
+        "prompt_id": args.prompt_id,
+        "judge_model": args.judge_model,
+        "since": args.since,
+        "until": args.until,
+    }
+    if args.kind == "suites":
+        filters["status"] = args.status
+
+    db = SessionLocal()
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export.stream_export(
+            db, args.kind, args.format, filters,
+            include_text=args.include_text, chunk_size=args.chunk_size
+        ):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        db.close()
+
+
+def import_file(args):
+    with open(args.path, encoding="utf-8") as f:
+        entries = parse_entries(f.read(), args.path)
+
+    db = SessionLocal()
+    try:
+        summary = import_entries(db, entries, dry_run=args.dry_run)
+    finally:
+        db.close()
+    prefix = "Dry run: " if args.dry_run else ""
+    logger.info(f"{prefix}{len(entries)} entries: " + ", ".join(f"{k}={v}" for k, v in sorted(summary.items())))
+
+
+def reprice(args):
+    from benchmark.pricing import reload_pricing
+
+    migrations.migrate(engine)
+    pricing = reload_pricing(args.pricing_file)
+
+    db = SessionLocal()
+    try:
+        changed = crud.recompute_costs(db, pricing, model_id=args.model_id, batch_size=args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"Repriced {changed} runs")
+
+
+def reference_scores(args):
+    from benchmark import reference_metrics
+
+    if not reference_metrics.available():
+        logger.error("Reference scoring requires numpy")
+        sys.exit(1)
+    migrations.migrate(engine)
+
+    db = SessionLocal()
+    try:
+        scored = crud.recompute_reference_scores(
+            db, reference_metrics.score_pairs, prompt_id=args.prompt_id,
+            missing_only=not args.all, batch_size=args.batch_size,
+        )
+    finally:
+        db.close()
+    logger.info(f"Scored {scored} runs against their reference answers")
+
+
+def rejudge(args):
+    import asyncio
+    import main as app_main
+
+    migrations.migrate(engine)
+
+    db = SessionLocal()
+    try:
+        judges = []
+        for model_id in dict.fromkeys(args.judge_model_id):
+            judge_model = crud.get_model(db, model_id)
+            if not judge_model:
+                logger.error(f"No model with id {model_id}")
+                sys.exit(1)
+            judges.append((judge_model.name, judge_model.api_endpoint))
+
+        async def run_all():
+            for suite_id in args.suite_id:
+                await app_main.rejudge_suite(db, suite_id, judges, args.aggregation)
+                suite = crud.get_benchmark_suite(db, suite_id)
+                agreement = f", judge agreement {suite.judge_agreement:.2f}" if suite.judge_agreement is not None else ""
+                logger.info(f"Suite {suite_id}: avg score {suite.avg_score}{agreement}")
+
+        asyncio.run(run_all())
+    finally:
+        db.close()
+
+
+def _mock_config(args):
+    from perf.mock_server import MockConfig
+
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        output_tokens=args.output_tokens,
+        seed=args.seed,
+        batch_delay_s=args.batch_delay,
+        malformed_judge_rate=args.malformed_judge_rate,
+        supports_response_format=not args.no_response_format,
+        supports_tools=not args.no_tools,
+        agent_tool_turns=args.agent_tool_turns,
+        prompt_cache=not args.no_prompt_cache,
+    )
+
+
+def mock_server(args):
+    import uvicorn
+    from perf.mock_server import create_mock_app
+
+    uvicorn.run(create_mock_app(_mock_config(args)), host=args.host, port=args.port)
+
+
+def selfbench(args):
+    from perf.selfbench import run_selfbench, format_report
+
+    report = run_selfbench(
+        _mock_config(args),
+        requests=args.requests,
+        n_models=args.models,
+        n_prompts=args.prompts,
+        use_judge=not args.no_judge,
+        port=args.port,
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def seed_synthetic(args):
+    from perf.datagen import generate
+
+    migrations.migrate(engine)
+    counts = generate(
+        engine,
+        n_models=args.models,
+        n_prompts=args.prompts,
+        revisions_per_prompt=args.revisions,
+        models_per_revision=args.models_per_revision,
+        runs_per_suite=args.runs_per_suite,
+        seed=args.seed,
+    )
+    logger.info("Inserted " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+    from benchmark import regressions
+
+    db = SessionLocal()
+    try:
+        logger.info(f"Built {crud.rebuild_leaderboard_cells(db)} leaderboard cells "
+                    f"and {regressions.backfill(db)} regression series points")
+    finally:
+        db.close()
+
+
+def loadtest(args):
+    import asyncio
+    from perf.loadtest import DEFAULT_TARGETS, sample_ids, loadtest as run, over_query_budget
+    from perf.selfbench import format_report
+
+    db = SessionLocal()
+    try:
+        ids = sample_ids(db, seed=args.seed)
+    finally:
+        db.close()
+
+    report = asyncio.run(run(
+        args.url, ids,
+        targets=args.target or DEFAULT_TARGETS,
+        requests_per_target=args.requests,
+        concurrency=args.concurrency,
+        seed=args.seed,
+    ))
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_queries is not None:
+        failing = over_query_budget(report, args.max_queries)
+        if failing:
+            logger.error(f"Over the {args.max_queries}-query budget: {', '.join(failing)}")
+            sys.exit(1)
+
+
+def _add_mock_arguments(subparser, default_port):
+    subparser.add_argument("--port", type=int, default=default_port)
+    subparser.add_argument("--latency-ms", type=float, default=50.0, help="Time to first token")
+    subparser.add_argument("--tokens-per-second", type=float, default=500.0)
+    subparser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    subparser.add_argument("--output-tokens", type=int, default=200)
+    subparser.add_argument("--seed", type=int, default=0)
+    subparser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds before a submitted batch completes")
+    subparser.add_argument("--malformed-judge-rate", type=float, default=0.0,
+                           help="Fraction of judge verdicts returned as unparseable prose")
+    subparser.add_argument("--no-response-format", action="store_true", help="Reject response_format like a model without structured output")
+    subparser.add_argument("--no-tools", action="store_true", help="Reject tool definitions")
+    subparser.add_argument("--agent-tool-turns", type=int, default=1,
+                           help="Turns of tool calls before the mock answers a request that offers tools")
+    subparser.add_argument("--no-prompt-cache", action="store_true", help="Never report cached prompt tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM Benchmarking Tool maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Apply pending schema migrations")
+    migrate_parser.add_argument("--status", action="store_true", help="List migrations and whether they are applied")
+    migrate_parser.set_defaults(func=migrate)
+
+    offload = subparsers.add_parser(
+        "offload-content", help="Move inline response/judge text into the content table"
+    )
+    offload.add_argument("--batch-size", type=int, default=500)
+    offload.set_defaults(func=offload_content)
+
+    export_parser = subparsers.add_parser("export", help="Stream runs or suites to a file or stdout")
+    export_parser.add_argument("kind", choices=["runs", "suites"])
+    export_parser.add_argument("--format", choices=list(export.ENCODERS), default="jsonl")
+    export_parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    export_parser.add_argument("--model-id", type=int)
+    export_parser.add_argument("--prompt-id", type=int)
+    export_parser.add_argument("--judge-model")
+    export_parser.add_argument("--since", type=datetime.fromisoformat, help="ISO date, inclusive")
+    export_parser.add_argument("--until", type=datetime.fromisoformat, help="ISO date, exclusive")
+    export_parser.add_argument("--status", help="Suite status filter")
+    export_parser.add_argument("--include-text", action="store_true", help="Include response and judge text (runs only)")
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+    export_parser.set_defaults(func=export_rows)
+
+    import_parser = subparsers.add_parser("import", help="Upsert prompts and models from a JSONL/JSON/YAML file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    import_parser.set_defaults(func=import_file)
+
+    reprice_parser = subparsers.add_parser("reprice", help="Recompute stored run and suite costs from the pricing file")
+    reprice_parser.add_argument("--pricing-file", help="Pricing JSON (default: PRICING_FILE or benchmark/pricing.json)")
+    reprice_parser.add_argument("--model-id", type=int, help="Only reprice runs of this model")
+    reprice_parser.add_argument("--batch-size", type=int, default=5000)
+    reprice_parser.set_defaults(func=reprice)
+
+    reference_parser = subparsers.add_parser(
+        "reference-scores", help="Compare stored runs with their prompt revision's reference answer"
+    )
+    reference_parser.add_argument("--prompt-id", type=int, help="Only runs of this prompt")
+    reference_parser.add_argument("--all", action="store_true", help="Rescore runs that already have scores")
+    reference_parser.add_argument("--batch-size", type=int, default=5000)
+    reference_parser.set_defaults(func=reference_scores)
+
+    rejudge_parser = subparsers.add_parser(
+        "rejudge", help="Re-score existing suites with a judge panel without regenerating responses"
+    )
+    rejudge_parser.add_argument("--suite-id", type=int, nargs="+", required=True)
+    rejudge_parser.add_argument("--judge-model-id", type=int, action="append", required=True,
+                                help="Model id of a judge; repeat for a panel")
+    rejudge_parser.add_argument("--aggregation", choices=["mean", "median", "majority"], default="mean")
+    rejudge_parser.set_defaults(func=rejudge)
+
+    mock_parser = subparsers.add_parser("mock-server", help="Serve a local OpenAI-compatible stub API")
+    mock_parser.add_argument("--host", default="127.0.0.1")
+    _add_mock_arguments(mock_parser, default_port=8765)
+    mock_parser.set_defaults(func=mock_server)
+
+    bench_parser = subparsers.add_parser("selfbench", help="Benchmark this tool end to end against the stub API")
+    _add_mock_arguments(bench_parser, default_port=8765)
+    bench_parser.add_argument("--requests", type=int, default=100, help="Direct runner and judge calls")
+    bench_parser.add_argument("--models", type=int, default=4)
+    bench_parser.add_argument("--prompts", type=int, default=5)
+    bench_parser.add_argument("--no-judge", action="store_true", help="Score queue items without the LLM judge")
+    bench_parser.add_argument("--json", help="Also write the report to this file")
+    bench_parser.set_defaults(func=selfbench)
+
+    seed_parser = subparsers.add_parser("seed-synthetic", help="Fill the database with synthetic data for load testing")
+    seed_parser.add_argument("--models", type=int, default=200)
+    seed_parser.add_argument("--prompts", type=int, default=2000)
+    seed_parser.add_argument("--revisions", type=int, default=3, help="Revisions per prompt")
+    seed_parser.add_argument("--models-per-revision", type=int, default=40, help="Models benchmarked on each revision")
+    seed_parser.add_argument("--runs-per-suite", type=int, default=5)
+    seed_parser.add_argument("--seed", type=int, default=0)
+    seed_parser.set_defaults(func=seed_synthetic)
+
+    load_parser = subparsers.add_parser("loadtest", help="Hit the pages and JSON endpoints concurrently")
+    load_parser.add_argument("--url", help="Base URL of a running server (default: the app in-process)")
+    load_parser.add_argument("--target", action="append",
+                             help="Path to request, may contain {prompt_id}, {model_id} or {suite_id}; repeatable")
+    load_parser.add_argument("--requests", type=int, default=50, help="Requests per target")
+    load_parser.add_argument("--concurrency", type=int, default=10)
+    load_parser.add_argument("--max-queries", type=int, help="Exit non-zero if any request runs more SQL statements")
+    load_parser.add_argument("--seed", type=int, default=0)
+    load_parser.add_argument("--json", help="Also write the report to this file")
+    load_parser.set_defaults(func=loadtest)
+
+    args = parser.parse_args()
+    # Pages cached by a running server are revalidated after writes from these commands too
+    httpcache.track_writes(engine)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
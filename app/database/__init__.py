@@ -1,2 +1,2 @@
-from .database import Base, engine, SessionLocal, get_db
+from .database import Base, engine, SessionLocal, get_db, add_missing_columns
 from . import models, crud
\ No newline at end of file
@@ -0,0 +1,54 @@
+import gzip
+import hashlib
+import os
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Texts shorter than this are stored as-is; compressing them costs more than it saves.
+MIN_COMPRESS_BYTES = 512
+
+
+def get_codec() -> str:
+    """Codec for newly stored content: CONTENT_COMPRESSION=zstd|gzip|none"""
+    codec = os.getenv("CONTENT_COMPRESSION", "zstd" if zstandard else "gzip").lower()
+    if codec == "zstd" and zstandard is None:
+        return "gzip"
+    if codec not in ("zstd", "gzip", "none"):
+        return "none"
+    return codec
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    if codec == "gzip":
+        return gzip.compress(raw, compresslevel=6)
+    return raw
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed content")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+def encode_text(text: str) -> Tuple[str, str, int, bytes]:
+    """Return (hash, codec, raw size, stored bytes) for a piece of text"""
+    raw = text.encode("utf-8")
+    codec = get_codec() if len(raw) >= MIN_COMPRESS_BYTES else "none"
+    data = compress(raw, codec)
+    if len(data) >= len(raw):
+        codec, data = "none", raw
+    return hashlib.sha256(raw).hexdigest(), codec, len(raw), data
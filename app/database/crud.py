@@ -1,7 +1,8 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy.orm import Session, selectinload, undefer
+from sqlalchemy import desc, and_, case, func, select, update
 from . import models
-from typing import List, Optional
+from .content import encode_text
+from typing import Dict, List, Optional
 
 def get_model_types(db: Session):
     return db.query(models.ModelType).all()
@@ -19,27 +20,49 @@ def get_prompts(db: Session, skip: int = 0, limit: int = 100):
 def get_prompt(db: Session, prompt_id: int):
     return db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
 
-def create_prompt(db: Session, name: str, model_type_id: int, content: str, rubric_prompt: str = None):
+def create_prompt(db: Session, name: str, model_type_id: int, content: str, rubric_prompt: str = None,
+                  evaluator_config=None, reference_answer: str = None, agent_tools=None, images=None):
     db_prompt = models.Prompt(name=name, model_type_id=model_type_id)
-    db.add(db_prompt)
-    db.commit()
-    db.refresh(db_prompt)
-    
-    db_revision = models.PromptRevision(
-        prompt_id=db_prompt.id,
+    db_prompt.revisions.append(models.PromptRevision(
         content=content,
         rubric_prompt=rubric_prompt,
+        evaluator_config=evaluator_config,
+        reference_answer=reference_answer,
+        agent_tools=agent_tools,
+        attachments=_attachments(images or []),
         version_number=1,
         is_current=True,
         needs_rerun=True
-    )
-    db.add(db_revision)
+    ))
+    db.add(db_prompt)
     db.commit()
-    db.refresh(db_revision)
     
     return db_prompt
 
-def create_prompt_revision(db: Session, prompt_id: int, content: str, rubric_prompt: str = None):
+ATTACHMENT_COPY_COLUMNS = ("position", "filename", "content_type", "sha256", "path", "size_bytes", "width", "height")
+
+def _attachments(images):
+    """PromptAttachment rows for (filename, images.StoredImage) pairs"""
+    return [
+        models.PromptAttachment(
+            position=position, filename=filename, content_type=stored.content_type, sha256=stored.sha256,
+            path=stored.path, size_bytes=stored.size_bytes, width=stored.width, height=stored.height,
+        )
+        for position, (filename, stored) in enumerate(images)
+    ]
+
+def copy_attachments(revision):
+    """Rows pointing at the same files as another revision's attachments"""
+    if revision is None:
+        return []
+    return [
+        models.PromptAttachment(**{column: getattr(attachment, column) for column in ATTACHMENT_COPY_COLUMNS})
+        for attachment in revision.attachments
+    ]
+
+def create_prompt_revision(db: Session, prompt_id: int, content: str, rubric_prompt: str = None,
+                           evaluator_config=None, reference_answer: str = None, agent_tools=None, images=None):
+    """New current revision. images replaces the attachments; None keeps the current revision's"""
     current_revision = db.query(models.PromptRevision).filter(
         and_(models.PromptRevision.prompt_id == prompt_id, models.PromptRevision.is_current == True)
     ).first()
@@ -54,6 +77,10 @@ def create_prompt_revision(db: Session, prompt_id: int, content: str, rubric_pro
         prompt_id=prompt_id,
         content=content,
         rubric_prompt=rubric_prompt,
+        evaluator_config=evaluator_config,
+        reference_answer=reference_answer,
+        agent_tools=agent_tools,
+        attachments=_attachments(images) if images is not None else copy_attachments(current_revision),
         version_number=new_version,
         is_current=True,
         needs_rerun=True
@@ -80,12 +107,14 @@ def get_models(db: Session, skip: int = 0, limit: int = 100):
 def get_model(db: Session, model_id: int):
     return db.query(models.Model).filter(models.Model.id == model_id).first()
 
-def create_model(db: Session, name: str, model_type_id: int, api_endpoint: str = None, api_key_name: str = None):
+def create_model(db: Session, name: str, model_type_id: int, api_endpoint: str = None, api_key_name: str = None,
+                 daily_budget_usd: float = None):
     db_model = models.Model(
         name=name,
         model_type_id=model_type_id,
         api_endpoint=api_endpoint,
-        api_key_name=api_key_name
+        api_key_name=api_key_name,
+        daily_budget_usd=daily_budget_usd
     )
     db.add(db_model)
     db.commit()
@@ -109,9 +138,9 @@ def create_benchmark_run(db: Session, prompt_revision_id: int, model_id: int, re
         model_id=model_id,
         judge_model=judge_model,
         judge_base_url=judge_base_url,
-        response_text=response_text,
+        response_hash=store_content(db, response_text),
         score=score,
-        judge_reasoning=judge_reasoning,
+        judge_reasoning_hash=store_content(db, judge_reasoning),
         input_tokens=input_tokens,
         output_tokens=output_tokens,
         cost_usd=cost_usd,
@@ -123,6 +152,265 @@ def create_benchmark_run(db: Session, prompt_revision_id: int, model_id: int, re
     db.refresh(db_run)
     return db_run
 
+def store_content(db: Session, text: Optional[str]) -> Optional[str]:
+    """Store text in the content table and return its hash.
+
+    Identical texts share one row. The caller is responsible for committing.
+    """
+    if text is None:
+        return None
+
+    digest, codec, size_bytes, data = encode_text(text)
+    if db.get(models.Content, digest) is None:
+        db.add(models.Content(hash=digest, codec=codec, size_bytes=size_bytes, data=data))
+        # Flush so later lookups in the same transaction see the new row
+        db.flush()
+    return digest
+
+def set_run_text(db: Session, run: models.BenchmarkRun, response_text: str = None, judge_reasoning: str = None):
+    """Point a run at stored response/judge text without committing"""
+    if response_text is not None:
+        run.response_hash = store_content(db, response_text)
+        run.inline_response_text = None
+    if judge_reasoning is not None:
+        run.judge_reasoning_hash = store_content(db, judge_reasoning)
+        run.inline_judge_reasoning = None
+
+def get_judge_scores(db: Session, run_ids: List[int]) -> Dict[int, List[models.JudgeScore]]:
+    """Stored judge verdicts for the given runs, by run id"""
+    scores = {run_id: [] for run_id in run_ids}
+    if run_ids:
+        rows = (
+            db.query(models.JudgeScore)
+            .options(selectinload(models.JudgeScore.reasoning_content))
+            .filter(models.JudgeScore.run_id.in_(run_ids))
+            .order_by(models.JudgeScore.id)
+            .all()
+        )
+        for row in rows:
+            scores[row.run_id].append(row)
+    return scores
+
+def get_judge_parse_stats(db: Session) -> List[dict]:
+    """Per judge model: stored verdicts, how many needed a repair request and how many could not be parsed"""
+    JS = models.JudgeScore
+    rows = db.query(
+        JS.judge_model,
+        func.count(JS.id),
+        func.sum(case((JS.parse_outcome == "repaired", 1), else_=0)),
+        func.sum(case((JS.parse_outcome == "failed", 1), else_=0)),
+    ).filter(JS.parse_outcome.isnot(None)).group_by(JS.judge_model).order_by(JS.judge_model).all()
+    return [
+        {
+            "judge_model": judge_model,
+            "verdicts": total,
+            "repaired": repaired or 0,
+            "failed": failed or 0,
+            "failure_rate": (failed or 0) / total if total else 0.0,
+        }
+        for judge_model, total, repaired, failed in rows
+    ]
+
+def add_judge_score(db: Session, run: models.BenchmarkRun, judge_model: str, judge_base_url: Optional[str],
+                    score: Optional[float], reasoning: Optional[str], input_tokens: int = None,
+                    output_tokens: int = None, cost_usd: float = None, protocol: str = None,
+                    parse_outcome: str = None, existing: models.JudgeScore = None) -> models.JudgeScore:
+    """Record one judge's verdict on a run without committing.
+
+    Passing the judge's earlier unparsed verdict as `existing` replaces it, keeping the usage of both attempts.
+    """
+    if existing is not None:
+        existing.score = score
+        existing.reasoning_hash = store_content(db, reasoning)
+        existing.input_tokens = (existing.input_tokens or 0) + (input_tokens or 0)
+        existing.output_tokens = (existing.output_tokens or 0) + (output_tokens or 0)
+        existing.cost_usd = (existing.cost_usd or 0.0) + (cost_usd or 0.0)
+        existing.protocol = protocol
+        existing.parse_outcome = parse_outcome
+        return existing
+
+    judge_score = models.JudgeScore(
+        run_id=run.id,
+        judge_model=judge_model,
+        judge_base_url=judge_base_url,
+        score=score,
+        reasoning_hash=store_content(db, reasoning),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cost_usd=cost_usd,
+        protocol=protocol,
+        parse_outcome=parse_outcome,
+    )
+    db.add(judge_score)
+    return judge_score
+
+def offload_inline_text(db: Session, batch_size: int = 500) -> int:
+    """Move legacy inline response_text/judge_reasoning values into the content table"""
+    migrated = 0
+    while True:
+        runs = db.query(models.BenchmarkRun).options(
+            undefer(models.BenchmarkRun.inline_response_text),
+            undefer(models.BenchmarkRun.inline_judge_reasoning)
+        ).filter(
+            (models.BenchmarkRun.inline_response_text.isnot(None))
+            | (models.BenchmarkRun.inline_judge_reasoning.isnot(None))
+        ).limit(batch_size).all()
+        if not runs:
+            break
+
+        for run in runs:
+            set_run_text(db, run, run.inline_response_text, run.inline_judge_reasoning)
+        db.commit()
+        migrated += len(runs)
+
+    return migrated
+
+def recompute_reference_scores(db: Session, score_pairs, prompt_id: Optional[int] = None,
+                               missing_only: bool = True, batch_size: int = 5000) -> int:
+    """Compare stored runs with their revision's reference answer, one vectorized pass and commit per batch.
+
+    `score_pairs` is benchmark.reference_metrics.score_pairs. Returns the number of runs scored.
+    """
+    Run = models.BenchmarkRun
+    query = (
+        with_run_text(db.query(Run))
+        .options(selectinload(Run.prompt_revision))
+        .join(models.PromptRevision, Run.prompt_revision_id == models.PromptRevision.id)
+        .filter(models.PromptRevision.reference_answer.isnot(None))
+        .order_by(Run.id)
+    )
+    if prompt_id is not None:
+        query = query.filter(models.PromptRevision.prompt_id == prompt_id)
+    if missing_only:
+        query = query.filter(Run.reference_scores.is_(None))
+
+    scored, last_id = 0, 0
+    while True:
+        runs = query.filter(Run.id > last_id).limit(batch_size).all()
+        if not runs:
+            break
+        last_id = runs[-1].id
+        results = score_pairs([(run.response_text, run.prompt_revision.reference_answer) for run in runs])
+        for run, result in zip(runs, results):
+            if result is not None:
+                run.reference_scores = result
+                scored += 1
+        db.commit()
+        db.expunge_all()
+    return scored
+
+def recompute_costs(db: Session, pricing, model_id: Optional[int] = None, batch_size: int = 5000) -> int:
+    """Reprice stored runs (generation and judge calls) with the given pricing table and refresh suite totals.
+
+    Runs are priced as of their creation date (at the batch discount if they went through a provider
+    batch, with their cached prompt tokens at the cached rate) and walked in id order, one commit per
+    batch. Per-judge verdicts are repriced too, and a run's judge cost is the sum of its verdicts.
+    Returns the number of runs whose cost changed.
+    """
+    Run = models.BenchmarkRun
+    Score = models.JudgeScore
+    has_judge_scores = select(Score.id).where(Score.run_id == Run.id).exists()
+    query = (
+        select(Run.id, Run.suite_id, models.Model.name, Run.input_tokens, Run.cached_input_tokens, Run.output_tokens,
+               Run.cost_usd,
+               Run.judge_model, Run.judge_input_tokens, Run.judge_output_tokens, Run.judge_cost_usd, Run.created_at,
+               Run.run_metadata, has_judge_scores.label("has_judge_scores"))
+        .join(models.Model, Run.model_id == models.Model.id)
+        .order_by(Run.id)
+        .limit(batch_size)
+    )
+    if model_id is not None:
+        query = query.where(Run.model_id == model_id)
+
+    repriced_runs, changed_suites, last_id = set(), set(), 0
+    while True:
+        rows = db.execute(query.where(Run.id > last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        updates = []
+        for row in rows:
+            run_metadata = row.run_metadata or {}
+            if "rejudge_of" in run_metadata:
+                # Copies made for a re-judge did not generate anything
+                cost = 0.0
+            else:
+                batch = run_metadata.get("execution") == "batch"
+                cost = pricing.cost(row.name, row.input_tokens, row.output_tokens, row.cached_input_tokens,
+                                    at=row.created_at, batch=batch)
+            judge_cost = row.judge_cost_usd
+            # Runs with per-judge verdicts are repriced from those below
+            if row.judge_model and row.judge_input_tokens is not None and not row.has_judge_scores:
+                judge_cost = pricing.cost(row.judge_model, row.judge_input_tokens, row.judge_output_tokens,
+                                          at=row.created_at)
+            if abs(cost - (row.cost_usd or 0.0)) > 1e-12 or judge_cost != row.judge_cost_usd:
+                updates.append({"id": row.id, "cost_usd": cost, "judge_cost_usd": judge_cost})
+                if row.suite_id is not None:
+                    changed_suites.add(row.suite_id)
+        if updates:
+            db.execute(update(Run), updates)
+            db.commit()
+            repriced_runs.update(u["id"] for u in updates)
+
+    score_query = (
+        select(Score.id, Score.run_id, Score.judge_model, Score.input_tokens, Score.output_tokens, Score.cost_usd,
+               Score.created_at)
+        .join(Run, Score.run_id == Run.id)
+        .where(Score.input_tokens.isnot(None))
+        .order_by(Score.id)
+        .limit(batch_size)
+    )
+    if model_id is not None:
+        score_query = score_query.where(Run.model_id == model_id)
+
+    changed_runs, last_id = set(), 0
+    while True:
+        rows = db.execute(score_query.where(Score.id > last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        updates = []
+        for row in rows:
+            cost = pricing.cost(row.judge_model, row.input_tokens, row.output_tokens, at=row.created_at)
+            if abs(cost - (row.cost_usd or 0.0)) > 1e-12:
+                updates.append({"id": row.id, "cost_usd": cost})
+                changed_runs.add(row.run_id)
+        if updates:
+            db.execute(update(Score), updates)
+            db.commit()
+
+    run_ids = sorted(changed_runs)
+    for start in range(0, len(run_ids), batch_size):
+        chunk = run_ids[start:start + batch_size]
+        totals = db.execute(
+            select(Score.run_id, func.sum(Score.cost_usd), Run.suite_id)
+            .join(Run, Score.run_id == Run.id)
+            .where(Score.run_id.in_(chunk))
+            .group_by(Score.run_id, Run.suite_id)
+        ).all()
+        db.execute(update(Run), [{"id": run_id, "judge_cost_usd": total} for run_id, total, _ in totals])
+        db.commit()
+        repriced_runs.update(run_id for run_id, _, _ in totals)
+        changed_suites.update(suite_id for _, _, suite_id in totals if suite_id is not None)
+
+    suite_ids = sorted(changed_suites)
+    for start in range(0, len(suite_ids), batch_size):
+        chunk = suite_ids[start:start + batch_size]
+        totals = db.execute(
+            select(Run.suite_id, func.sum(Run.cost_usd), func.sum(Run.judge_cost_usd))
+            .where(Run.suite_id.in_(chunk))
+            .group_by(Run.suite_id)
+        ).all()
+        db.execute(update(models.BenchmarkSuite), [
+            {"id": suite_id, "total_cost_usd": total, "judge_cost_usd": judge_total}
+            for suite_id, total, judge_total in totals
+        ])
+        db.commit()
+
+    return len(repriced_runs)
+
 def get_prompts_needing_rerun(db: Session):
     return db.query(models.PromptRevision).filter(
         and_(models.PromptRevision.needs_rerun == True, models.PromptRevision.is_current == True)
@@ -135,12 +423,15 @@ def mark_revision_as_run(db: Session, revision_id: int):
         db.commit()
     return revision
 
-def add_to_queue(db: Session, model_id: int, prompt_revision_id: int, judge_model: str = None, judge_base_url: str = None):
+def add_to_queue(db: Session, model_id: int, prompt_revision_id: int, judge_model: str = None, judge_base_url: str = None,
+                 sampling_mode: str = "fixed", is_urgent: bool = True, judge_panel: list = None,
+                 judge_aggregation: str = "mean"):
     existing = db.query(models.RunQueue).filter(
         and_(
             models.RunQueue.model_id == model_id,
             models.RunQueue.prompt_revision_id == prompt_revision_id,
-            models.RunQueue.status == "pending"
+            models.RunQueue.status == "pending",
+            func.coalesce(models.RunQueue.job_type, "generate") != "rejudge"
         )
     ).first()
     
@@ -149,7 +440,11 @@ def add_to_queue(db: Session, model_id: int, prompt_revision_id: int, judge_mode
             model_id=model_id, 
             prompt_revision_id=prompt_revision_id,
             judge_model=judge_model,
-            judge_base_url=judge_base_url
+            judge_base_url=judge_base_url,
+            sampling_mode=sampling_mode,
+            is_urgent=is_urgent,
+            judge_panel=judge_panel or None,
+            judge_aggregation=judge_aggregation
         )
         db.add(queue_item)
         db.commit()
@@ -157,6 +452,104 @@ def add_to_queue(db: Session, model_id: int, prompt_revision_id: int, judge_mode
         return queue_item
     return existing
 
+def add_rejudge_to_queue(db: Session, source_suite: models.BenchmarkSuite, prompt_revision_id: int,
+                         judge_model: str = None, judge_base_url: str = None, judge_panel: list = None,
+                         judge_aggregation: str = "mean"):
+    """Queue a re-judge of an existing suite's responses against a (usually newer) revision's rubric"""
+    existing = db.query(models.RunQueue).filter(
+        models.RunQueue.job_type == "rejudge",
+        models.RunQueue.source_suite_id == source_suite.id,
+        models.RunQueue.prompt_revision_id == prompt_revision_id,
+        models.RunQueue.status == "pending",
+    ).first()
+    if existing:
+        return existing
+
+    queue_item = models.RunQueue(
+        model_id=source_suite.model_id,
+        prompt_revision_id=prompt_revision_id,
+        judge_model=judge_model,
+        judge_base_url=judge_base_url,
+        judge_panel=judge_panel or None,
+        judge_aggregation=judge_aggregation,
+        job_type="rejudge",
+        source_suite_id=source_suite.id,
+    )
+    db.add(queue_item)
+    db.commit()
+    db.refresh(queue_item)
+    return queue_item
+
+def get_rejudge_sources(db: Session, prompt_revision: models.PromptRevision) -> List[models.BenchmarkSuite]:
+    """Latest completed suite per model on any revision of the prompt with the same content.
+
+    Only those responses answer the same prompt, so only they can be scored against the revision's rubric.
+    """
+    revision_ids = [
+        revision_id for (revision_id,) in db.query(models.PromptRevision.id).filter(
+            models.PromptRevision.prompt_id == prompt_revision.prompt_id,
+            models.PromptRevision.content == prompt_revision.content,
+        )
+    ]
+    suites = (
+        db.query(models.BenchmarkSuite)
+        .filter(
+            models.BenchmarkSuite.prompt_revision_id.in_(revision_ids),
+            models.BenchmarkSuite.status == "completed",
+        )
+        .order_by(desc(models.BenchmarkSuite.created_at), desc(models.BenchmarkSuite.id))
+        .all()
+    )
+    latest = {}
+    for suite in suites:
+        latest.setdefault(suite.model_id, suite)
+    return list(latest.values())
+
+def clone_suite_for_rejudge(db: Session, source_suite: models.BenchmarkSuite, prompt_revision_id: int) -> models.BenchmarkSuite:
+    """New suite on prompt_revision_id holding unscored copies of the source suite's runs.
+
+    Copies share the stored response text. They cost nothing, since no generation happens;
+    run_metadata.rejudge_of points at the original run.
+    """
+    source_runs = (
+        db.query(models.BenchmarkRun)
+        .filter(models.BenchmarkRun.suite_id == source_suite.id)
+        .order_by(models.BenchmarkRun.run_index, models.BenchmarkRun.id)
+        .all()
+    )
+    suite = models.BenchmarkSuite(
+        prompt_revision_id=prompt_revision_id,
+        model_id=source_suite.model_id,
+        run_count=len(source_runs),
+        status="running",
+        total_cost_usd=0.0,
+        avg_input_tokens=source_suite.avg_input_tokens,
+        avg_cached_input_tokens=source_suite.avg_cached_input_tokens,
+        avg_output_tokens=source_suite.avg_output_tokens,
+        avg_run_time_ms=source_suite.avg_run_time_ms,
+    )
+    db.add(suite)
+    db.flush()
+    for run in source_runs:
+        if run.response_hash is None and run.inline_response_text is not None:
+            set_run_text(db, run, response_text=run.inline_response_text)
+        db.add(models.BenchmarkRun(
+            prompt_revision_id=prompt_revision_id,
+            model_id=run.model_id,
+            suite_id=suite.id,
+            run_index=run.run_index,
+            response_hash=run.response_hash,
+            input_tokens=run.input_tokens,
+            cached_input_tokens=run.cached_input_tokens,
+            output_tokens=run.output_tokens,
+            cost_usd=0.0,
+            run_time_ms=run.run_time_ms,
+            run_metadata={**(run.run_metadata or {}), "rejudge_of": run.id},
+        ))
+    db.commit()
+    db.refresh(suite)
+    return suite
+
 def add_to_queue_batch(db: Session, queue_items: List[dict]):
     """Batch add multiple items to queue efficiently"""
     new_items = []
@@ -172,7 +565,8 @@ def add_to_queue_batch(db: Session, queue_items: List[dict]):
             and_(
                 models.RunQueue.model_id == model_id,
                 models.RunQueue.prompt_revision_id == prompt_revision_id,
-                models.RunQueue.status == "pending"
+                models.RunQueue.status == "pending",
+                func.coalesce(models.RunQueue.job_type, "generate") != "rejudge"
             )
         ).first()
         
@@ -181,7 +575,11 @@ def add_to_queue_batch(db: Session, queue_items: List[dict]):
                 model_id=model_id,
                 prompt_revision_id=prompt_revision_id,
                 judge_model=judge_model,
-                judge_base_url=judge_base_url
+                judge_base_url=judge_base_url,
+                sampling_mode=item.get('sampling_mode', "fixed"),
+                is_urgent=item.get('is_urgent', True),
+                judge_panel=item.get('judge_panel'),
+                judge_aggregation=item.get('judge_aggregation', "mean")
             )
             new_items.append(queue_item)
     
@@ -199,6 +597,11 @@ def get_queue_items(db: Session, status: str = None):
         query = query.filter(models.RunQueue.status == status)
     return query.order_by(models.RunQueue.created_at).all()
 
+def get_queue_depth(db: Session):
+    """Number of queue items per status"""
+    rows = db.query(models.RunQueue.status, func.count(models.RunQueue.id)).group_by(models.RunQueue.status).all()
+    return {status: count for status, count in rows}
+
 def create_benchmark_suite(db: Session, prompt_revision_id: int, model_id: int, run_count: int = 5):
     db_suite = models.BenchmarkSuite(
         prompt_revision_id=prompt_revision_id,
@@ -222,10 +625,30 @@ def get_benchmark_suites(db: Session, prompt_id: int = None, model_id: int = Non
 def get_benchmark_suite(db: Session, suite_id: int):
     return db.query(models.BenchmarkSuite).filter(models.BenchmarkSuite.id == suite_id).first()
 
-def get_suite_runs(db: Session, suite_id: int):
-    return db.query(models.BenchmarkRun).filter(
+def with_run_text(query):
+    """Eager-load response and judge text for a BenchmarkRun query in a constant number of queries"""
+    return query.options(
+        selectinload(models.BenchmarkRun.response_content),
+        selectinload(models.BenchmarkRun.judge_reasoning_content),
+        undefer(models.BenchmarkRun.inline_response_text),
+        undefer(models.BenchmarkRun.inline_judge_reasoning)
+    )
+
+def get_benchmark_run(db: Session, run_id: int, with_text: bool = False):
+    query = db.query(models.BenchmarkRun).filter(models.BenchmarkRun.id == run_id)
+    if with_text:
+        query = with_run_text(query)
+    return query.first()
+
+def get_suite_runs(db: Session, suite_id: int, with_text: bool = False, unscored_only: bool = False):
+    query = db.query(models.BenchmarkRun).filter(
         models.BenchmarkRun.suite_id == suite_id
-    ).order_by(models.BenchmarkRun.run_index).all()
+    ).order_by(models.BenchmarkRun.run_index)
+    if unscored_only:
+        query = query.filter(models.BenchmarkRun.score.is_(None))
+    if with_text:
+        query = with_run_text(query)
+    return query.all()
 
 def get_suites_for_results_display(db: Session):
     """Get all completed suites with their related data for results display"""
@@ -244,3 +667,163 @@ def get_suites_by_prompt(db: Session, prompt_id: int):
             models.BenchmarkSuite.avg_score.isnot(None)
         )
     ).order_by(desc(models.BenchmarkSuite.avg_score)).all()
+
+def _cell_scores_query(db: Session):
+    """Scored runs of completed suites, the data leaderboard cells are built from"""
+    return (
+        db.query(models.BenchmarkSuite.model_id, models.BenchmarkSuite.prompt_revision_id, models.BenchmarkRun.score)
+        .join(models.BenchmarkRun, models.BenchmarkRun.suite_id == models.BenchmarkSuite.id)
+        .filter(models.BenchmarkSuite.status == "completed", models.BenchmarkRun.score.isnot(None))
+    )
+
+def refresh_leaderboard_cell(db: Session, model_id: int, prompt_revision_id: int) -> Optional[models.LeaderboardCell]:
+    """Re-collect one model's scores on one prompt revision; the cell is dropped when none are left"""
+    Cell = models.LeaderboardCell
+    scores = [
+        row.score for row in _cell_scores_query(db)
+        .filter(models.BenchmarkSuite.model_id == model_id, models.BenchmarkSuite.prompt_revision_id == prompt_revision_id)
+        .order_by(models.BenchmarkRun.id)
+    ]
+    cell = db.query(Cell).filter(Cell.model_id == model_id, Cell.prompt_revision_id == prompt_revision_id).first()
+    if not scores:
+        if cell is not None:
+            db.delete(cell)
+            db.commit()
+        return None
+
+    if cell is None:
+        model_type_id = (
+            db.query(models.Prompt.model_type_id)
+            .join(models.PromptRevision, models.PromptRevision.prompt_id == models.Prompt.id)
+            .filter(models.PromptRevision.id == prompt_revision_id)
+            .scalar()
+        )
+        cell = Cell(model_id=model_id, prompt_revision_id=prompt_revision_id, model_type_id=model_type_id, version=0)
+        db.add(cell)
+    cell.scores = scores
+    cell.run_count = len(scores)
+    cell.mean_score = sum(scores) / len(scores)
+    cell.version = (cell.version or 0) + 1
+    db.commit()
+    return cell
+
+def rebuild_leaderboard_cells(db: Session) -> int:
+    """Recreate every leaderboard cell from stored runs (for databases that predate them); returns the cell count"""
+    Cell = models.LeaderboardCell
+    version = db.query(func.coalesce(func.max(Cell.version), 0)).scalar() + 1
+    model_types = dict(
+        db.query(models.PromptRevision.id, models.Prompt.model_type_id)
+        .join(models.Prompt, models.PromptRevision.prompt_id == models.Prompt.id)
+        .all()
+    )
+    cells: Dict[tuple, List[float]] = {}
+    for row in _cell_scores_query(db).order_by(models.BenchmarkRun.id):
+        cells.setdefault((row.model_id, row.prompt_revision_id), []).append(row.score)
+
+    db.query(Cell).delete()
+    db.add_all(
+        Cell(model_id=model_id, prompt_revision_id=revision_id, model_type_id=model_types.get(revision_id),
+             run_count=len(scores), mean_score=sum(scores) / len(scores), scores=scores, version=version)
+        for (model_id, revision_id), scores in cells.items()
+    )
+    db.commit()
+    return len(cells)
+
+def get_leaderboard_version(db: Session):
+    """Changes whenever any leaderboard cell is added, refreshed or dropped"""
+    Cell = models.LeaderboardCell
+    count, versions = db.query(func.count(Cell.id), func.coalesce(func.sum(Cell.version), 0)).one()
+    return count, versions
+
+def get_leaderboard_cells(db: Session, model_type_id: int = None):
+    Cell = models.LeaderboardCell
+    query = (
+        db.query(Cell.model_id, models.Model.name.label("model_name"), Cell.prompt_revision_id, Cell.scores)
+        .join(models.Model, Cell.model_id == models.Model.id)
+        .order_by(Cell.model_id, Cell.prompt_revision_id)
+    )
+    if model_type_id:
+        query = query.filter(Cell.model_type_id == model_type_id)
+    return query.all()
+
+def get_result_points(db: Session, model_id: int, prompt_id: int, limit: int,
+                      execution: str = None) -> List[models.ResultPoint]:
+    """Newest first: the last points of a (model, prompt) series"""
+    Point = models.ResultPoint
+    query = db.query(Point).filter(Point.model_id == model_id, Point.prompt_id == prompt_id)
+    if execution:
+        query = query.filter(Point.execution == execution)
+    return query.order_by(desc(Point.id)).limit(limit).all()
+
+def add_result_point(db: Session, model_id: int, prompt_id: int, prompt_revision_id: int, suite_id: int,
+                     execution: str, summaries: dict) -> models.ResultPoint:
+    """Add or replace a suite's point; the caller is responsible for committing"""
+    db.query(models.ResultPoint).filter(models.ResultPoint.suite_id == suite_id).delete()
+    point = models.ResultPoint(
+        model_id=model_id, prompt_id=prompt_id, prompt_revision_id=prompt_revision_id,
+        suite_id=suite_id, execution=execution,
+    )
+    for metric, summary in summaries.items():
+        setattr(point, f"{metric}_n", summary.n)
+        setattr(point, f"{metric}_mean", summary.mean)
+        setattr(point, f"{metric}_std", summary.std)
+    db.add(point)
+    db.flush()
+    return point
+
+def get_series_runs(db: Session):
+    """Runs of completed suites with the fields result points are built from, grouped by suite in id order"""
+    Suite, Run = models.BenchmarkSuite, models.BenchmarkRun
+    return (
+        db.query(Run.suite_id, Suite.model_id, Suite.prompt_revision_id, models.PromptRevision.prompt_id,
+                 Run.score, Run.run_time_ms, Run.cost_usd, Run.output_tokens, Run.run_metadata)
+        .join(Suite, Run.suite_id == Suite.id)
+        .join(models.PromptRevision, Suite.prompt_revision_id == models.PromptRevision.id)
+        .filter(Suite.status == "completed")
+        .order_by(Suite.id, Run.id)
+        .yield_per(5000)
+    )
+
+def add_regression(db: Session, point: models.ResultPoint, finding, revision_changed: bool = False) -> models.Regression:
+    regression = models.Regression(
+        model_id=point.model_id, prompt_id=point.prompt_id, suite_id=point.suite_id, metric=finding.metric,
+        baseline_mean=finding.baseline.mean, current_mean=finding.current.mean, t_statistic=finding.t_statistic,
+        baseline_suites=finding.baseline_suites, revision_changed=revision_changed,
+    )
+    db.add(regression)
+    db.flush()
+    return regression
+
+def resolve_regressions(db: Session, model_id: int, prompt_id: int, metric: str, recovered) -> int:
+    """Mark open regressions of a series resolved where recovered(regression) is true"""
+    Regression = models.Regression
+    resolved = 0
+    for regression in db.query(Regression).filter(
+        Regression.model_id == model_id, Regression.prompt_id == prompt_id,
+        Regression.metric == metric, Regression.status == "open",
+    ):
+        if recovered(regression):
+            regression.status = "resolved"
+            regression.resolved_at = func.now()
+            resolved += 1
+    return resolved
+
+def get_regressions(db: Session, status: str = None, model_id: int = None, prompt_id: int = None,
+                    limit: int = 100) -> List[models.Regression]:
+    Regression = models.Regression
+    query = db.query(Regression).options(selectinload(Regression.model), selectinload(Regression.prompt))
+    if status:
+        query = query.filter(Regression.status == status)
+    if model_id:
+        query = query.filter(Regression.model_id == model_id)
+    if prompt_id:
+        query = query.filter(Regression.prompt_id == prompt_id)
+    return query.order_by(desc(Regression.id)).limit(limit).all()
+
+def dismiss_regression(db: Session, regression_id: int) -> Optional[models.Regression]:
+    regression = db.query(models.Regression).filter(models.Regression.id == regression_id).first()
+    if regression is not None and regression.status == "open":
+        regression.status = "dismissed"
+        regression.resolved_at = func.now()
+        db.commit()
+    return regression
@@ -0,0 +1,278 @@
+"""Streaming export of benchmark runs and suites as JSONL, CSV or Parquet.
+
+Rows are read with a streaming cursor in fixed-size chunks and encoded chunk by chunk,
+so memory use does not grow with the size of the export.
+"""
+import csv
+import importlib.util
+import io
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Session, aliased
+from . import models
+from .content import decompress
+
+
+def parquet_available() -> bool:
+    """Whether pyarrow is installed, without importing it (that is only done for a Parquet export)"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+MEDIA_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+RUN_FIELDS = [
+    "id", "suite_id", "run_index", "model_id", "model_name", "prompt_id", "prompt_name",
+    "prompt_revision_id", "version_number", "score", "judge_model", "input_tokens",
+    "cached_input_tokens", "output_tokens", "cost_usd", "run_time_ms", "created_at", "run_metadata", "reference_scores",
+]
+RUN_TEXT_FIELDS = ["response_text", "judge_reasoning"]
+
+SUITE_FIELDS = [
+    "id", "model_id", "model_name", "prompt_id", "prompt_name", "prompt_revision_id",
+    "version_number", "status", "run_count", "max_score", "avg_score", "min_score",
+    "std_dev_score", "response_similarity", "duplicate_rate", "std_dev_output_tokens",
+    "total_cost_usd", "avg_input_tokens", "avg_cached_input_tokens", "avg_output_tokens",
+    "avg_run_time_ms", "created_at", "completed_at",
+]
+
+# Column types used to build a fixed Parquet schema; fields not listed are strings
+FLOAT_FIELDS = {
+    "score", "cost_usd", "max_score", "avg_score", "min_score", "std_dev_score",
+    "total_cost_usd", "avg_input_tokens", "avg_cached_input_tokens", "avg_output_tokens",
+    "avg_run_time_ms", "response_similarity", "duplicate_rate", "std_dev_output_tokens",
+}
+INT_FIELDS = {
+    "id", "suite_id", "run_index", "model_id", "prompt_id", "prompt_revision_id",
+    "version_number", "input_tokens", "cached_input_tokens", "output_tokens", "run_time_ms", "run_count",
+}
+DATETIME_FIELDS = {"created_at", "completed_at"}
+
+
+def _text(data, codec, inline):
+    if data is not None:
+        return decompress(data, codec).decode("utf-8")
+    return inline
+
+
+def _apply_filters(query, created_column, model_id=None, prompt_id=None, since=None, until=None):
+    if model_id:
+        query = query.filter(models.Model.id == model_id)
+    if prompt_id:
+        query = query.filter(models.Prompt.id == prompt_id)
+    if since:
+        query = query.filter(created_column >= since)
+    if until:
+        query = query.filter(created_column < until)
+    return query
+
+
+def query_runs(db: Session, model_id: int = None, prompt_id: int = None, since: datetime = None,
+               until: datetime = None, judge_model: str = None, include_text: bool = False):
+    BR = models.BenchmarkRun
+    columns = [
+        BR.id, BR.suite_id, BR.run_index, BR.model_id, models.Model.name.label("model_name"),
+        models.Prompt.id.label("prompt_id"), models.Prompt.name.label("prompt_name"),
+        BR.prompt_revision_id, models.PromptRevision.version_number, BR.score, BR.judge_model,
+        BR.input_tokens, BR.cached_input_tokens, BR.output_tokens, BR.cost_usd, BR.run_time_ms, BR.created_at,
+        BR.run_metadata, BR.reference_scores,
+    ]
+    if include_text:
+        response = aliased(models.Content)
+        reasoning = aliased(models.Content)
+        columns += [
+            response.data.label("response_data"), response.codec.label("response_codec"),
+            BR.inline_response_text,
+            reasoning.data.label("reasoning_data"), reasoning.codec.label("reasoning_codec"),
+            BR.inline_judge_reasoning,
+        ]
+
+    query = (
+        db.query(*columns)
+        .join(models.Model, BR.model_id == models.Model.id)
+        .join(models.PromptRevision, BR.prompt_revision_id == models.PromptRevision.id)
+        .join(models.Prompt, models.PromptRevision.prompt_id == models.Prompt.id)
+    )
+    if include_text:
+        query = query.outerjoin(response, BR.response_hash == response.hash)
+        query = query.outerjoin(reasoning, BR.judge_reasoning_hash == reasoning.hash)
+
+    query = _apply_filters(query, BR.created_at, model_id, prompt_id, since, until)
+    if judge_model:
+        query = query.filter(_judged_by(BR, judge_model))
+    return query.order_by(BR.id)
+
+
+def _judged_by(run, judge_model: str):
+    """Runs scored by the judge alone or as part of a panel"""
+    return or_(
+        run.judge_model == judge_model,
+        exists().where(models.JudgeScore.run_id == run.id, models.JudgeScore.judge_model == judge_model),
+    )
+
+
+def run_row(row) -> Dict[str, Any]:
+    data = {field: getattr(row, field) for field in RUN_FIELDS}
+    if "response_data" in row._fields:
+        data["response_text"] = _text(row.response_data, row.response_codec, row.inline_response_text)
+        data["judge_reasoning"] = _text(row.reasoning_data, row.reasoning_codec, row.inline_judge_reasoning)
+    return data
+
+
+def query_suites(db: Session, model_id: int = None, prompt_id: int = None, since: datetime = None,
+                 until: datetime = None, judge_model: str = None, status: str = None):
+    BS = models.BenchmarkSuite
+    query = (
+        db.query(
+            BS.id, BS.model_id, models.Model.name.label("model_name"),
+            models.Prompt.id.label("prompt_id"), models.Prompt.name.label("prompt_name"),
+            BS.prompt_revision_id, models.PromptRevision.version_number, BS.status,
+            BS.run_count, BS.max_score, BS.avg_score, BS.min_score, BS.std_dev_score,
+            BS.response_similarity, BS.duplicate_rate, BS.std_dev_output_tokens,
+            BS.total_cost_usd, BS.avg_input_tokens, BS.avg_cached_input_tokens, BS.avg_output_tokens,
+            BS.avg_run_time_ms, BS.created_at, BS.completed_at,
+        )
+        .join(models.Model, BS.model_id == models.Model.id)
+        .join(models.PromptRevision, BS.prompt_revision_id == models.PromptRevision.id)
+        .join(models.Prompt, models.PromptRevision.prompt_id == models.Prompt.id)
+    )
+    query = _apply_filters(query, BS.created_at, model_id, prompt_id, since, until)
+    if status:
+        query = query.filter(BS.status == status)
+    if judge_model:
+        query = query.filter(exists().where(
+            models.BenchmarkRun.suite_id == BS.id,
+            _judged_by(models.BenchmarkRun, judge_model),
+        ))
+    return query.order_by(BS.id)
+
+
+def suite_row(row) -> Dict[str, Any]:
+    return {field: getattr(row, field) for field in SUITE_FIELDS}
+
+
+def iter_chunks(query, to_dict: Callable, chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of row dicts read through a streaming cursor"""
+    chunk = []
+    for row in query.execution_options(stream_results=True, yield_per=chunk_size):
+        chunk.append(to_dict(row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_jsonl(chunks: Iterator[List[Dict[str, Any]]], fields: List[str]) -> Iterator[bytes]:
+    for chunk in chunks:
+        lines = [json.dumps({k: _plain(row.get(k)) for k in fields}) for row in chunk]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def encode_csv(chunks: Iterator[List[Dict[str, Any]]], fields: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow({
+                k: json.dumps(v) if isinstance(v, (dict, list)) else _plain(v)
+                for k, v in row.items()
+            })
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every row group"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def encode_parquet(chunks: Iterator[List[Dict[str, Any]]], fields: List[str]) -> Iterator[bytes]:
+    if not parquet_available():
+        raise RuntimeError("pyarrow is required for Parquet export")
+    import pyarrow
+    import pyarrow.parquet
+
+    def arrow_type(field):
+        if field in FLOAT_FIELDS:
+            return pyarrow.float64()
+        if field in INT_FIELDS:
+            return pyarrow.int64()
+        if field in DATETIME_FIELDS:
+            return pyarrow.timestamp("us")
+        return pyarrow.string()
+
+    schema = pyarrow.schema([(field, arrow_type(field)) for field in fields])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        columns = {
+            k: [json.dumps(row.get(k)) if isinstance(row.get(k), (dict, list)) else row.get(k) for row in chunk]
+            for k in fields
+        }
+        writer.write_table(pyarrow.table(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "jsonl": encode_jsonl,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+}
+
+
+def stream_export(db: Session, kind: str, fmt: str, filters: Optional[Dict[str, Any]] = None,
+                  include_text: bool = False, chunk_size: int = 1000) -> Iterator[bytes]:
+    """Encode runs or suites matching the filters, one chunk at a time"""
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    if kind == "runs":
+        query = query_runs(db, include_text=include_text, **filters)
+        fields = RUN_FIELDS + (RUN_TEXT_FIELDS if include_text else [])
+        to_dict = run_row
+    elif kind == "suites":
+        query = query_suites(db, **filters)
+        fields = SUITE_FIELDS
+        to_dict = suite_row
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return ENCODERS[fmt](iter_chunks(query, to_dict, chunk_size), fields)
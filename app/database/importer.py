@@ -0,0 +1,223 @@
+"""Bulk import of prompts and model definitions from JSONL, JSON or YAML.
+
+A file is either a mapping with "models" and "prompts" lists, a plain list of entries,
+or JSONL with one entry per line. Entries are upserted by name in a single transaction:
+prompts only get a new revision when their content, rubric, evaluator, reference answer or tools changed.
+
+    models:
+      - name: openai/gpt-4o
+        model_type: text
+    prompts:
+      - name: capital-of-france
+        model_type: text
+        content: What is the capital of France?
+        rubric_prompt: Score 1.0 if the answer is Paris, otherwise 0.0.
+        evaluator: {type: normalized, expected: Paris}
+        reference_answer: The capital of France is Paris.
+      - name: weather-agent
+        model_type: agent
+        content: Should I bring an umbrella in Oslo today?
+        tools: [{type: lookup, name: get_weather, parameter: city, data: {oslo: "Rain, 9C"}}]
+"""
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from . import models
+from .crud import copy_attachments
+from benchmark import agent, local_evaluators
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+MODEL_FIELDS = ("api_endpoint", "api_key_name", "daily_budget_usd")
+# Revision field -> the entry keys that set it
+PROMPT_FIELD_KEYS = {
+    "rubric_prompt": ("rubric_prompt", "rubric"),
+    "evaluator_config": ("evaluator", "evaluator_config"),
+    "reference_answer": ("reference_answer", "reference"),
+    "agent_tools": ("tools", "agent_tools"),
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse_entries(text: str, filename: str = "") -> List[Tuple[str, Dict[str, Any]]]:
+    """Parse a document into a list of ("model" | "prompt", entry) pairs"""
+    name = filename.lower()
+    if name.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ImportFormatError("PyYAML is required to import YAML files")
+        try:
+            document = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ImportFormatError(f"Invalid YAML: {e}")
+    elif name.endswith(".jsonl"):
+        document = _parse_jsonl(text)
+    else:
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError:
+            document = _parse_jsonl(text)
+
+    if isinstance(document, dict):
+        entries = [("model", entry) for entry in document.get("models") or []]
+        entries += [("prompt", entry) for entry in document.get("prompts") or []]
+        return entries
+    if isinstance(document, list):
+        return [(_entry_kind(entry), entry) for entry in document]
+    raise ImportFormatError("Expected a mapping with 'models'/'prompts' or a list of entries")
+
+
+def _parse_jsonl(text: str) -> List[Dict[str, Any]]:
+    entries = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"Line {line_number}: invalid JSON ({e.msg})")
+    return entries
+
+
+def _entry_kind(entry: Dict[str, Any]) -> str:
+    if not isinstance(entry, dict):
+        raise ImportFormatError(f"Expected an object, got {entry!r}")
+    kind = entry.get("kind")
+    if kind in ("model", "prompt"):
+        return kind
+    return "prompt" if "content" in entry else "model"
+
+
+def import_entries(db: Session, entries: List[Tuple[str, Dict[str, Any]]], dry_run: bool = False) -> Dict[str, int]:
+    """Upsert models and prompts by name in one transaction and return counts per outcome"""
+    summary = Counter()
+    model_types = {mt.name: mt for mt in db.query(models.ModelType).all()}
+    model_type_ids = {mt.id for mt in model_types.values()}
+
+    def resolve_type(entry: Dict[str, Any], existing: Dict[str, Any]) -> Optional[int]:
+        """The entry's model type id, or None to keep the type of an existing model or prompt"""
+        if "model_type" not in entry and "model_type_id" not in entry and entry["name"] in existing:
+            return None
+        if entry.get("model_type_id") in model_type_ids:
+            return entry["model_type_id"]
+        type_name = entry.get("model_type", "text")
+        if type_name not in model_types:
+            raise ImportFormatError(f"Unknown model type '{type_name}' for '{entry.get('name')}'")
+        return model_types[type_name].id
+
+    existing_models = {
+        m.name: m for m in db.query(models.Model).filter(models.Model.is_active == True).all()
+    }
+    # name -> (prompt, current revision), loaded in a single query
+    existing_prompts = {
+        prompt.name: (prompt, revision)
+        for prompt, revision in db.query(models.Prompt, models.PromptRevision).outerjoin(
+            models.PromptRevision,
+            (models.PromptRevision.prompt_id == models.Prompt.id)
+            & (models.PromptRevision.is_current == True)
+        ).filter(models.Prompt.is_active == True).all()
+    }
+
+    try:
+        for kind, entry in entries:
+            if not entry.get("name"):
+                raise ImportFormatError(f"{kind.capitalize()} entry is missing a name: {entry!r}")
+            if kind == "model":
+                summary["models_" + _upsert_model(db, entry, resolve_type(entry, existing_models), existing_models)] += 1
+            else:
+                summary["prompts_" + _upsert_prompt(db, entry, resolve_type(entry, existing_prompts), existing_prompts)] += 1
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return dict(summary)
+
+
+def _upsert_model(db: Session, entry: Dict[str, Any], model_type_id: int, existing: Dict[str, models.Model]) -> str:
+    # Fields left out of the entry keep their current values on an existing model
+    values = {field: entry[field] for field in MODEL_FIELDS if field in entry}
+    model = existing.get(entry["name"])
+    if model is None:
+        model = models.Model(name=entry["name"], model_type_id=model_type_id, **values)
+        db.add(model)
+        existing[model.name] = model
+        return "created"
+
+    if model_type_id is not None:
+        values["model_type_id"] = model_type_id
+    if all(getattr(model, field) == value for field, value in values.items()):
+        return "unchanged"
+    for field, value in values.items():
+        setattr(model, field, value)
+    return "updated"
+
+
+def _evaluator_config(entry: Dict[str, Any]):
+    try:
+        return local_evaluators.parse_config(entry.get("evaluator", entry.get("evaluator_config")))
+    except ValueError as e:
+        raise ImportFormatError(f"Prompt '{entry['name']}': {e}")
+
+
+def _agent_tools(entry: Dict[str, Any]):
+    try:
+        return agent.parse_config(entry.get("tools", entry.get("agent_tools")))
+    except ValueError as e:
+        raise ImportFormatError(f"Prompt '{entry['name']}': {e}")
+
+
+def _upsert_prompt(db: Session, entry: Dict[str, Any], model_type_id: int,
+                   existing: Dict[str, Tuple[models.Prompt, models.PromptRevision]]) -> str:
+    if not entry.get("content"):
+        raise ImportFormatError(f"Prompt '{entry['name']}' has no content")
+    values = {
+        "content": entry["content"],
+        "rubric_prompt": entry.get("rubric_prompt", entry.get("rubric")),
+        "evaluator_config": _evaluator_config(entry),
+        "reference_answer": entry.get("reference_answer", entry.get("reference")),
+        "agent_tools": _agent_tools(entry),
+    }
+
+    prompt, current = existing.get(entry["name"], (None, None))
+    if current is not None:
+        # Fields left out of the entry keep their values from the current revision
+        for field, keys in PROMPT_FIELD_KEYS.items():
+            if not any(key in entry for key in keys):
+                values[field] = getattr(current, field)
+    if prompt is None:
+        prompt = models.Prompt(name=entry["name"], model_type_id=model_type_id)
+        db.add(prompt)
+        outcome = "created"
+    else:
+        retyped = model_type_id is not None and prompt.model_type_id != model_type_id
+        if retyped:
+            prompt.model_type_id = model_type_id
+        if current is not None and all(getattr(current, field) == value for field, value in values.items()):
+            return "updated" if retyped else "unchanged"
+        outcome = "revised"
+
+    revision = models.PromptRevision(
+        version_number=current.version_number + 1 if current else 1,
+        is_current=True,
+        needs_rerun=True,
+        # Images are uploaded through the prompt forms; a re-imported prompt keeps its current ones
+        attachments=copy_attachments(current),
+        **values
+    )
+    if current is not None:
+        current.is_current = False
+    prompt.revisions.append(revision)
+    existing[prompt.name] = (prompt, revision)
+    return outcome
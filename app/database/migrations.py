@@ -0,0 +1,135 @@
+"""Versioned schema migrations.
+
+The database records the last migration applied in the one-row schema_version table. MIGRATIONS
+lists every change in order; `python cli.py migrate` applies the ones after the recorded version,
+each in its own transaction together with the version bump. At startup the app only reads the
+version (check) and refuses to start on an older schema, unless AUTO_MIGRATE=true.
+
+Migration 1 is the baseline: it creates the tables from the models and adds the columns that
+databases from before versioning are missing, which is what every startup used to do. Later
+migrations run after it on fresh databases too, so they must tolerate their change already being
+there (add_column and create_index skip existing ones).
+"""
+import logging
+import os
+import time
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Column, Integer, MetaData, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from .database import Base, add_missing_columns
+from . import crud, models
+
+logger = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
+
+# Kept out of Base.metadata, so create_all never creates it without a version
+schema_version = Table("schema_version", MetaData(), Column("version", Integer, nullable=False))
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    """ALTER TABLE ... ADD COLUMN, unless the column exists"""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _baseline(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn)
+    add_missing_columns(conn)
+
+
+def _default_model_types(conn: Connection) -> None:
+    db = Session(bind=conn)
+    if not crud.get_model_types(db):
+        crud.create_model_type(db, "text", "Text-based language models")
+        crud.create_model_type(db, "vision", "Vision-capable models")
+        crud.create_model_type(db, "agent", "Agent-capable models")
+    db.close()
+
+
+def _derived_tables(conn: Connection) -> None:
+    """Leaderboard cells and the regression series for suites completed before those tables existed"""
+    from benchmark import regressions
+
+    db = Session(bind=conn)
+    if db.query(models.BenchmarkSuite.id).filter(models.BenchmarkSuite.status == "completed").first():
+        if not crud.get_leaderboard_version(db)[0]:
+            logger.info(f"Built {crud.rebuild_leaderboard_cells(db)} leaderboard cells from existing suites")
+        if not db.query(models.ResultPoint.id).first():
+            logger.info(f"Added {regressions.backfill(db)} existing suites to the regression series")
+    db.close()
+
+
+def _data_version(conn: Connection) -> None:
+    models.DataVersion.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(models.DataVersion.id)).first() is None:
+        conn.execute(models.DataVersion.__table__.insert().values(id=1, version=1, updated_at=func.now()))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", _baseline),
+    Migration(2, "default model types", _default_model_types),
+    Migration(3, "leaderboard cells and regression series for existing suites", _derived_tables),
+    Migration(4, "data version counter for HTTP caching", _data_version),
+]
+LATEST = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    """Last migration applied; 0 for a database from before versioning (or an empty one)"""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+
+def migrate(engine: Engine) -> List[Migration]:
+    """Apply pending migrations in order; returns the ones applied"""
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+        if conn.execute(select(schema_version.c.version)).first() is None:
+            conn.execute(schema_version.insert().values(version=0))
+        version = current_version(conn)
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            migration.apply(conn)
+            conn.execute(schema_version.update().values(version=migration.version))
+        logger.info(f"Applied migration {migration.version} ({migration.description}) "
+                    f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        applied.append(migration)
+    return applied
+
+
+def check(engine: Engine) -> int:
+    """Schema version of the database; raises SchemaOutOfDate when migrations are pending"""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, this code needs {LATEST}. "
+            "Run `python cli.py migrate` from the app directory (or set AUTO_MIGRATE=true)."
+        )
+    if version > LATEST:
+        logger.warning(f"Database schema version {version} is newer than this code ({LATEST})")
+    return version
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON, LargeBinary, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from database import Base
+from database.content import decompress
 
 class ModelType(Base):
     __tablename__ = "model_types"
@@ -32,6 +33,12 @@ class PromptRevision(Base):
     prompt_id = Column(Integer, ForeignKey("prompts.id"))
     content = Column(Text)
     rubric_prompt = Column(Text, nullable=True)
+    # Local checks that score runs instead of a judge; see benchmark.local_evaluators
+    evaluator_config = Column(JSON, nullable=True)
+    # Known-good answer that runs are compared against locally (BLEU, ROUGE-L, chrF, TF-IDF, BM25)
+    reference_answer = Column(Text, nullable=True)
+    # Tools the model can call; runs become multi-turn episodes (see benchmark.agent)
+    agent_tools = Column(JSON, nullable=True)
     version_number = Column(Integer)
     created_at = Column(DateTime, default=func.now())
     created_by = Column(String, default="user")
@@ -42,6 +49,26 @@ class PromptRevision(Base):
     benchmark_runs = relationship("BenchmarkRun", back_populates="prompt_revision")
     benchmark_suites = relationship("BenchmarkSuite", back_populates="prompt_revision")
     queue_items = relationship("RunQueue", back_populates="prompt_revision")
+    attachments = relationship("PromptAttachment", back_populates="prompt_revision",
+                               order_by="PromptAttachment.position")
+
+class PromptAttachment(Base):
+    """An image sent with a prompt revision; the file lives under ATTACHMENT_DIR, named by its hash"""
+    __tablename__ = "prompt_attachments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    prompt_revision_id = Column(Integer, ForeignKey("prompt_revisions.id"), index=True)
+    position = Column(Integer, default=0)
+    filename = Column(String)
+    content_type = Column(String)
+    sha256 = Column(String, index=True)
+    path = Column(String)
+    size_bytes = Column(Integer)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    prompt_revision = relationship("PromptRevision", back_populates="attachments")
 
 class Model(Base):
     __tablename__ = "models"
@@ -53,6 +80,7 @@ class Model(Base):
     api_key_name = Column(String, nullable=True)
     created_at = Column(DateTime, default=func.now())
     is_active = Column(Boolean, default=True)
+    daily_budget_usd = Column(Float, nullable=True)
     
     model_type = relationship("ModelType", back_populates="models")
     benchmark_runs = relationship("BenchmarkRun", back_populates="model")
@@ -74,10 +102,23 @@ class BenchmarkSuite(Base):
     avg_score = Column(Float, nullable=True)
     min_score = Column(Float, nullable=True)
     std_dev_score = Column(Float, nullable=True)
+    ci_low = Column(Float, nullable=True)
+    ci_high = Column(Float, nullable=True)
     total_cost_usd = Column(Float, nullable=True)
     avg_input_tokens = Column(Float, nullable=True)
+    # Average prompt tokens the provider served from its prompt cache; None before it was recorded
+    avg_cached_input_tokens = Column(Float, nullable=True)
     avg_output_tokens = Column(Float, nullable=True)
     avg_run_time_ms = Column(Float, nullable=True)
+    judge_cost_usd = Column(Float, nullable=True)
+    # 1 - mean absolute score difference between pairs of panel judges; None for single judges
+    judge_agreement = Column(Float, nullable=True)
+    # Response consistency across runs; see benchmark.consistency
+    response_similarity = Column(Float, nullable=True)
+    duplicate_rate = Column(Float, nullable=True)
+    std_dev_output_tokens = Column(Float, nullable=True)
+    # Per-stage timing waterfall of the queue item that produced this suite
+    trace_summary = Column(JSON, nullable=True)
     
     prompt_revision = relationship("PromptRevision", back_populates="benchmark_suites")
     model = relationship("Model", back_populates="benchmark_suites")
@@ -91,21 +132,150 @@ class BenchmarkRun(Base):
     model_id = Column(Integer, ForeignKey("models.id"))
     suite_id = Column(Integer, ForeignKey("benchmark_suites.id"), nullable=True)
     run_index = Column(Integer, nullable=True)
-    response_text = Column(Text)
+    # Large text lives in the contents table; the inline columns only hold legacy rows
+    response_hash = Column(String, ForeignKey("contents.hash"), nullable=True, index=True)
+    inline_response_text = deferred(Column("response_text", Text, nullable=True))
     score = Column(Float, nullable=True)
     judge_model = Column(String, nullable=True)
     judge_base_url = Column(String, nullable=True)
-    judge_reasoning = Column(Text, nullable=True)
+    judge_reasoning_hash = Column(String, ForeignKey("contents.hash"), nullable=True)
+    inline_judge_reasoning = deferred(Column("judge_reasoning", Text, nullable=True))
+    judge_input_tokens = Column(Integer, nullable=True)
+    judge_output_tokens = Column(Integer, nullable=True)
+    judge_cost_usd = Column(Float, nullable=True)
     input_tokens = Column(Integer)
+    # Part of input_tokens read from the provider's prompt cache, priced at the cached rate
+    cached_input_tokens = Column(Integer, nullable=True)
     output_tokens = Column(Integer)
     cost_usd = Column(Float)
     run_time_ms = Column(Integer)
     created_at = Column(DateTime, default=func.now())
     run_metadata = Column(JSON, nullable=True)
+    reference_scores = Column(JSON, nullable=True)
     
     prompt_revision = relationship("PromptRevision", back_populates="benchmark_runs")
     model = relationship("Model", back_populates="benchmark_runs")
     benchmark_suite = relationship("BenchmarkSuite", back_populates="benchmark_runs")
+    response_content = relationship("Content", foreign_keys=[response_hash])
+    judge_reasoning_content = relationship("Content", foreign_keys=[judge_reasoning_hash])
+    judge_scores = relationship("JudgeScore", back_populates="run")
+
+    @property
+    def response_text(self):
+        if self.response_content is not None:
+            return self.response_content.text
+        return self.inline_response_text
+
+    @property
+    def judge_reasoning(self):
+        if self.judge_reasoning_content is not None:
+            return self.judge_reasoning_content.text
+        return self.inline_judge_reasoning
+
+class JudgeScore(Base):
+    """One judge's verdict on a run; a run's score aggregates the scores of its panel"""
+    __tablename__ = "judge_scores"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("benchmark_runs.id"), index=True)
+    judge_model = Column(String, index=True)
+    judge_base_url = Column(String, nullable=True)
+    score = Column(Float, nullable=True)
+    reasoning_hash = Column(String, ForeignKey("contents.hash"), nullable=True)
+    input_tokens = Column(Integer, nullable=True)
+    output_tokens = Column(Integer, nullable=True)
+    cost_usd = Column(Float, nullable=True)
+    # Structured-output protocol used and whether the reply "parsed", was "repaired" or "failed"
+    protocol = Column(String, nullable=True)
+    parse_outcome = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    run = relationship("BenchmarkRun", back_populates="judge_scores")
+    reasoning_content = relationship("Content")
+
+    @property
+    def reasoning(self):
+        return self.reasoning_content.text if self.reasoning_content is not None else None
+
+class LeaderboardCell(Base):
+    """Scores of one model on one prompt revision, kept up to date as suites complete (see benchmark.leaderboard)"""
+    __tablename__ = "leaderboard_cells"
+    __table_args__ = (UniqueConstraint("model_id", "prompt_revision_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(Integer, ForeignKey("models.id"), index=True)
+    prompt_revision_id = Column(Integer, ForeignKey("prompt_revisions.id"), index=True)
+    model_type_id = Column(Integer, ForeignKey("model_types.id"), nullable=True, index=True)
+    run_count = Column(Integer)
+    mean_score = Column(Float)
+    # Every scored run of the cell's completed suites, for resampling
+    scores = Column(JSON)
+    # Bumped on every refresh; the sum over all cells tells cached leaderboards they are stale
+    version = Column(Integer, default=1)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class ResultPoint(Base):
+    """Per-suite summary in the time series of one model on one prompt, used to detect regressions"""
+    __tablename__ = "result_points"
+    __table_args__ = (Index("ix_result_points_series", "model_id", "prompt_id", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(Integer, ForeignKey("models.id"))
+    prompt_id = Column(Integer, ForeignKey("prompts.id"))
+    prompt_revision_id = Column(Integer, ForeignKey("prompt_revisions.id"))
+    suite_id = Column(Integer, ForeignKey("benchmark_suites.id"), unique=True)
+    # "direct" or "batch"; latency and cost are only compared between suites that ran the same way
+    execution = Column(String, default="direct")
+    # Count, mean and standard deviation over the suite's runs of each tracked metric
+    score_n = Column(Integer, default=0)
+    score_mean = Column(Float, nullable=True)
+    score_std = Column(Float, nullable=True)
+    latency_n = Column(Integer, default=0)
+    latency_mean = Column(Float, nullable=True)
+    latency_std = Column(Float, nullable=True)
+    cost_n = Column(Integer, default=0)
+    cost_mean = Column(Float, nullable=True)
+    cost_std = Column(Float, nullable=True)
+    recorded_at = Column(DateTime, default=func.now())
+
+class Regression(Base):
+    """A suite whose score, latency or cost is significantly worse than its rolling baseline"""
+    __tablename__ = "regressions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(Integer, ForeignKey("models.id"), index=True)
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), index=True)
+    suite_id = Column(Integer, ForeignKey("benchmark_suites.id"))
+    # "score", "latency" or "cost"
+    metric = Column(String)
+    baseline_mean = Column(Float)
+    current_mean = Column(Float)
+    t_statistic = Column(Float, nullable=True)
+    baseline_suites = Column(Integer)
+    # Whether the prompt revision changed since the newest baseline suite
+    revision_changed = Column(Boolean, default=False)
+    # "open" until a later suite is back within the baseline ("resolved") or someone dismisses it
+    status = Column(String, default="open", index=True)
+    created_at = Column(DateTime, default=func.now())
+    resolved_at = Column(DateTime, nullable=True)
+
+    model = relationship("Model")
+    prompt = relationship("Prompt")
+    suite = relationship("BenchmarkSuite")
+
+class Content(Base):
+    """Content-addressed, optionally compressed text shared by benchmark runs"""
+    __tablename__ = "contents"
+
+    hash = Column(String, primary_key=True)
+    codec = Column(String, default="none")
+    size_bytes = Column(Integer)
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=func.now())
+
+    @property
+    def text(self):
+        return decompress(self.data, self.codec).decode("utf-8")
 
 class RunQueue(Base):
     __tablename__ = "run_queue"
@@ -115,10 +285,59 @@ class RunQueue(Base):
     prompt_revision_id = Column(Integer, ForeignKey("prompt_revisions.id"))
     judge_model = Column(String, nullable=True)
     judge_base_url = Column(String, nullable=True)
+    # Extra panel judges as [name, base_url] pairs; judge_model is always the first judge
+    judge_panel = Column(JSON, nullable=True)
+    judge_aggregation = Column(String, default="mean")
+    # "generate" runs the model; "rejudge" scores copies of source_suite's responses against prompt_revision
+    job_type = Column(String, default="generate")
+    source_suite_id = Column(Integer, ForeignKey("benchmark_suites.id"), nullable=True)
     status = Column(String, default="pending")
+    status_reason = Column(String, nullable=True)
+    sampling_mode = Column(String, default="fixed")
+    # Non-urgent items go through the provider's batch API instead of the worker
+    is_urgent = Column(Boolean, default=True)
+    provider_batch_id = Column(Integer, ForeignKey("provider_batches.id"), nullable=True)
     created_at = Column(DateTime, default=func.now())
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     
     model = relationship("Model", back_populates="queue_items")
     prompt_revision = relationship("PromptRevision", back_populates="queue_items")
+    provider_batch = relationship("ProviderBatch", back_populates="queue_items")
+    source_suite = relationship("BenchmarkSuite")
+
+    @property
+    def judges(self):
+        """(name, base_url) of every judge on the item's panel"""
+        if not self.judge_model:
+            return []
+        return [(self.judge_model, self.judge_base_url)] + [tuple(judge) for judge in self.judge_panel or []]
+
+class ProviderBatch(Base):
+    """A JSONL batch job submitted to a provider's files/batches API for non-urgent queue items"""
+    __tablename__ = "provider_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider_batch_id = Column(String, nullable=True, index=True)
+    base_url = Column(String, nullable=True)
+    api_key_name = Column(String, nullable=True)
+    input_file_id = Column(String, nullable=True)
+    output_file_id = Column(String, nullable=True)
+    error_file_id = Column(String, nullable=True)
+    status = Column(String, default="submitted")
+    request_count = Column(Integer, default=0)
+    completed_count = Column(Integer, nullable=True)
+    failed_count = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    completed_at = Column(DateTime, nullable=True)
+
+    queue_items = relationship("RunQueue", back_populates="provider_batch")
+
+class DataVersion(Base):
+    """Single row counting committed write transactions; page and API ETags are derived from it (see httpcache)"""
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now())
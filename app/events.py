@@ -0,0 +1,57 @@
+"""In-process publish/subscribe channel for live worker updates, streamed to browsers as Server-Sent Events"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroker:
+    def __init__(self, max_queue_size: int = 500):
+        self.max_queue_size = max_queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._next_id = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Send an event to every subscriber without blocking the worker.
+
+        Subscribers that fall too far behind lose their oldest events rather than
+        slowing down the publisher.
+        """
+        if not self._subscribers:
+            return
+
+        self._next_id += 1
+        message = format_sse(event, data, self._next_id)
+        for queue in list(self._subscribers):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(message)
+
+
+def format_sse(event: str, data: Dict[str, Any], event_id: int = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+broker = EventBroker()
@@ -0,0 +1,279 @@
+"""HTTP caching: conditional GETs against a data version, response compression and fingerprinted static files.
+
+Pages and JSON endpoints only change when the database does. Every committed transaction that wrote
+something bumps the one-row data_version table (track_writes), including transactions from other
+processes such as cli.py. ConditionalGetMiddleware reads that row (one query) and derives the ETag
+and Last-Modified of every cacheable GET from it, so a request whose If-None-Match still matches gets
+a 304 before any route or template runs. The ETag also includes a fingerprint of the code, templates
+and static files (a deploy changes the pages without touching the data) and the UTC date (daily
+budgets and "last N days" filters move at midnight).
+
+Static files are linked as /static/<path>?v=<content hash> (static_url, a Jinja global). Those URLs
+are served with a year-long immutable Cache-Control; unversioned ones must be revalidated.
+
+CompressionMiddleware compresses HTML, JSON, CSV, JavaScript and CSS with brotli when the `brotli`
+package is installed and the client accepts it, and gzip otherwise. Streaming bodies are flushed per
+chunk, and event streams are never compressed.
+"""
+import hashlib
+import logging
+import os
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import event, select
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from database import models
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, "static")
+# Revalidated on every request (cheap: a 304 when nothing changed)
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Routes whose responses depend on more than the database
+UNCACHED_PATHS = ("/api/events", "/metrics", "/health", "/static/")
+COMPRESSIBLE_TYPES = ("text/html", "text/csv", "text/plain", "text/css", "text/javascript",
+                      "application/javascript", "application/json", "application/x-ndjson", "image/svg+xml")
+MINIMUM_COMPRESS_SIZE = 1024
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+_BUMP = "UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP"
+
+
+_tracked_engines = set()
+
+
+def track_writes(engine) -> None:
+    """Bump data_version in every transaction on the engine that writes, just before it commits"""
+    if engine in _tracked_engines:
+        return
+    _tracked_engines.add(engine)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS):
+            conn.info["data_written"] = True
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        if not conn.info.pop("data_written", False):
+            return
+        # Straight on the DBAPI connection, so these listeners do not see it
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(_BUMP)
+        except engine.dialect.dbapi.Error as e:
+            # No data_version table before `cli.py migrate` has run
+            logger.debug(f"Data version not bumped: {e}")
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "rollback")
+    def _rollback(conn):
+        conn.info.pop("data_written", None)
+
+
+def data_version(engine) -> Tuple[int, Optional[datetime]]:
+    """(version, time of the last write) of the database"""
+    with engine.connect() as conn:
+        row = conn.execute(select(models.DataVersion.version, models.DataVersion.updated_at)).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def _fingerprint_tree() -> Tuple[str, datetime]:
+    """Hash of the size and modification time of every source, template and static file, and the latest one"""
+    digest = hashlib.sha1()
+    latest = 0.0
+    for root, dirs, files in os.walk(APP_DIR):
+        dirs[:] = sorted(d for d in dirs if d not in ("__pycache__", "data"))
+        for name in sorted(files):
+            if name.endswith((".py", ".html", ".js", ".css", ".json", ".png", ".webp")):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{root}/{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+                latest = max(latest, stat.st_mtime)
+    return digest.hexdigest()[:12], datetime.fromtimestamp(latest, timezone.utc)
+
+
+BUILD_ID, BUILD_TIME = _fingerprint_tree()
+
+
+@lru_cache(maxsize=None)
+def _content_hash(path: str, mtime_ns: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def static_url(path: str) -> str:
+    """/static URL of a file under static/, versioned by its content so it can be cached forever"""
+    full_path = os.path.join(STATIC_DIR, path)
+    try:
+        version = _content_hash(full_path, os.stat(full_path).st_mtime_ns)
+    except OSError:
+        return f"/static/{path}"
+    return f"/static/{path}?v={version}"
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles with immutable caching for versioned URLs (see static_url)"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        versioned = b"v=" in scope.get("query_string", b"")
+        response.headers["Cache-Control"] = IMMUTABLE if versioned else REVALIDATE
+        return response
+
+
+def _vary_on_encoding(headers: MutableHeaders) -> None:
+    if "accept-encoding" not in headers.get("vary", "").lower():
+        headers.add_vary_header("Accept-Encoding")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+class ConditionalGetMiddleware:
+    """ETag and Last-Modified from the data version for GET pages and JSON; 304 without running the route"""
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in ("GET", "HEAD")
+                or scope["path"].startswith(UNCACHED_PATHS)):
+            return await self.app(scope, receive, send)
+
+        # A blocking query, so it runs in the thread pool rather than on the event loop
+        version, updated_at = await run_in_threadpool(data_version, self.engine)
+        now = datetime.now(timezone.utc)
+        etag = f'W/"{version}-{BUILD_ID}-{now.date().isoformat()}"'
+        # Whichever changed last: the data, the code or the date
+        last_modified = max(filter(None, [
+            updated_at.replace(tzinfo=timezone.utc) if updated_at else None,
+            BUILD_TIME,
+            now.replace(hour=0, minute=0, second=0, microsecond=0),
+        ]))
+        cache_headers = {"ETag": etag, "Cache-Control": REVALIDATE,
+                         "Last-Modified": format_datetime(last_modified, usegmt=True)}
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if_modified_since = request_headers.get("if-modified-since")
+        if (_etag_matches(if_none_match, etag) if if_none_match is not None
+                else if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)):
+            headers = MutableHeaders(cache_headers)
+            _vary_on_encoding(headers)
+            await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cache_headers(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(raw=list(message.get("headers", [])))
+                # Routes that set their own caching (streams, files) keep it
+                if "cache-control" not in headers and "etag" not in headers:
+                    headers.update(cache_headers)
+                    _vary_on_encoding(headers)
+                    message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=5)
+        else:
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """brotli or gzip for compressible responses of at least MINIMUM_COMPRESS_SIZE bytes"""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_COMPRESS_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = _accepted_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=list(start_message.get("headers", [])))
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if (content_type in COMPRESSIBLE_TYPES and "content-encoding" not in headers
+                        and (more_body or len(body) >= self.minimum_size)):
+                    compressor = _Compressor(encoding)
+                    body = compressor.compress(body, final=not more_body)
+                    headers["Content-Encoding"] = encoding
+                    _vary_on_encoding(headers)
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+                    # The bytes differ from the uncompressed representation
+                    if headers.get("etag", "").startswith('"'):
+                        headers["ETag"] = "W/" + headers["etag"]
+                await send({**start_message, "headers": headers.raw})
+                start_message = None
+            elif compressor is not None:
+                body = compressor.compress(body, final=not more_body)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
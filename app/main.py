@@ -1,15 +1,33 @@
-from fastapi import FastAPI, Depends
-from fastapi.staticfiles import StaticFiles
+import time
+
+# Start of the cold-start clock: importing this module and its dependencies
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from contextlib import asynccontextmanager
+from datetime import datetime
 import asyncio
 import logging
+import os
 
-from database.database import engine, get_db
-from database import models, crud
+from database.database import engine, get_db, SessionLocal
+from database import models, crud, export, migrations
 from pages.routes import router as pages_router
-from benchmark.runner import BenchmarkRunner
+from benchmark.runner import get_runner
 from benchmark.evaluator import get_evaluator
+from benchmark.local_evaluators import LocalResult
+from benchmark import reference_metrics
+from benchmark import (
+    batch as provider_batches, budget, consistency, images, leaderboard, regressions, sampling, scheduling,
+)
+from events import broker
+import httpcache
+import metrics
+import tracing
+
+IMPORTS_DONE = time.perf_counter()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,19 +35,19 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    models.Base.metadata.create_all(bind=engine)
-
-    db = next(get_db())
-    try:
-        if not crud.get_model_types(db):
-            crud.create_model_type(db, "text", "Text-based language models")
-            crud.create_model_type(db, "vision", "Vision-capable models")
-            crud.create_model_type(db, "agent", "Agent-capable models")
-            logger.info("Created default model types")
-    except Exception as e:
-        logger.error(f"Error creating model types: {e}")
-    finally:
-        db.close()
+    # Schema changes are applied by `python cli.py migrate`; startup only reads the schema version
+    start = time.perf_counter()
+    if migrations.AUTO_MIGRATE:
+        migrations.migrate(engine)
+    version = migrations.check(engine)
+    ready = time.perf_counter()
+    metrics.startup_seconds.set(IMPORTS_DONE - IMPORT_STARTED, phase="imports")
+    metrics.startup_seconds.set(ready - start, phase="schema_check")
+    logger.info(
+        f"Started in {(ready - IMPORT_STARTED) * 1000:.0f} ms "
+        f"(imports {(IMPORTS_DONE - IMPORT_STARTED) * 1000:.0f} ms, schema version {version} "
+        f"checked in {(ready - start) * 1000:.1f} ms)"
+    )
 
     asyncio.create_task(queue_processor())
     yield
@@ -42,32 +60,158 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Added innermost first: query stats wrap conditional GETs, which wrap compression
+app.add_middleware(httpcache.CompressionMiddleware)
+app.add_middleware(httpcache.ConditionalGetMiddleware, engine=engine)
+app.add_middleware(metrics.QueryStatsMiddleware)
+app.mount("/static", httpcache.FingerprintedStaticFiles(directory="static"), name="static")
 app.include_router(pages_router)
 
-benchmark_runner = BenchmarkRunner()
+# Queue items processed concurrently by the worker
+WORKER_CONCURRENCY = 5
+# Re-judge items only call judges (through the shared judge limiter), so many more run at once
+REJUDGE_CONCURRENCY = int(os.getenv("REJUDGE_CONCURRENCY", "50"))
+metrics.worker_capacity.set(WORKER_CONCURRENCY)
+metrics.worker_busy.set(0)
+metrics.instrument_database(engine, SessionLocal)
+httpcache.track_writes(engine)
+
+
+def publish_queue_item(queue_item):
+    broker.publish("queue", {
+        "id": queue_item.id,
+        "status": queue_item.status,
+        "status_reason": queue_item.status_reason,
+        "job_type": queue_item.job_type,
+        "model_name": queue_item.model.name,
+        "prompt_name": queue_item.prompt_revision.prompt.name,
+        "created_at": queue_item.created_at.isoformat() if queue_item.created_at else None,
+    })
+
+
+def publish_suite(suite):
+    broker.publish("suite", {
+        "id": suite.id,
+        "status": suite.status,
+        "model_name": suite.model.name,
+        "prompt_name": suite.prompt_revision.prompt.name,
+        "run_count": suite.run_count,
+        "max_score": suite.max_score,
+        "avg_score": suite.avg_score,
+        "min_score": suite.min_score,
+        "total_cost_usd": suite.total_cost_usd,
+        "judge_cost_usd": suite.judge_cost_usd,
+    })
+
+
+def apply_budget(db: Session, pending_items):
+    """Resume paused items that fit today's spend caps again, then pause pending items that don't.
+
+    Returns up to WORKER_CONCURRENCY items (plus up to REJUDGE_CONCURRENCY re-judges) to run now.
+    Items are taken oldest first, with items that share a prompt cache entry kept together
+    (see benchmark.scheduling). Resumed non-urgent items are left pending for the next batch submission.
+    """
+    for item in budget.resumable(db, crud.get_queue_items(db, "paused")):
+        metrics.retries.inc(stage="budget_resume", model=item.model.name)
+        item.status = "pending"
+        item.status_reason = None
+        if item.is_urgent is not False:
+            pending_items.append(item)
+        publish_queue_item(item)
+    pending_items = scheduling.order_for_cache(pending_items)
+
+    batch_items, over_budget = budget.admit(db, pending_items, WORKER_CONCURRENCY, REJUDGE_CONCURRENCY)
+    for item in over_budget:
+        item.status = "paused"
+        publish_queue_item(item)
+        logger.info(f"Paused queue item {item.id}: {item.status_reason}")
+    db.commit()
+    return batch_items
+
+
+async def process_pending_batch(db: Session) -> int:
+    """Process pending urgent queue items concurrently (see apply_budget); returns how many were picked"""
+    pending = [item for item in crud.get_queue_items(db, "pending") if item.is_urgent is not False]
+    batch_items = apply_budget(db, pending)
+    if batch_items:
+        tasks = []
+        for leader, *followers in scheduling.cache_groups(batch_items):
+            # Followers start once the leader has put the shared prompt prefix in the provider's cache
+            warmed = asyncio.Event()
+            warm_up = warmed if followers and scheduling.is_cacheable(leader) else None
+            tasks.append(process_queue_item(leader.id, db, warmed=warmed))
+            tasks += [process_queue_item(item.id, db, warm_up=warm_up) for item in followers]
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return len(batch_items)
+
+
+async def process_provider_batches(db: Session, recover: bool = False) -> int:
+    """Submit pending non-urgent items to provider batch APIs and score finished batches; returns suites scored.
+
+    With recover, batch items a restart left unscored are scored too (see provider_batches.recover).
+    """
+    ready = provider_batches.recover(db) if recover else []
+    for item in await provider_batches.submit_pending(db, get_runner()):
+        publish_queue_item(item)
+
+    ready += await provider_batches.poll(db, get_runner())
+    for start in range(0, len(ready), WORKER_CONCURRENCY):
+        tasks = [finish_batched_item(db, item, suite) for item, suite in ready[start:start + WORKER_CONCURRENCY]]
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return len(ready)
 
 
 async def queue_processor():
+    last_depth = None
+    last_batch_poll = 0.0
+    recovered = False
     while True:
         try:
             db = next(get_db())
             try:
-                pending_items = crud.get_queue_items(db, "pending")
-                # Process up to 5 items concurrently
-                batch_items = pending_items[:5]
-                if batch_items:
-                    tasks = [process_queue_item(item.id, db) for item in batch_items]
-                    await asyncio.gather(*tasks, return_exceptions=True)
+                # Lets clients notice items queued from other sessions without polling the page
+                depth = crud.get_queue_depth(db)
+                if depth != last_depth:
+                    broker.publish("queue_depth", depth)
+                    last_depth = depth
+
+                await process_pending_batch(db)
+
+                if time.monotonic() - last_batch_poll >= provider_batches.BATCH_POLL_SECONDS:
+                    last_batch_poll = time.monotonic()
+                    await process_provider_batches(db, recover=not recovered)
+                    recovered = True
             finally:
                 db.close()
         except Exception as e:
             logger.error(f"Error in queue processor: {e}")
+            metrics.errors.inc(stage="queue", model="")
 
         await asyncio.sleep(5)
 
 
-async def process_queue_item(queue_item_id: int, db: Session):
+async def process_queue_item(queue_item_id: int, db: Session, warmed: asyncio.Event = None,
+                             warm_up: asyncio.Event = None):
+    """Run one queue item. warmed is set once its first response is back (or it ends);
+    with warm_up, generation waits for another item's warmed (see benchmark.scheduling)."""
+    start_time = time.perf_counter()
+    metrics.worker_busy.inc()
+    try:
+        with tracing.span("queue_item", queue_item_id=queue_item_id):
+            await _process_queue_item(queue_item_id, db, warmed, warm_up)
+    finally:
+        if warmed is not None:
+            warmed.set()
+        elapsed = time.perf_counter() - start_time
+        metrics.worker_busy.dec()
+        metrics.worker_busy_seconds.inc(elapsed)
+
+
+async def _process_queue_item(queue_item_id: int, db: Session, warmed: asyncio.Event = None,
+                              warm_up: asyncio.Event = None):
+    start_time = time.perf_counter()
+    queue_item = None
+    suite = None
     try:
         queue_item = (
             db.query(models.RunQueue)
@@ -80,114 +224,324 @@ async def process_queue_item(queue_item_id: int, db: Session):
         queue_item.status = "running"
         queue_item.started_at = models.func.now()
         db.commit()
+        publish_queue_item(queue_item)
 
         model = queue_item.model
         prompt_revision = queue_item.prompt_revision
-        judge_model_name = queue_item.judge_model
-        judge_base_url = queue_item.judge_base_url
-
         model_config = {
             "api_endpoint": model.api_endpoint,
             "api_key_name": model.api_key_name,
         }
 
-        # Create benchmark suite instead of single run
+        if queue_item.job_type == "rejudge":
+            # Score copies of an existing suite's responses; nothing is generated
+            with tracing.span("clone_runs", source_suite_id=queue_item.source_suite_id):
+                suite = crud.clone_suite_for_rejudge(db, queue_item.source_suite, prompt_revision.id)
+            tracing.current_span().attributes.update(suite_id=suite.id, model=model.name, job_type="rejudge")
+            await score_and_aggregate(db, queue_item, suite.id)
+            complete_queue_item(db, queue_item, suite)
+            metrics.queue_item_seconds.observe(time.perf_counter() - start_time, status="completed")
+            return
+
+        # Fixed suites run once; adaptive suites add batches until the score interval is tight enough
+        sampling_mode = queue_item.sampling_mode or "fixed"
+        batch_size = sampling.initial_runs(sampling_mode)
+        run_limit = sampling.max_runs(sampling_mode)
         suite = crud.create_benchmark_suite(
-            db, prompt_revision.id, model.id, run_count=5
+            db, prompt_revision.id, model.id, run_count=batch_size
         )
 
-        # Run the benchmark suite (5 runs)
-        await benchmark_runner.run_benchmark_suite(
-            db, suite.id, prompt_revision.content, model.name, model_config, run_count=5
-        )
+        tracing.current_span().attributes.update(suite_id=suite.id, model=model.name, sampling_mode=sampling_mode)
 
-        # Score all runs in the suite if judge is available
-        if judge_model_name and prompt_revision.rubric_prompt:
-            await score_suite_runs(
-                db, suite.id, judge_model_name, judge_base_url, prompt_revision
-            )
-        else:
-            await score_suite_runs_basic(db, suite.id, model.model_type.name)
+        if warm_up is not None:
+            with tracing.span("cache_warmup") as span:
+                span.attributes["outcome"] = await scheduling.wait_for_warmup(warm_up)
 
-        # Update suite aggregates after scoring
-        benchmark_runner.update_suite_scores(db, suite.id)
+        runs_done = 0
+        while batch_size:
+            with tracing.span("generate", run_count=batch_size, start_index=runs_done + 1):
+                await get_runner().run_benchmark_suite(
+                    db, suite.id, prompt_revision.content, model.name, model_config,
+                    run_count=batch_size, start_index=runs_done + 1, complete=False,
+                    agent_tools=prompt_revision.agent_tools, attachments=prompt_revision.attachments,
+                    on_first_response=warmed.set if warmed is not None else None,
+                )
+            runs_done += batch_size
 
-        crud.mark_revision_as_run(db, prompt_revision.id)
+            await score_and_aggregate(db, queue_item, suite.id)
 
-        queue_item.status = "completed"
-        queue_item.completed_at = models.func.now()
-        db.commit()
+            batch_size = 0
+            if sampling_mode == "adaptive":
+                scores = [run.score for run in crud.get_suite_runs(db, suite.id) if run.score is not None]
+                batch_size = sampling.next_batch_size(scores, runs_done, run_limit)
+                if batch_size:
+                    metrics.retries.inc(stage="adaptive", model=model.name)
 
-        logger.info(
-            f"Completed benchmark suite for model {model.name} on prompt {prompt_revision.prompt.name}"
-        )
+        complete_queue_item(db, queue_item, suite)
+        metrics.queue_item_seconds.observe(time.perf_counter() - start_time, status="completed")
 
     except Exception as e:
         logger.error(f"Error processing queue item {queue_item_id}: {e}")
+        metrics.errors.inc(stage="queue", model=queue_item.model.name if queue_item else "")
+        metrics.queue_item_seconds.observe(time.perf_counter() - start_time, status="failed")
         if queue_item:
             queue_item.status = "failed"
             queue_item.completed_at = models.func.now()
+            if suite:
+                suite.trace_summary = tracing.summarize(tracing.current_span().root)
             db.commit()
+            publish_queue_item(queue_item)
+
+
+async def score_and_aggregate(db: Session, queue_item, suite_id: int):
+    """Score the suite's unscored runs and refresh its aggregates.
+
+    Runs are first compared with the revision's reference answer, if it has one. The revision's
+    local checks take precedence over the item's judges; with neither, the model type's basic
+    evaluator scores the runs.
+    """
+    prompt_revision = queue_item.prompt_revision
+    judges = queue_item.judges
+    if prompt_revision.reference_answer:
+        with tracing.span("reference_scores"):
+            score_suite_references(db, suite_id, prompt_revision.reference_answer)
+
+    if prompt_revision.evaluator_config:
+        with tracing.span("score_local"):
+            await score_suite_runs_basic(
+                db, suite_id, queue_item.model.model_type.name, prompt_revision.evaluator_config,
+                prompt_revision.reference_answer,
+            )
+    elif judges and prompt_revision.rubric_prompt:
+        with tracing.span("judge", judge=", ".join(name for name, _ in judges)):
+            await score_suite_runs(
+                db, suite_id, judges, prompt_revision, queue_item.judge_aggregation or "mean"
+            )
+    else:
+        with tracing.span("score_basic"):
+            await score_suite_runs_basic(db, suite_id, queue_item.model.model_type.name)
+
+    # Update suite aggregates after scoring
+    with tracing.span("aggregate"):
+        get_runner().update_suite_scores(db, suite_id)
+
+
+def complete_queue_item(db: Session, queue_item, suite):
+    with tracing.span("consistency"):
+        update_suite_consistency(db, suite)
+
+    suite.status = "completed"
+    db.commit()
+    db.refresh(suite)
+    publish_suite(suite)
+
+    with tracing.span("mark_revision"):
+        crud.mark_revision_as_run(db, queue_item.prompt_revision_id)
+
+    with tracing.span("leaderboard"):
+        crud.refresh_leaderboard_cell(db, suite.model_id, suite.prompt_revision_id)
+
+    if queue_item.job_type != "rejudge":
+        with tracing.span("regressions") as span:
+            flagged = regressions.record_suite(db, suite)
+            span.attributes["flagged"] = len(flagged)
+        for regression in flagged:
+            logger.warning(
+                f"Regression in {regression.metric} for model {queue_item.model.name} on prompt "
+                f"{queue_item.prompt_revision.prompt.name}: {regression.baseline_mean:.4g} -> {regression.current_mean:.4g}"
+            )
+
+    queue_item.status = "completed"
+    queue_item.completed_at = models.func.now()
+    suite.trace_summary = tracing.summarize(tracing.current_span().root)
+    db.commit()
+    publish_queue_item(queue_item)
+
+    logger.info(
+        f"Completed benchmark suite for model {queue_item.model.name} on prompt {queue_item.prompt_revision.prompt.name}"
+    )
+
+
+def update_suite_consistency(db: Session, suite):
+    """Store how similar, duplicated and length-stable the suite's responses are"""
+    runs = crud.get_suite_runs(db, suite.id, with_text=True)
+    stats = consistency.suite_consistency(
+        [run.response_text or "" for run in runs], [run.output_tokens for run in runs]
+    )
+    for name, value in stats.items():
+        setattr(suite, name, value)
+
+
+async def finish_batched_item(db: Session, queue_item, suite):
+    """Score and complete a suite whose runs came back from a provider batch"""
+    try:
+        with tracing.span("batch_item", queue_item_id=queue_item.id, suite_id=suite.id, model=queue_item.model.name):
+            publish_queue_item(queue_item)
+            await score_and_aggregate(db, queue_item, suite.id)
+            complete_queue_item(db, queue_item, suite)
+    except Exception as e:
+        logger.error(f"Error scoring batched queue item {queue_item.id}: {e}")
+        metrics.errors.inc(stage="queue", model=queue_item.model.name)
+        queue_item.status = "failed"
+        queue_item.completed_at = models.func.now()
+        db.commit()
+        publish_queue_item(queue_item)
 
 
 async def score_suite_runs(
     db: Session,
     suite_id: int,
-    judge_model_name: str,
-    judge_base_url: str,
+    judges,
     prompt_revision,
+    aggregation: str = "mean",
+    rejudge: bool = False,
 ):
-    """Score all runs in a suite using LLM judge"""
-    runs = crud.get_suite_runs(db, suite_id)
+    """Score the suite's unscored runs (all runs with rejudge) using a panel of LLM judges.
+
+    Every (run, judge) verdict is stored as a JudgeScore. Verdicts a judge already gave on a run
+    are reused, so re-judging with a larger panel only calls the new judges.
+    """
+    runs = crud.get_suite_runs(db, suite_id, with_text=True, unscored_only=not rejudge)
 
     if not runs:
         return
 
     try:
-        from benchmark.evaluator import LLMJudgeEvaluator
+        from benchmark.evaluator import JudgePanel, JudgeResult
 
-        judge = LLMJudgeEvaluator(judge_model_name, judge_base_url)
+        panel = JudgePanel(judges, aggregation)
+        stored = crud.get_judge_scores(db, [run.id for run in runs])
+
+        known = []
+        for run in runs:
+            # Runs judged before verdicts were stored per judge carry a single judge's verdict on the run
+            if not stored[run.id] and run.judge_model and run.score is not None:
+                stored[run.id].append(crud.add_judge_score(
+                    db, run, run.judge_model, run.judge_base_url, run.score, run.judge_reasoning,
+                    run.judge_input_tokens, run.judge_output_tokens, run.judge_cost_usd,
+                ))
+                db.flush()
+            # Verdicts that could not be parsed are asked for again
+            known.append({row.judge_model: JudgeResult(row.score, row.reasoning, row.input_tokens or 0,
+                                                       row.output_tokens or 0, row.cost_usd or 0.0)
+                          for row in stored[run.id] if row.score is not None})
 
         evaluation_data = [
             (run.response_text, prompt_revision.content, prompt_revision.rubric_prompt)
             for run in runs
         ]
 
-        results = await judge.evaluate_responses_batch(evaluation_data)
+        results = await panel.evaluate_responses_batch(evaluation_data, known)
+
+        for run, result, verdicts in zip(runs, results, known):
+            unparsed = {row.judge_model: row for row in stored[run.id] if row.score is None}
+            for (judge_name, judge_base_url), judge_result in zip(judges, result.judge_results):
+                if judge_name not in verdicts:
+                    crud.add_judge_score(
+                        db, run, judge_name, judge_base_url, judge_result.score, judge_result.reasoning,
+                        judge_result.input_tokens, judge_result.output_tokens, judge_result.cost_usd,
+                        judge_result.protocol, judge_result.parse_outcome, existing=unparsed.get(judge_name),
+                    )
+            # No verdict stays None, so the run is left unscored rather than counted as a zero
+            run.score = result.score
+            run.judge_model = ", ".join(name for name, _ in judges)
+            run.judge_base_url = judges[0][1]
+            crud.set_run_text(db, run, judge_reasoning=result.reasoning)
+
+        db.flush()
+        # A run's judge usage covers every verdict stored for it, including judges outside this panel
+        totals = db.query(
+            models.JudgeScore.run_id,
+            models.func.sum(models.JudgeScore.input_tokens),
+            models.func.sum(models.JudgeScore.output_tokens),
+            models.func.sum(models.JudgeScore.cost_usd),
+        ).filter(models.JudgeScore.run_id.in_([run.id for run in runs])).group_by(models.JudgeScore.run_id).all()
+        by_run = {run_id: (input_tokens, output_tokens, cost) for run_id, input_tokens, output_tokens, cost in totals}
+        for run in runs:
+            run.judge_input_tokens, run.judge_output_tokens, run.judge_cost_usd = by_run.get(run.id, (0, 0, 0.0))
 
-        for run, (score, judge_reasoning) in zip(runs, results):
-            run.score = score if score is not None else 0.0
-            run.judge_model = judge_model_name
-            run.judge_base_url = judge_base_url
-            run.judge_reasoning = judge_reasoning
+        db.flush()
+        suite = db.get(models.BenchmarkSuite, suite_id)
+        if suite:
+            suite.judge_cost_usd = db.query(models.func.sum(models.BenchmarkRun.judge_cost_usd)).filter(
+                models.BenchmarkRun.suite_id == suite_id
+            ).scalar()
+            suite.judge_agreement = suite_judge_agreement(db, suite_id, [name for name, _ in judges])
 
     except Exception as e:
+        # The runs stay unscored, so a later re-judge picks them up
         logger.error(f"Error scoring suite {suite_id}: {e}")
-        for run in runs:
-            run.score = 0.0
+        metrics.errors.inc(stage="judge", model=", ".join(name for name, _ in judges))
 
     db.commit()
 
 
-async def score_suite_runs_basic(db: Session, suite_id: int, model_type_name: str):
-    """Score all runs in a suite using basic evaluator"""
-    runs = crud.get_suite_runs(db, suite_id)
-    evaluator = get_evaluator(model_type_name)
+def suite_judge_agreement(db: Session, suite_id: int, judge_names):
+    """Inter-judge agreement of the panel over all of the suite's runs"""
+    from benchmark.evaluator import judge_agreement
 
-    for run in runs:
-        try:
-            score = evaluator.evaluate_response(run.response_text)
-            run.score = score
-        except Exception as e:
-            logger.error(f"Error scoring run {run.id}: {e}")
-            run.score = 0.0
+    if len(judge_names) < 2:
+        return None
+    rows = (
+        db.query(models.JudgeScore.run_id, models.JudgeScore.score)
+        .join(models.BenchmarkRun, models.JudgeScore.run_id == models.BenchmarkRun.id)
+        .filter(models.BenchmarkRun.suite_id == suite_id, models.JudgeScore.judge_model.in_(judge_names))
+        .all()
+    )
+    by_run = {}
+    for run_id, score in rows:
+        by_run.setdefault(run_id, []).append(score)
+    return judge_agreement(list(by_run.values()))
+
+
+async def rejudge_suite(db: Session, suite_id: int, judges, aggregation: str = "mean"):
+    """Re-score an existing suite's runs with a judge panel without generating new responses"""
+    suite = crud.get_benchmark_suite(db, suite_id)
+    if not suite:
+        raise ValueError(f"Benchmark suite {suite_id} not found")
+    await score_suite_runs(db, suite_id, judges, suite.prompt_revision, aggregation, rejudge=True)
+    get_runner().update_suite_scores(db, suite_id)
+    crud.refresh_leaderboard_cell(db, suite.model_id, suite.prompt_revision_id)
+    db.refresh(suite)
+    publish_suite(suite)
+
+
+def score_suite_references(db: Session, suite_id: int, reference_answer: str):
+    """Compare the suite's runs with the reference answer in one vectorized pass (no network calls)"""
+    runs = [run for run in crud.get_suite_runs(db, suite_id, with_text=True) if run.reference_scores is None]
+    results = reference_metrics.score_pairs([(run.response_text, reference_answer) for run in runs])
+    for run, result in zip(runs, results):
+        if result is not None:
+            run.reference_scores = result
+    db.commit()
+
+
+async def score_suite_runs_basic(db: Session, suite_id: int, model_type_name: str, evaluator_config=None,
+                                 reference_answer: str = None):
+    """Score the suite's unscored runs in one batch with local checks or the basic evaluator"""
+    runs = crud.get_suite_runs(db, suite_id, with_text=True, unscored_only=True)
+    if not runs:
+        return
+
+    try:
+        evaluator = get_evaluator(model_type_name, evaluator_config, reference_answer)
+        results = await evaluator.evaluate_batch([run.response_text for run in runs])
+    except Exception as e:
+        logger.error(f"Error scoring suite {suite_id}: {e}")
+        metrics.errors.inc(stage="evaluate", model="")
+        results = [LocalResult(0.0)] * len(runs)
+
+    for run, result in zip(runs, results):
+        run.score = result.score
+        if result.detail:
+            crud.set_run_text(db, run, judge_reasoning=result.detail)
 
     db.commit()
 
 
 @app.get("/api/benchmark-runs/{run_id}")
 async def get_benchmark_run(run_id: int, db: Session = Depends(get_db)):
-    run = db.query(models.BenchmarkRun).filter(models.BenchmarkRun.id == run_id).first()
+    run = crud.get_benchmark_run(db, run_id, with_text=True)
     if not run:
         raise HTTPException(status_code=404, detail="Benchmark run not found")
 
@@ -197,26 +551,37 @@ async def get_benchmark_run(run_id: int, db: Session = Depends(get_db)):
         "response_text": run.response_text,
         "score": run.score,
         "input_tokens": run.input_tokens,
+        "cached_input_tokens": run.cached_input_tokens,
         "output_tokens": run.output_tokens,
         "cost_usd": run.cost_usd,
+        "judge_cost_usd": run.judge_cost_usd,
         "run_time_ms": run.run_time_ms,
         "created_at": run.created_at.isoformat(),
         "model_name": run.model.name,
         "judge_model": run.judge_model,
         "judge_base_url": run.judge_base_url,
         "judge_reasoning": run.judge_reasoning,
+        "reference_scores": run.reference_scores,
+        "run_metadata": run.run_metadata,
     }
 
 
+@app.get("/api/attachments/{attachment_id}")
+async def get_attachment(attachment_id: int, db: Session = Depends(get_db)):
+    attachment = db.query(models.PromptAttachment).filter(models.PromptAttachment.id == attachment_id).first()
+    if not attachment or not os.path.exists(images.full_path(attachment.path)):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return FileResponse(images.full_path(attachment.path), media_type=attachment.content_type)
+
+
 @app.get("/api/suite-runs/{suite_id}")
 async def get_suite_runs(suite_id: int, db: Session = Depends(get_db)):
     suite = crud.get_benchmark_suite(db, suite_id)
     if not suite:
-        from fastapi import HTTPException
-
         raise HTTPException(status_code=404, detail="Benchmark suite not found")
 
-    runs = crud.get_suite_runs(db, suite_id)
+    runs = crud.get_suite_runs(db, suite_id, with_text=True)
+    judge_scores = crud.get_judge_scores(db, [run.id for run in runs])
 
     return {
         "suite": {
@@ -226,7 +591,17 @@ async def get_suite_runs(suite_id: int, db: Session = Depends(get_db)):
             "max_score": suite.max_score,
             "avg_score": suite.avg_score,
             "min_score": suite.min_score,
+            "ci_low": suite.ci_low,
+            "ci_high": suite.ci_high,
             "total_cost_usd": suite.total_cost_usd,
+            "judge_cost_usd": suite.judge_cost_usd,
+            "avg_cached_input_tokens": suite.avg_cached_input_tokens,
+            "judge_agreement": suite.judge_agreement,
+            "std_dev_score": suite.std_dev_score,
+            "response_similarity": suite.response_similarity,
+            "duplicate_rate": suite.duplicate_rate,
+            "std_dev_output_tokens": suite.std_dev_output_tokens,
+            "trace_summary": suite.trace_summary,
             "prompt_name": suite.prompt_revision.prompt.name,
             "model_name": suite.model.name,
             "created_at": suite.created_at.isoformat(),
@@ -241,9 +616,15 @@ async def get_suite_runs(suite_id: int, db: Session = Depends(get_db)):
                 "response_text": run.response_text,
                 "score": run.score,
                 "judge_reasoning": run.judge_reasoning,
+                "judge_scores": [
+                    {"judge_model": row.judge_model, "score": row.score} for row in judge_scores[run.id]
+                ],
+                "reference_scores": run.reference_scores,
                 "input_tokens": run.input_tokens,
+                "cached_input_tokens": run.cached_input_tokens,
                 "output_tokens": run.output_tokens,
                 "cost_usd": run.cost_usd,
+                "judge_cost_usd": run.judge_cost_usd,
                 "run_time_ms": run.run_time_ms,
                 "created_at": run.created_at.isoformat(),
             }
@@ -252,6 +633,58 @@ async def get_suite_runs(suite_id: int, db: Session = Depends(get_db)):
     }
 
 
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """Server-Sent Events stream of queue, run and suite updates from the worker"""
+
+    async def generate():
+        queue = broker.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(db: Session = Depends(get_db)):
+    """Prometheus text exposition of worker, provider and database metrics"""
+    metrics.queue_items.clear()
+    for status, count in crud.get_queue_depth(db).items():
+        metrics.queue_items.set(count, status=status)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/judge-stats")
+async def get_judge_stats(db: Session = Depends(get_db)):
+    """Per judge model: stored verdicts, how many needed a repair request and how many never parsed"""
+    return crud.get_judge_parse_stats(db)
+
+
+@app.get("/api/leaderboard")
+def get_leaderboard(model_type_id: int = None, db: Session = Depends(get_db)):
+    """Models ranked by Bradley-Terry rating with bootstrap intervals and pairwise win rates (see benchmark.leaderboard)"""
+    return leaderboard.get(db, model_type_id)
+
+
+@app.get("/api/regressions")
+async def get_regressions(status: str = None, model_id: int = None, prompt_id: int = None, limit: int = 100,
+                          db: Session = Depends(get_db)):
+    """Suites flagged as worse than their (model, prompt) baseline, newest first (see benchmark.regressions)"""
+    return [regressions.describe(r) for r in crud.get_regressions(db, status, model_id, prompt_id, limit)]
+
+
 @app.get("/api/chart-data")
 async def get_chart_data(
     eval_type: int = None,
@@ -268,6 +701,9 @@ async def get_chart_data(
                 models.BenchmarkSuite.avg_input_tokens
                 + models.BenchmarkSuite.avg_output_tokens
             ).label("avg_tokens"),
+            models.func.avg(models.BenchmarkSuite.response_similarity).label("response_similarity"),
+            models.func.avg(models.BenchmarkSuite.duplicate_rate).label("duplicate_rate"),
+            models.func.avg(models.BenchmarkSuite.std_dev_output_tokens).label("std_dev_output_tokens"),
         )
         .join(models.BenchmarkSuite)
         .join(models.PromptRevision)
@@ -292,7 +728,83 @@ async def get_chart_data(
         "average_scores": [float(r.avg_score) if r.avg_score else 0 for r in results],
         "total_costs": [float(r.total_cost) if r.total_cost else 0 for r in results],
         "avg_tokens": [float(r.avg_tokens) if r.avg_tokens else 0 for r in results],
+        # Consistency metrics stay null for models whose suites predate them
+        "response_similarity": [_optional_float(r.response_similarity) for r in results],
+        "duplicate_rates": [_optional_float(r.duplicate_rate) for r in results],
+        "std_dev_output_tokens": [_optional_float(r.std_dev_output_tokens) for r in results],
+    }
+
+
+def _optional_float(value):
+    return float(value) if value is not None else None
+
+
+def export_response(kind: str, fmt: str, filters: dict, include_text: bool = False):
+    if fmt not in export.ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    if fmt == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    def generate():
+        # The request session is closed before streaming starts, so use a dedicated one
+        db = SessionLocal()
+        try:
+            yield from export.stream_export(db, kind, fmt, filters, include_text=include_text)
+        finally:
+            db.close()
+
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return StreamingResponse(
+        generate(),
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/api/export/runs")
+async def export_runs(
+    format: str = "jsonl",
+    model_id: int = None,
+    prompt_id: int = None,
+    judge_model: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    include_text: bool = False,
+):
+    filters = {
+        "model_id": model_id,
+        "prompt_id": prompt_id,
+        "judge_model": judge_model,
+        "since": since,
+        "until": until,
     }
+    return export_response("runs", format, filters, include_text=include_text)
+
+
+@app.get("/api/export/suites")
+async def export_suites(
+    format: str = "jsonl",
+    model_id: int = None,
+    prompt_id: int = None,
+    judge_model: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    status: str = None,
+):
+    filters = {
+        "model_id": model_id,
+        "prompt_id": prompt_id,
+        "judge_model": judge_model,
+        "since": since,
+        "until": until,
+        "status": status,
+    }
+    return export_response("suites", format, filters)
+
+
+@app.get("/api/export-results")
+async def export_results():
+    return export_response("suites", "csv", {"status": "completed"})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,288 @@
+"""Minimal Prometheus-compatible metrics: counters, gauges and histograms rendered in the text exposition format"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+def _label_str(label_names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.label_names, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def totals(self) -> Tuple[float, int]:
+        """(sum, count) of all observations across every label set"""
+        with self._lock:
+            states = list(self._values.values())
+        return sum(state[-2] for state in states), sum(state[-1] for state in states)
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, le)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.label_names, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.label_names, key)} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+queue_items = registry.register(Gauge(
+    "bench_queue_items", "Queue items by status", ["status"]))
+worker_capacity = registry.register(Gauge(
+    "bench_worker_capacity", "Queue items the worker processes concurrently"))
+worker_busy = registry.register(Gauge(
+    "bench_worker_busy", "Queue items currently being processed"))
+startup_seconds = registry.register(Gauge(
+    "bench_startup_seconds", "Time spent in each startup phase (imports, schema_check)", ["phase"]))
+worker_busy_seconds = registry.register(Counter(
+    "bench_worker_busy_seconds_total", "Seconds spent processing queue items, summed over worker slots"))
+queue_item_seconds = registry.register(Histogram(
+    "bench_queue_item_seconds", "End-to-end time to process a queue item", ["status"]))
+
+provider_request_seconds = registry.register(Histogram(
+    "bench_provider_request_seconds", "Latency of model generation requests", ["model"]))
+judge_request_seconds = registry.register(Histogram(
+    "bench_judge_request_seconds", "Latency of judge evaluation requests", ["judge"]))
+image_cache = registry.register(Counter(
+    "bench_image_cache_total", "Image encode cache lookups", ["result"]))
+image_encode_seconds = registry.register(Histogram(
+    "bench_image_encode_seconds", "Time to resize, re-encode and base64 one image",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)))
+image_payload_bytes = registry.register(Histogram(
+    "bench_image_payload_bytes", "Base64 image payload per generation request", ["model"],
+    buckets=(1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2e7)))
+agent_steps = registry.register(Histogram(
+    "bench_agent_steps", "Model turns per agent episode", ["stop_reason"], buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32)))
+agent_tool_seconds = registry.register(Histogram(
+    "bench_agent_tool_seconds", "Duration of agent tool calls", ["tool"]))
+agent_tool_calls = registry.register(Counter(
+    "bench_agent_tool_calls_total", "Agent tool calls by outcome (ok, error or timeout)", ["tool", "outcome"]))
+judge_verdicts = registry.register(Counter(
+    "bench_judge_verdicts_total", "Judge replies by parse outcome (parsed, repaired or failed)", ["judge", "outcome"]))
+judge_dedup = registry.register(Counter(
+    "bench_judge_dedup_total", "Judge calls skipped because the response duplicated an earlier one", ["judge"]))
+leaderboard_cache = registry.register(Counter(
+    "bench_leaderboard_cache_total", "Leaderboard requests served from the cache (hit) or recomputed (miss)", ["result"]))
+leaderboard_compute_seconds = registry.register(Histogram(
+    "bench_leaderboard_compute_seconds", "Time to recompute the leaderboard statistics"))
+regressions = registry.register(Counter(
+    "bench_regressions_total", "Suites flagged as worse than their rolling baseline", ["metric", "model"]))
+cache_warmup_seconds = registry.register(Histogram(
+    "bench_cache_warmup_seconds", "Time queue items waited for a prompt-cache leader (warmed or timeout)", ["outcome"]))
+tokens = registry.register(Counter(
+    "bench_tokens_total", "Tokens processed (input, output and cached_input)", ["model", "direction"]))
+cost_usd = registry.register(Counter(
+    "bench_cost_usd_total", "Estimated spend in USD", ["model"]))
+errors = registry.register(Counter(
+    "bench_errors_total", "Errors by stage", ["stage", "model"]))
+retries = registry.register(Counter(
+    "bench_retries_total", "Re-requests by stage (judge_repair, judge_protocol, adaptive, budget_resume)",
+    ["stage", "model"]))
+
+db_query_seconds = registry.register(Histogram(
+    "bench_db_query_seconds", "Duration of SQL statements", ["operation"], buckets=DB_BUCKETS))
+db_commit_seconds = registry.register(Histogram(
+    "bench_db_commit_seconds", "Duration of session commits", buckets=DB_BUCKETS))
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Set per HTTP request by QueryStatsMiddleware; a mutable object so threadpool copies of the context share it
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+class QueryStatsMiddleware:
+    """Report the SQL statements each request ran: X-DB-Queries plus a Server-Timing "db" entry"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"server-timing", f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _query_stats.reset(token)
+
+
+def instrument_database(engine, session_factory=None) -> None:
+    """Time every SQL statement on the engine and every commit of sessions from the factory"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_seconds.observe(elapsed, operation=operation)
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    if session_factory is None:
+        return
+
+    @event.listens_for(session_factory, "before_commit")
+    def _before_commit(session):
+        session.info["commit_start"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def _after_commit(session):
+        start = session.info.pop("commit_start", None)
+        if start is not None:
+            db_commit_seconds.observe(time.perf_counter() - start)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, UploadFile, File
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
@@ -8,12 +8,15 @@ import json
 
 from database.database import get_db
 from database import crud, models
-from benchmark.runner import BenchmarkRunner
-from benchmark.evaluator import get_evaluator
+from database.importer import parse_entries, import_entries, ImportFormatError
+from benchmark.evaluator import AGGREGATIONS, get_evaluator
+from benchmark import agent, budget, images, leaderboard, local_evaluators, regressions
+from benchmark.sampling import SAMPLING_MODES
+import httpcache
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
-benchmark_runner = BenchmarkRunner()
+templates.env.globals["static_url"] = httpcache.static_url
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -35,11 +38,13 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
     queue_items = crud.get_queue_items(db)[:10]
     prompts = crud.get_prompts(db)
     models_list = crud.get_models(db)
+    open_regressions = [regressions.describe(r) for r in crud.get_regressions(db, "open", limit=10)]
 
     model_performance = (
         db.query(
             models.Model.name,
             func.avg(models.BenchmarkSuite.avg_score).label("avg_score"),
+            func.count(models.BenchmarkSuite.avg_score).label("suite_count"),
         )
         .join(models.BenchmarkSuite)
         .filter(models.BenchmarkSuite.status == "completed")
@@ -52,6 +57,7 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
         "scores": [
             float(mp.avg_score) if mp.avg_score else 0 for mp in model_performance
         ],
+        "suite_counts": [mp.suite_count for mp in model_performance],
     }
 
     return templates.TemplateResponse(
@@ -64,6 +70,7 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
             "prompts": prompts,
             "models": models_list,
             "chart_data": chart_data,
+            "regressions": open_regressions,
         },
     )
 
@@ -203,6 +210,9 @@ async def results_page(request: Request, db: Session = Depends(get_db)):
                 models.BenchmarkSuite.avg_input_tokens
                 + models.BenchmarkSuite.avg_output_tokens
             ).label("avg_tokens"),
+            func.avg(models.BenchmarkSuite.response_similarity).label("response_similarity"),
+            func.avg(models.BenchmarkSuite.duplicate_rate).label("duplicate_rate"),
+            func.avg(models.BenchmarkSuite.std_dev_output_tokens).label("std_dev_output_tokens"),
         )
         .join(models.BenchmarkSuite)
         .filter(models.BenchmarkSuite.status == "completed")
@@ -221,6 +231,19 @@ async def results_page(request: Request, db: Session = Depends(get_db)):
         "avg_tokens": [
             float(ms.avg_tokens) if ms.avg_tokens else 0 for ms in model_stats
         ],
+        # Consistency metrics stay null for models whose suites predate them
+        "response_similarity": [
+            float(ms.response_similarity) if ms.response_similarity is not None else None
+            for ms in model_stats
+        ],
+        "duplicate_rates": [
+            float(ms.duplicate_rate) if ms.duplicate_rate is not None else None
+            for ms in model_stats
+        ],
+        "std_dev_output_tokens": [
+            float(ms.std_dev_output_tokens) if ms.std_dev_output_tokens is not None else None
+            for ms in model_stats
+        ],
     }
 
     return templates.TemplateResponse(
@@ -235,15 +258,36 @@ async def results_page(request: Request, db: Session = Depends(get_db)):
     )
 
 
+@router.get("/leaderboard", response_class=HTMLResponse)
+def leaderboard_page(request: Request, model_type_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # A plain def, so a recompute after new results runs in the threadpool instead of the event loop
+    return templates.TemplateResponse(
+        "leaderboard.html",
+        {
+            "request": request,
+            "board": leaderboard.get(db, model_type_id),
+            "model_types": crud.get_model_types(db),
+            "model_type_id": model_type_id,
+        },
+    )
+
+
 @router.post("/api/prompts")
 async def create_prompt(
     name: str = Form(...),
     model_type_id: int = Form(...),
     content: str = Form(...),
     rubric_prompt: str = Form(...),
+    evaluator_config: Optional[str] = Form(None),
+    reference_answer: Optional[str] = Form(None),
+    agent_tools: Optional[str] = Form(None),
+    image_files: List[UploadFile] = File(default=[]),
     db: Session = Depends(get_db),
 ):
-    crud.create_prompt(db, name, model_type_id, content, rubric_prompt)
+    crud.create_prompt(
+        db, name, model_type_id, content, rubric_prompt, _evaluator_config(evaluator_config), reference_answer or None,
+        _agent_tools(agent_tools), await _save_images(image_files),
+    )
     return RedirectResponse(url="/prompts", status_code=303)
 
 
@@ -252,29 +296,125 @@ async def create_prompt_revision(
     prompt_id: int,
     content: str = Form(...),
     rubric_prompt: str = Form(...),
+    evaluator_config: Optional[str] = Form(None),
+    reference_answer: Optional[str] = Form(None),
+    agent_tools: Optional[str] = Form(None),
+    image_files: List[UploadFile] = File(default=[]),
+    remove_images: bool = Form(False),
     db: Session = Depends(get_db),
 ):
-    crud.create_prompt_revision(db, prompt_id, content, rubric_prompt)
+    # Without new uploads the revision keeps the current images unless they are removed
+    new_images = await _save_images(image_files)
+    crud.create_prompt_revision(
+        db, prompt_id, content, rubric_prompt, _evaluator_config(evaluator_config), reference_answer or None,
+        _agent_tools(agent_tools), new_images or ([] if remove_images else None),
+    )
     return RedirectResponse(url=f"/prompts/{prompt_id}", status_code=303)
 
 
+def _evaluator_config(value: Optional[str]):
+    try:
+        return local_evaluators.parse_config(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _save_images(uploads: List[UploadFile]):
+    saved = []
+    for upload in uploads:
+        # Browsers send an empty part when no file was picked
+        if not upload.filename:
+            continue
+        try:
+            saved.append((upload.filename, images.save(await upload.read(), upload.filename)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return saved
+
+
+def _agent_tools(value: Optional[str]):
+    try:
+        return agent.parse_config(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/api/models")
 async def create_model(
     name: str = Form(...),
     model_type_id: int = Form(...),
     api_endpoint: Optional[str] = Form(None),
     api_key_name: Optional[str] = Form(None),
+    daily_budget_usd: Optional[str] = Form(None),
     db: Session = Depends(get_db),
 ):
-    crud.create_model(db, name, model_type_id, api_endpoint, api_key_name)
+    crud.create_model(
+        db, name, model_type_id, api_endpoint, api_key_name,
+        float(daily_budget_usd) if daily_budget_usd else None
+    )
     return RedirectResponse(url="/models", status_code=303)
 
 
+@router.post("/api/import")
+async def bulk_import(
+    file: UploadFile = File(...),
+    dry_run: bool = Form(False),
+    db: Session = Depends(get_db),
+):
+    """Upsert prompts and models from a JSONL, JSON or YAML file in one transaction"""
+    try:
+        text = (await file.read()).decode("utf-8")
+        entries = parse_entries(text, file.filename or "")
+        summary = import_entries(db, entries, dry_run=dry_run)
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"dry_run": dry_run, "entries": len(entries), **summary}
+
+
+def _check_sampling_mode(sampling_mode: str) -> str:
+    if sampling_mode not in SAMPLING_MODES:
+        raise HTTPException(status_code=400, detail=f"sampling_mode must be one of {', '.join(SAMPLING_MODES)}")
+    return sampling_mode
+
+
+def _check_aggregation(judge_aggregation: str) -> str:
+    if judge_aggregation not in AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"judge_aggregation must be one of {', '.join(AGGREGATIONS)}")
+    return judge_aggregation
+
+
+def _resolve_judges(db: Session, judge_model_ids: List[int], judge_model_id: Optional[int] = None):
+    """(name, base_url) for each selected judge model, in selection order; judge_model_id is the single-judge form"""
+    ids = list(dict.fromkeys(judge_model_ids + ([judge_model_id] if judge_model_id else [])))
+    judges = []
+    for model_id in ids:
+        judge_model = crud.get_model(db, model_id)
+        if judge_model:
+            judges.append((judge_model.name, judge_model.api_endpoint))
+    return judges
+
+
+def _judge_fields(judges) -> dict:
+    """judge_model, judge_base_url and judge_panel for a RunQueue row"""
+    if not judges:
+        return {}
+    return {
+        "judge_model": judges[0][0],
+        "judge_base_url": judges[0][1],
+        "judge_panel": [list(judge) for judge in judges[1:]],
+    }
+
+
 @router.post("/api/queue-run")
 async def queue_run(
     prompt_id: int = Form(...),
     model_ids: List[int] = Form(...),
     judge_model_id: Optional[int] = Form(None),
+    judge_model_ids: List[int] = Form([]),
+    judge_aggregation: str = Form("mean"),
+    sampling_mode: str = Form("fixed"),
+    use_batch: bool = Form(False),
     db: Session = Depends(get_db),
 ):
     current_revision = crud.get_current_prompt_revision(db, prompt_id)
@@ -283,18 +423,14 @@ async def queue_run(
             status_code=404, detail="No current revision found for prompt"
         )
 
-    judge_model_name = None
-    judge_base_url = None
-
-    if judge_model_id:
-        judge_model = crud.get_model(db, judge_model_id)
-        if judge_model:
-            judge_model_name = judge_model.name
-            judge_base_url = judge_model.api_endpoint
+    judges = _resolve_judges(db, judge_model_ids, judge_model_id)
+    _check_aggregation(judge_aggregation)
 
+    _check_sampling_mode(sampling_mode)
     for model_id in model_ids:
         crud.add_to_queue(
-            db, model_id, current_revision.id, judge_model_name, judge_base_url
+            db, model_id, current_revision.id, sampling_mode=sampling_mode,
+            is_urgent=not use_batch, judge_aggregation=judge_aggregation, **_judge_fields(judges)
         )
 
     return RedirectResponse(url="/", status_code=303)
@@ -326,6 +462,10 @@ async def rerun_prompt(prompt_id: int, db: Session = Depends(get_db)):
 async def rerun_prompt_with_judge(
     prompt_id: int = Form(...),
     judge_model_id: Optional[int] = Form(None),
+    judge_model_ids: List[int] = Form([]),
+    judge_aggregation: str = Form("mean"),
+    sampling_mode: str = Form("fixed"),
+    use_batch: bool = Form(False),
     db: Session = Depends(get_db),
 ):
     current_revision = crud.get_current_prompt_revision(db, prompt_id)
@@ -342,18 +482,40 @@ async def rerun_prompt_with_judge(
         .all()
     )
 
-    judge_model_name = None
-    judge_base_url = None
-
-    if judge_model_id:
-        judge_model = crud.get_model(db, judge_model_id)
-        if judge_model:
-            judge_model_name = judge_model.name
-            judge_base_url = judge_model.api_endpoint
+    judges = _resolve_judges(db, judge_model_ids, judge_model_id)
+    _check_aggregation(judge_aggregation)
 
+    _check_sampling_mode(sampling_mode)
     for model in compatible_models:
         crud.add_to_queue(
-            db, model.id, current_revision.id, judge_model_name, judge_base_url
+            db, model.id, current_revision.id, sampling_mode=sampling_mode,
+            is_urgent=not use_batch, judge_aggregation=judge_aggregation, **_judge_fields(judges)
+        )
+
+    return RedirectResponse(url=f"/prompts/{prompt_id}", status_code=303)
+
+
+@router.post("/api/rejudge-prompt")
+async def rejudge_prompt(
+    prompt_id: int = Form(...),
+    judge_model_id: Optional[int] = Form(None),
+    judge_model_ids: List[int] = Form([]),
+    judge_aggregation: str = Form("mean"),
+    db: Session = Depends(get_db),
+):
+    """Queue re-judges of the latest suite per model against the current revision's rubric, without new generations"""
+    current_revision = crud.get_current_prompt_revision(db, prompt_id)
+    if not current_revision:
+        raise HTTPException(status_code=404, detail="No current revision found")
+
+    judges = _resolve_judges(db, judge_model_ids, judge_model_id)
+    _check_aggregation(judge_aggregation)
+    if not judges or not current_revision.rubric_prompt:
+        raise HTTPException(status_code=400, detail="Re-judging needs a judge model and a rubric on the current revision")
+
+    for suite in crud.get_rejudge_sources(db, current_revision):
+        crud.add_rejudge_to_queue(
+            db, suite, current_revision.id, judge_aggregation=judge_aggregation, **_judge_fields(judges)
         )
 
     return RedirectResponse(url=f"/prompts/{prompt_id}", status_code=303)
@@ -386,20 +548,18 @@ async def evaluate_model(model_id: int, db: Session = Depends(get_db)):
 async def evaluate_model_with_judge(
     model_id: int = Form(...),
     judge_model_id: Optional[int] = Form(None),
+    judge_model_ids: List[int] = Form([]),
+    judge_aggregation: str = Form("mean"),
+    sampling_mode: str = Form("fixed"),
+    use_batch: bool = Form(False),
     db: Session = Depends(get_db),
 ):
     model = crud.get_model(db, model_id)
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
 
-    judge_model_name = None
-    judge_base_url = None
-
-    if judge_model_id:
-        judge_model = crud.get_model(db, judge_model_id)
-        if judge_model:
-            judge_model_name = judge_model.name
-            judge_base_url = judge_model.api_endpoint
+    judges = _resolve_judges(db, judge_model_ids, judge_model_id)
+    _check_aggregation(judge_aggregation)
 
     compatible_prompts = (
         db.query(models.Prompt)
@@ -410,16 +570,82 @@ async def evaluate_model_with_judge(
         .all()
     )
 
+    _check_sampling_mode(sampling_mode)
     for prompt in compatible_prompts:
         current_revision = crud.get_current_prompt_revision(db, prompt.id)
         if current_revision:
             crud.add_to_queue(
-                db, model.id, current_revision.id, judge_model_name, judge_base_url
+                db, model.id, current_revision.id, sampling_mode=sampling_mode,
+                is_urgent=not use_batch, judge_aggregation=judge_aggregation, **_judge_fields(judges)
             )
 
     return RedirectResponse(url="/models", status_code=303)
 
 
+@router.post("/api/estimate")
+async def estimate_cost(
+    prompt_id: Optional[int] = Form(None),
+    model_ids: List[int] = Form([]),
+    model_id: Optional[int] = Form(None),
+    judge_model_id: Optional[int] = Form(None),
+    judge_model_ids: List[int] = Form([]),
+    judge_aggregation: str = Form("mean"),
+    sampling_mode: str = Form("fixed"),
+    use_batch: bool = Form(False),
+    db: Session = Depends(get_db),
+):
+    """Pre-flight estimate for the enqueue forms, which post the same fields here first.
+
+    A prompt with no model ids fans out to every compatible model, and a model with no prompt
+    to every compatible prompt, matching /api/rerun-prompt-with-judge and /api/evaluate-model-with-judge.
+    """
+    targets = []
+    if prompt_id:
+        prompt = crud.get_prompt(db, prompt_id)
+        revision = crud.get_current_prompt_revision(db, prompt_id)
+        if not prompt or not revision:
+            raise HTTPException(status_code=404, detail="No current revision found for prompt")
+        query = db.query(models.Model)
+        if model_ids:
+            query = query.filter(models.Model.id.in_(model_ids))
+        else:
+            query = query.filter(
+                models.Model.model_type_id == prompt.model_type_id,
+                models.Model.is_active == True,
+            )
+        targets = [(model, revision) for model in query.all()]
+    elif model_id:
+        model = crud.get_model(db, model_id)
+        if not model:
+            raise HTTPException(status_code=404, detail="Model not found")
+        revisions = (
+            db.query(models.PromptRevision)
+            .join(models.Prompt)
+            .filter(
+                models.Prompt.model_type_id == model.model_type_id,
+                models.Prompt.is_active == True,
+                models.PromptRevision.is_current == True,
+            )
+            .all()
+        )
+        targets = [(model, revision) for revision in revisions]
+    else:
+        raise HTTPException(status_code=400, detail="Give a prompt_id or a model_id")
+
+    judges = _resolve_judges(db, judge_model_ids, judge_model_id)
+    return budget.estimate_targets(
+        db, targets, [name for name, _ in judges], _check_sampling_mode(sampling_mode), batch=use_batch
+    )
+
+
+@router.post("/api/regressions/{regression_id}/dismiss")
+async def dismiss_regression(regression_id: int, db: Session = Depends(get_db)):
+    regression = crud.dismiss_regression(db, regression_id)
+    if not regression:
+        raise HTTPException(status_code=404, detail="Regression not found")
+    return regressions.describe(regression)
+
+
 @router.get("/health")
 async def health():
     return {"status": "healthy"}
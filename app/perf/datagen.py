@@ -0,0 +1,187 @@
+"""Fill the database with synthetic prompts, models, suites and runs at production-like volumes.
+
+Rows are written with Core bulk inserts and explicit ids, so a million runs take a minute or
+two on SQLite instead of hours through the ORM. Every generated name starts with
+SYNTHETIC_PREFIX so the data is easy to spot (and delete) afterwards.
+"""
+import logging
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, select
+
+from database import models
+from database.content import encode_text
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_PREFIX = "synthetic-"
+TOPICS = ["billing", "refunds", "onboarding", "security", "shipping", "pricing", "outages", "privacy",
+          "accessibility", "migrations", "reporting", "integrations", "permissions", "search", "exports"]
+WORDS = ["the", "model", "should", "explain", "why", "a", "customer", "request", "is", "handled", "carefully",
+         "with", "clear", "steps", "and", "examples", "including", "edge", "cases", "errors", "limits"]
+
+
+class _IdAllocator:
+    """Hand out primary keys above the current maximum so FKs can be filled in before insert"""
+
+    def __init__(self, conn, table):
+        self.next_id = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+    def take(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def _flush(conn, table, rows: List[Dict]) -> None:
+    if rows:
+        conn.execute(table.insert(), rows)
+        rows.clear()
+
+
+def generate(engine, n_models: int = 200, n_prompts: int = 2000, revisions_per_prompt: int = 3,
+             models_per_revision: int = 40, runs_per_suite: int = 5, distinct_responses: int = 2000,
+             days: int = 180, chunk_size: int = 10000, seed: int = 0) -> Dict[str, int]:
+    """Insert synthetic data and return row counts per table.
+
+    Every revision is benchmarked on a random sample of models_per_revision models, so the run count
+    is n_prompts * revisions_per_prompt * models_per_revision * runs_per_suite (2.4M by default).
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+    counts = dict.fromkeys(["models", "prompts", "prompt_revisions", "benchmark_suites", "benchmark_runs",
+                            "run_queue", "contents"], 0)
+    tables = {name: models.Base.metadata.tables[name] for name in counts}
+    began = time.perf_counter()
+
+    with engine.begin() as conn:
+        model_type_id = conn.execute(
+            select(models.ModelType.id).where(models.ModelType.name == "text")
+        ).scalar()
+        if model_type_id is None:
+            model_type_id = conn.execute(
+                models.ModelType.__table__.insert().values(name="text", description="Text-based language models")
+            ).inserted_primary_key[0]
+
+        # A shared pool of response and reasoning texts, like real runs that repeat themselves
+        response_hashes, reasoning_hashes, content_rows = [], [], []
+        existing = set(conn.execute(select(models.Content.hash)).scalars())
+        for i in range(distinct_responses):
+            for pool, n_words in ((response_hashes, rng.randint(60, 400)), (reasoning_hashes, rng.randint(15, 60))):
+                content_hash, codec, size, data = encode_text(f"{i}. " + _sentence(rng, n_words))
+                pool.append(content_hash)
+                if content_hash not in existing:
+                    existing.add(content_hash)
+                    content_rows.append({"hash": content_hash, "codec": codec, "size_bytes": size,
+                                         "data": data, "created_at": start})
+        counts["contents"] = len(content_rows)
+        _flush(conn, tables["contents"], content_rows)
+
+        model_ids = _IdAllocator(conn, tables["models"])
+        model_rows, model_skill, model_price = [], {}, {}
+        for i in range(n_models):
+            model_id = model_ids.take()
+            model_skill[model_id] = rng.uniform(0.35, 0.9)
+            model_price[model_id] = (rng.uniform(0.1, 15) / 1e6, rng.uniform(0.4, 60) / 1e6)
+            model_rows.append({
+                "id": model_id, "name": f"{SYNTHETIC_PREFIX}model-{model_id}", "model_type_id": model_type_id,
+                "api_endpoint": "http://127.0.0.1:8765/v1", "api_key_name": "SYNTHETIC_API_KEY",
+                "created_at": start, "is_active": True,
+            })
+        counts["models"] = len(model_rows)
+        _flush(conn, tables["models"], model_rows)
+
+        prompt_ids = _IdAllocator(conn, tables["prompts"])
+        revision_ids = _IdAllocator(conn, tables["prompt_revisions"])
+        suite_ids = _IdAllocator(conn, tables["benchmark_suites"])
+        run_ids = _IdAllocator(conn, tables["benchmark_runs"])
+        queue_ids = _IdAllocator(conn, tables["run_queue"])
+
+    all_models = list(model_skill)
+    models_per_revision = min(models_per_revision, len(all_models))
+    rows = {name: [] for name in ("prompts", "prompt_revisions", "benchmark_suites", "benchmark_runs", "run_queue")}
+
+    for p in range(n_prompts):
+        prompt_id = prompt_ids.take()
+        created = start + timedelta(seconds=rng.uniform(0, days * 86400 * 0.5))
+        difficulty = rng.uniform(-0.25, 0.15)
+        topic = rng.choice(TOPICS)
+        rows["prompts"].append({
+            "id": prompt_id, "name": f"{SYNTHETIC_PREFIX}{topic}-{prompt_id}", "model_type_id": model_type_id,
+            "created_at": created, "is_active": True,
+        })
+
+        for version in range(1, revisions_per_prompt + 1):
+            revision_id = revision_ids.take()
+            revised = created + timedelta(days=(version - 1) * days / (2 * revisions_per_prompt))
+            rows["prompt_revisions"].append({
+                "id": revision_id, "prompt_id": prompt_id, "version_number": version,
+                "content": f"[{topic}] " + _sentence(rng, rng.randint(20, 120)),
+                "rubric_prompt": "Score 1.0 for a complete, correct answer. " + _sentence(rng, 20),
+                "created_at": revised, "created_by": "synthetic",
+                "is_current": version == revisions_per_prompt, "needs_rerun": False,
+            })
+
+            for model_id in rng.sample(all_models, models_per_revision):
+                suite_id = suite_ids.take()
+                suite_created = revised + timedelta(seconds=rng.uniform(0, 86400))
+                input_price, output_price = model_price[model_id]
+                mean_score = min(max(model_skill[model_id] + difficulty, 0.0), 1.0)
+                scores, costs, inputs, outputs, times = [], [], [], [], []
+                for run_index in range(runs_per_suite):
+                    score = round(min(max(rng.gauss(mean_score, 0.12), 0.0), 1.0), 3)
+                    input_tokens = rng.randint(80, 900)
+                    output_tokens = rng.randint(50, 1200)
+                    cost = input_tokens * input_price + output_tokens * output_price
+                    run_time_ms = int(output_tokens * rng.uniform(8, 40) + rng.uniform(200, 1500))
+                    scores.append(score)
+                    costs.append(cost)
+                    inputs.append(input_tokens)
+                    outputs.append(output_tokens)
+                    times.append(run_time_ms)
+                    rows["benchmark_runs"].append({
+                        "id": run_ids.take(), "prompt_revision_id": revision_id, "model_id": model_id,
+                        "suite_id": suite_id, "run_index": run_index,
+                        "response_hash": rng.choice(response_hashes), "score": score,
+                        "judge_model": "synthetic-judge", "judge_base_url": "http://127.0.0.1:8765/v1",
+                        "judge_reasoning_hash": rng.choice(reasoning_hashes),
+                        "input_tokens": input_tokens, "output_tokens": output_tokens, "cost_usd": cost,
+                        "run_time_ms": run_time_ms,
+                        "created_at": suite_created + timedelta(milliseconds=sum(times)),
+                    })
+
+                completed = suite_created + timedelta(milliseconds=max(times))
+                rows["benchmark_suites"].append({
+                    "id": suite_id, "prompt_revision_id": revision_id, "model_id": model_id,
+                    "run_count": runs_per_suite, "status": "completed",
+                    "created_at": suite_created, "completed_at": completed,
+                    "max_score": max(scores), "avg_score": statistics.mean(scores), "min_score": min(scores),
+                    "std_dev_score": statistics.stdev(scores) if len(scores) > 1 else 0.0,
+                    "total_cost_usd": sum(costs), "avg_input_tokens": statistics.mean(inputs),
+                    "avg_output_tokens": statistics.mean(outputs), "avg_run_time_ms": statistics.mean(times),
+                })
+                rows["run_queue"].append({
+                    "id": queue_ids.take(), "model_id": model_id, "prompt_revision_id": revision_id,
+                    "judge_model": "synthetic-judge", "judge_base_url": "http://127.0.0.1:8765/v1",
+                    "status": "completed", "created_at": suite_created, "started_at": suite_created,
+                    "completed_at": completed,
+                })
+
+        if len(rows["benchmark_runs"]) >= chunk_size or p == n_prompts - 1:
+            # Parents first, one transaction per chunk
+            with engine.begin() as conn:
+                for name, chunk in rows.items():
+                    counts[name] += len(chunk)
+                    _flush(conn, tables[name], chunk)
+            logger.info(f"{p + 1}/{n_prompts} prompts, {counts['benchmark_runs']} runs "
+                        f"({time.perf_counter() - began:.0f}s)")
+
+    return counts
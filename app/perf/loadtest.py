@@ -0,0 +1,124 @@
+"""Concurrent load test of the pages and JSON endpoints, reporting latency percentiles and SQL query counts.
+
+Query counts come from the X-DB-Queries header set by metrics.QueryStatsMiddleware, so a page
+whose count grows with the size of the database (an N+1 query) stands out even when it is
+still fast on a small dataset.
+"""
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import func
+
+from database import models
+from perf.selfbench import percentile
+
+DEFAULT_TARGETS = [
+    "/",
+    "/results",
+    "/prompts/{prompt_id}",
+    "/models/{model_id}",
+    "/api/chart-data",
+    "/api/suite-runs/{suite_id}",
+]
+
+
+def sample_ids(db, k: int = 50, seed: int = 0) -> Dict[str, List[int]]:
+    """Ids of existing prompts, models and completed suites to fill in the target paths"""
+    rng = random.Random(seed)
+
+    def pick(query) -> List[int]:
+        ids = [row[0] for row in query.order_by(func.random()).limit(k * 4).all()]
+        return rng.sample(ids, min(k, len(ids)))
+
+    return {
+        "prompt_id": pick(db.query(models.Prompt.id).filter(models.Prompt.is_active == True)),
+        "model_id": pick(db.query(models.Model.id).filter(models.Model.is_active == True)),
+        "suite_id": pick(db.query(models.BenchmarkSuite.id).filter(models.BenchmarkSuite.status == "completed")),
+    }
+
+
+def _fill(target: str, ids: Dict[str, List[int]], rng: random.Random) -> Optional[str]:
+    values = {}
+    for name, candidates in ids.items():
+        if "{" + name + "}" in target:
+            if not candidates:
+                return None
+            values[name] = rng.choice(candidates)
+    return target.format(**values)
+
+
+async def run_loadtest(client: httpx.AsyncClient, ids: Dict[str, List[int]], targets: List[str] = None,
+                       requests_per_target: int = 50, concurrency: int = 10, seed: int = 0) -> Dict[str, Any]:
+    targets = targets or DEFAULT_TARGETS
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = {target: [] for target in targets}
+
+    async def hit(target: str, path: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                status = response.status_code
+                queries = int(response.headers.get("x-db-queries", 0))
+            except httpx.HTTPError:
+                status, queries = None, 0
+            samples[target].append(((time.perf_counter() - start) * 1000, status, queries))
+
+    jobs = []
+    for target in targets:
+        for _ in range(requests_per_target):
+            path = _fill(target, ids, rng)
+            if path is not None:
+                jobs.append(hit(target, path))
+    rng.shuffle(jobs)
+
+    start = time.perf_counter()
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - start
+
+    report = {}
+    for target, results in samples.items():
+        if not results:
+            report[target] = {"count": 0, "skipped": "no ids to fill in"}
+            continue
+        latencies = [latency for latency, _, _ in results]
+        queries = [count for _, _, count in results]
+        report[target] = {
+            "count": len(results),
+            "errors": sum(1 for _, status, _ in results if status is None or status >= 400),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "queries_avg": round(statistics.mean(queries), 1),
+            "queries_max": max(queries),
+        }
+    report["total"] = {
+        "requests": sum(len(results) for results in samples.values()),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(sum(len(r) for r in samples.values()) / elapsed, 1) if elapsed else 0.0,
+    }
+    return report
+
+
+def over_query_budget(report: Dict[str, Any], max_queries: int) -> List[str]:
+    """Targets whose worst request ran more SQL statements than the budget"""
+    return [
+        target for target, stats in report.items()
+        if target != "total" and stats.get("queries_max", 0) > max_queries
+    ]
+
+
+async def loadtest(base_url: Optional[str], ids: Dict[str, List[int]], **kwargs) -> Dict[str, Any]:
+    """Load test a running server at base_url, or the app in-process when base_url is None"""
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=60)
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+    async with client:
+        return await run_loadtest(client, ids, **kwargs)
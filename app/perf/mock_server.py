@@ -0,0 +1,352 @@
+"""Local stand-in for an OpenAI-compatible chat completions API.
+
+Latency, token rate, error rate and response length are configurable so the benchmark
+pipeline can be measured without network access. Judge prompts (asking for a JSON score)
+get a JSON verdict back, as a tool call when the request offers tools. Other requests with
+tools call every tool for the first agent_tool_turns turns of the conversation, using the
+parameters' examples as arguments; everything else gets filler text. Structured-output support
+and a share of malformed verdicts can be toggled to exercise the judge's protocol fallback and
+repair path. Long prompts (1024+ tokens) whose prefix was already answered for the same model
+report it as cached_tokens, like a provider prompt cache. The files and batches endpoints
+complete a whole batch after a configurable delay.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+JUDGE_MARKER = "Format your response as JSON"
+FILLER_WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+
+class MockConfig:
+    def __init__(self, latency_ms: float = 50.0, tokens_per_second: float = 500.0,
+                 error_rate: float = 0.0, output_tokens: int = 200, seed: int = None,
+                 batch_delay_s: float = 1.0, malformed_judge_rate: float = 0.0,
+                 supports_response_format: bool = True, supports_tools: bool = True,
+                 agent_tool_turns: int = 1, prompt_cache: bool = True):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        self.batch_delay_s = batch_delay_s
+        self.malformed_judge_rate = malformed_judge_rate
+        self.supports_response_format = supports_response_format
+        self.supports_tools = supports_tools
+        self.agent_tool_turns = agent_tool_turns
+        # Like providers, report prompt prefixes of at least PROMPT_CACHE_MIN_TOKENS seen in an earlier
+        # response for the same model as cached_tokens
+        self.prompt_cache = prompt_cache
+        self.cached_prefixes = set()
+        self.random = random.Random(seed)
+
+
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def count_tokens(text: str) -> int:
+    # Roughly four characters per token, like most BPE tokenizers on English text
+    return max(1, len(text) // 4)
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+
+def _completion_text(config: MockConfig, prompt: str, max_tokens: int) -> str:
+    if JUDGE_MARKER in prompt:
+        score = round(config.random.random(), 2)
+        if config.random.random() < config.malformed_judge_rate:
+            return f"The response deserves roughly {score} out of 1, but I forgot the format."
+        return json.dumps({"score": score, "reasoning": f"Mock judge verdict of {score}."})
+    n_tokens = min(config.output_tokens, max_tokens)
+    return " ".join(config.random.choice(FILLER_WORDS) for _ in range(n_tokens))
+
+
+def _tool_arguments(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Plausible arguments for a function's JSON Schema parameters: examples first, then type defaults"""
+    defaults = {"string": "lorem", "integer": 1, "number": 1.0, "boolean": True, "array": [], "object": {}}
+    arguments = {}
+    for name, schema in (parameters or {}).get("properties", {}).items():
+        examples = schema.get("examples")
+        arguments[name] = examples[0] if examples else defaults.get(schema.get("type"), "lorem")
+    return arguments
+
+
+def _agent_tool_calls(config: MockConfig, body: Dict[str, Any]):
+    """Tool calls for an agent turn, or None once the conversation has had agent_tool_turns of them"""
+    turns = sum(1 for message in body.get("messages", [])
+                if message.get("role") == "assistant" and message.get("tool_calls"))
+    if turns >= config.agent_tool_turns:
+        return None
+    return [{
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": tool["function"]["name"],
+                     "arguments": json.dumps(_tool_arguments(tool["function"].get("parameters")))},
+    } for tool in body["tools"]]
+
+
+def _cache_key(config: MockConfig, body: Dict[str, Any]):
+    prompt = _message_text(body.get("messages", []))
+    if not config.prompt_cache or count_tokens(prompt) < PROMPT_CACHE_MIN_TOKENS:
+        return None
+    return body.get("model"), prompt[:PROMPT_CACHE_MIN_TOKENS * 4]
+
+
+def _completion(config: MockConfig, body: Dict[str, Any]) -> Dict[str, Any]:
+    prompt = _message_text(body.get("messages", []))
+    text = _completion_text(config, prompt, body.get("max_tokens") or config.output_tokens)
+    prompt_tokens = count_tokens(prompt)
+    completion_tokens = count_tokens(text)
+    message = {"role": "assistant", "content": text}
+    finish_reason = "stop"
+    if body.get("tools") and JUDGE_MARKER in prompt:
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": body["tools"][0]["function"]["name"], "arguments": text},
+        }]}
+        finish_reason = "tool_calls"
+    elif body.get("tools"):
+        tool_calls = _agent_tool_calls(config, body)
+        if tool_calls:
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            completion_tokens = count_tokens("".join(call["function"]["arguments"] for call in tool_calls))
+            finish_reason = "tool_calls"
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    cache_key = _cache_key(config, body)
+    if cache_key is not None:
+        # Cache hits cover the prompt in 128-token blocks
+        cached = prompt_tokens // 128 * 128 if cache_key in config.cached_prefixes else 0
+        usage["prompt_tokens_details"] = {"cached_tokens": cached}
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": finish_reason,
+        }],
+        "usage": usage,
+    }
+
+
+ERROR_BODY = {"error": {"message": "Mock upstream error", "type": "server_error"}}
+
+
+def _unsupported(config: MockConfig, body: Dict[str, Any]):
+    """Name of a request option this mock is configured to reject, like a provider without structured output"""
+    if body.get("response_format") and not config.supports_response_format:
+        return "response_format"
+    if body.get("tools") and not config.supports_tools:
+        return "tools"
+    return None
+
+
+def create_mock_app(config: MockConfig = None) -> FastAPI:
+    config = config or MockConfig()
+    app = FastAPI(title="Mock OpenAI-compatible API")
+    app.state.config = config
+    app.state.request_count = 0
+    app.state.files: Dict[str, Dict[str, Any]] = {}
+    app.state.batches: Dict[str, Dict[str, Any]] = {}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.request_count += 1
+
+        if config.random.random() < config.error_rate:
+            await asyncio.sleep(config.latency_ms / 1000)
+            return JSONResponse(status_code=500, content=ERROR_BODY)
+
+        unsupported = _unsupported(config, body)
+        if unsupported:
+            return JSONResponse(status_code=400, content={"error": {
+                "message": f"'{unsupported}' is not supported by this model",
+                "type": "invalid_request_error", "param": unsupported,
+            }})
+
+        completion = _completion(config, body)
+        text = completion["choices"][0]["message"]["content"]
+        generation_seconds = completion["usage"]["completion_tokens"] / config.tokens_per_second
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream(config, text, completion["id"], completion["created"], completion["model"],
+                        generation_seconds, completion["usage"]),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(config.latency_ms / 1000 + generation_seconds)
+        cache_key = _cache_key(config, body)
+        if cache_key is not None:
+            config.cached_prefixes.add(cache_key)
+        return completion
+
+    def store_file(content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_object = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        app.state.files[file_object["id"]] = {**file_object, "content": content}
+        return file_object
+
+    def public(file_object: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in file_object.items() if k != "content"}
+
+    @app.post("/v1/files")
+    async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+        return store_file(await file.read(), file.filename, purpose)
+
+    @app.get("/v1/files/{file_id}")
+    async def get_file(file_id: str):
+        if file_id not in app.state.files:
+            return JSONResponse(status_code=404, content={"error": {"message": "No such file"}})
+        return public(app.state.files[file_id])
+
+    @app.get("/v1/files/{file_id}/content")
+    async def get_file_content(file_id: str):
+        if file_id not in app.state.files:
+            return JSONResponse(status_code=404, content={"error": {"message": "No such file"}})
+        return Response(app.state.files[file_id]["content"], media_type="application/octet-stream")
+
+    async def run_batch(batch: Dict[str, Any]):
+        """Complete every request of a batch after config.batch_delay_s, like a provider's offline queue"""
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        await asyncio.sleep(config.batch_delay_s)
+
+        lines = app.state.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        output, errors = [], []
+        for line in filter(None, lines):
+            request = json.loads(line)
+            app.state.request_count += 1
+            result = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+            if config.random.random() < config.error_rate:
+                result.update(response={"status_code": 500, "request_id": uuid.uuid4().hex, "body": ERROR_BODY},
+                              error=None)
+                errors.append(result)
+            else:
+                result.update(response={"status_code": 200, "request_id": uuid.uuid4().hex,
+                                        "body": _completion(config, request["body"])}, error=None)
+                output.append(result)
+
+        def jsonl(rows):
+            return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+        batch["output_file_id"] = store_file(jsonl(output), f"{batch['id']}_output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = store_file(jsonl(errors), f"{batch['id']}_error.jsonl", "batch_output")["id"]
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in app.state.files:
+            return JSONResponse(status_code=400, content={"error": {"message": "Unknown input_file_id"}})
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": body.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        app.state.batches[batch["id"]] = batch
+        asyncio.create_task(run_batch(batch))
+        return batch
+
+    @app.get("/v1/batches/{batch_id}")
+    async def get_batch(batch_id: str):
+        if batch_id not in app.state.batches:
+            return JSONResponse(status_code=404, content={"error": {"message": "No such batch"}})
+        return app.state.batches[batch_id]
+
+    return app
+
+
+async def _stream(config: MockConfig, text: str, completion_id: str, created: int, model: str,
+                  generation_seconds: float, usage: Dict[str, int]):
+    await asyncio.sleep(config.latency_ms / 1000)
+    words = text.split(" ")
+    delay = generation_seconds / max(len(words), 1)
+
+    def chunk(delta: Dict[str, Any], finish_reason=None, include_usage=False) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if include_usage:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    for i, word in enumerate(words):
+        await asyncio.sleep(delay)
+        yield chunk({"content": word if i == 0 else " " + word})
+    yield chunk({}, finish_reason="stop", include_usage=True)
+    yield "data: [DONE]\n\n"
+
+
+class MockServer:
+    """Run the mock API with uvicorn in a background thread"""
+
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 8765):
+        import uvicorn
+
+        self.app = create_mock_app(config)
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self._server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Mock server did not start")
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+        return False
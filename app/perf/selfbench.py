@@ -0,0 +1,175 @@
+"""Self-benchmark: drive the generation, judging and queue paths against the local mock API.
+
+Everything runs in-process against a throwaway SQLite database, so results are reproducible
+and need no network access or API keys.
+"""
+import asyncio
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine
+
+from database.database import SessionLocal
+from database import models, crud, migrations
+from perf.mock_server import MockConfig, MockServer
+import metrics
+
+API_KEY_ENV = "SELFBENCH_API_KEY"
+PROMPT_TEMPLATE = "Question {index}: explain the trade-offs of approach {index} in a few paragraphs."
+RUBRIC = "Score 1.0 for a complete, correct answer and 0.0 otherwise."
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency_summary(latencies_ms: List[float], elapsed_s: float) -> Dict[str, float]:
+    return {
+        "count": len(latencies_ms),
+        "per_second": round(len(latencies_ms) / elapsed_s, 2) if elapsed_s else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 1),
+        "p99_ms": round(percentile(latencies_ms, 99), 1),
+        "elapsed_s": round(elapsed_s, 3),
+    }
+
+
+async def bench_runner(base_url: str, requests: int) -> Dict[str, Any]:
+    from benchmark.runner import BenchmarkRunner
+
+    runner = BenchmarkRunner()
+    model_config = {"api_endpoint": base_url, "api_key_name": API_KEY_ENV}
+    benchmark_data = [(PROMPT_TEMPLATE.format(index=i), "mock-model", model_config) for i in range(requests)]
+
+    start = time.perf_counter()
+    results = await runner.run_benchmarks_batch(benchmark_data)
+    elapsed = time.perf_counter() - start
+
+    summary = latency_summary([r[4] for r in results], elapsed)
+    summary["errors"] = sum(1 for r in results if r[0].startswith("Error:"))
+    return summary
+
+
+async def bench_judge(base_url: str, requests: int) -> Dict[str, Any]:
+    from benchmark.evaluator import LLMJudgeEvaluator
+
+    judge = LLMJudgeEvaluator("mock-judge", base_url)
+    evaluation_data = [("A response " * 50, PROMPT_TEMPLATE.format(index=i), RUBRIC) for i in range(requests)]
+
+    start = time.perf_counter()
+    results = await judge.evaluate_responses_batch(evaluation_data)
+    elapsed = time.perf_counter() - start
+
+    # The judge does not report per-call latency, so only throughput is meaningful here
+    return {
+        "count": len(results),
+        "per_second": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "unparsed": sum(1 for result in results if result.score is None),
+    }
+
+
+async def bench_queue(base_url: str, n_models: int, n_prompts: int, use_judge: bool = True) -> Dict[str, Any]:
+    """Run the full queue path (suite creation, generation, judging, aggregation) on a temporary database"""
+    import main
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'selfbench.db')}", connect_args={"check_same_thread": False})
+        metrics.instrument_database(engine)
+        previous_bind = SessionLocal.kw.get("bind")
+        SessionLocal.configure(bind=engine)
+        try:
+            migrations.migrate(engine)
+            db = SessionLocal()
+            try:
+                text_type = next(t for t in crud.get_model_types(db) if t.name == "text")
+                model_ids = [
+                    crud.create_model(db, f"mock-model-{i}", text_type.id, base_url, API_KEY_ENV).id
+                    for i in range(n_models)
+                ]
+                revision_ids = []
+                for i in range(n_prompts):
+                    prompt = crud.create_prompt(db, f"prompt-{i}", text_type.id, PROMPT_TEMPLATE.format(index=i), RUBRIC)
+                    revision_ids.append(crud.get_current_prompt_revision(db, prompt.id).id)
+                crud.add_to_queue_batch(db, [
+                    {
+                        "model_id": model_id,
+                        "prompt_revision_id": revision_id,
+                        "judge_model": "mock-judge" if use_judge else None,
+                        "judge_base_url": base_url if use_judge else None,
+                    }
+                    for model_id in model_ids for revision_id in revision_ids
+                ])
+
+                db_sum_before, _ = metrics.db_query_seconds.totals()
+                commit_sum_before, _ = metrics.db_commit_seconds.totals()
+                start = time.perf_counter()
+                while await main.process_pending_batch(db):
+                    pass
+                elapsed = time.perf_counter() - start
+                db_sum_after, _ = metrics.db_query_seconds.totals()
+                commit_sum_after, _ = metrics.db_commit_seconds.totals()
+
+                suites = db.query(models.BenchmarkSuite).all()
+                suite_latencies = [s.trace_summary["total_ms"] for s in suites if s.trace_summary]
+                summary = latency_summary(suite_latencies, elapsed)
+                summary["items_per_second"] = summary.pop("per_second")
+                summary["failed"] = len(crud.get_queue_items(db, "failed"))
+                summary["db_query_s"] = round(db_sum_after - db_sum_before, 3)
+                summary["db_commit_s"] = round(commit_sum_after - commit_sum_before, 3)
+                return summary
+            finally:
+                db.close()
+        finally:
+            SessionLocal.configure(bind=previous_bind)
+            engine.dispose()
+
+
+def run_selfbench(config: MockConfig = None, requests: int = 100, n_models: int = 4, n_prompts: int = 5,
+                  use_judge: bool = True, port: int = 8765) -> Dict[str, Any]:
+    config = config or MockConfig()
+    os.environ.setdefault(API_KEY_ENV, "selfbench")
+    tracemalloc.start()
+
+    async def run_all(base_url: str) -> Dict[str, Any]:
+        # One event loop for every stage, so pooled HTTP clients are closed on the loop that opened them
+        return {
+            "runner": await bench_runner(base_url, requests),
+            "judge": await bench_judge(base_url, requests),
+            "queue": await bench_queue(base_url, n_models, n_prompts, use_judge),
+        }
+
+    with MockServer(config, port=port) as server:
+        report = {
+            "config": {
+                "latency_ms": config.latency_ms,
+                "tokens_per_second": config.tokens_per_second,
+                "error_rate": config.error_rate,
+                "output_tokens": config.output_tokens,
+            },
+            **asyncio.run(run_all(server.base_url)),
+        }
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report["memory"] = {
+        "python_peak_mb": round(peak / 1e6, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = []
+    for section, values in report.items():
+        lines.append(f"[{section}]")
+        lines.extend(f"  {key}: {value}" for key, value in values.items())
+    return "\n".join(lines)
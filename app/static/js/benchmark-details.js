@@ -2,6 +2,40 @@
  * Shared component for rendering benchmark run details
  */
 
+const REFERENCE_METRIC_LABELS = {bleu: 'BLEU', rouge_l: 'ROUGE-L', chrf: 'chrF', tfidf: 'TF-IDF', bm25: 'BM25'};
+
+function renderReferenceScores(scores) {
+    if (!scores) {
+        return '';
+    }
+    const values = Object.entries(REFERENCE_METRIC_LABELS)
+        .filter(([key]) => scores[key] !== undefined)
+        .map(([key, label]) => `${label} ${(scores[key] * 100).toFixed(1)}%`);
+    return `<li><strong>vs Reference:</strong> ${values.join(' · ')}</li>`;
+}
+
+function renderAgentSteps(metadata) {
+    const episode = metadata && metadata.agent;
+    if (!episode) {
+        return '';
+    }
+    const rows = episode.steps.map(step => `
+        <tr>
+            <td>${step.step}</td>
+            <td>${step.latency_ms}ms</td>
+            <td>${step.input_tokens} / ${step.output_tokens}</td>
+            <td>${(step.tool_calls || []).map(call => `${call.name} (${call.ms}ms${call.outcome !== 'ok' ? ', ' + call.outcome : ''})`).join(', ') || '—'}</td>
+        </tr>`).join('');
+    return `
+        <div class="col-12 mb-3">
+            <h6>Agent Episode (${episode.stop_reason}, ${episode.tool_calls} tool calls, ${episode.model_time_ms}ms model / ${episode.tool_time_ms}ms tools):</h6>
+            <table class="table table-sm">
+                <thead><tr><th>Step</th><th>Latency</th><th>Tokens in / out</th><th>Tool calls</th></tr></thead>
+                <tbody>${rows}</tbody>
+            </table>
+        </div>`;
+}
+
 function renderBenchmarkRunDetails(data) {
     return `
         <div class="row">
@@ -17,6 +51,7 @@ function renderBenchmarkRunDetails(data) {
                 <h6>Response:</h6>
                 <pre class="bg-light p-3 border rounded">${data.response_text}</pre>
             </div>
+            ${renderAgentSteps(data.run_metadata)}
             ${data.judge_reasoning ? `
             <div class="col-12 mb-3">
                 <h6>Judge Output:</h6>
@@ -29,7 +64,8 @@ function renderBenchmarkRunDetails(data) {
                     <div class="col-md-6">
                         <ul class="list-unstyled">
                             <li><strong>Score:</strong> ${data.score !== null && data.score !== undefined ? data.score.toFixed(3) : 'N/A'}</li>
-                            <li><strong>Input Tokens:</strong> ${data.input_tokens}</li>
+                            ${renderReferenceScores(data.reference_scores)}
+                            <li><strong>Input Tokens:</strong> ${data.input_tokens}${data.cached_input_tokens ? ` (${data.cached_input_tokens} cached)` : ''}</li>
                             <li><strong>Output Tokens:</strong> ${data.output_tokens}</li>
                             <li><strong>Total Tokens:</strong> ${data.input_tokens + data.output_tokens}</li>
                         </ul>
@@ -37,7 +73,7 @@ function renderBenchmarkRunDetails(data) {
                     <div class="col-md-6">
                         <ul class="list-unstyled">
                             <li><strong>Cost:</strong> $${data.cost_usd.toFixed(4)}</li>
-                            <li><strong>Runtime:</strong> ${data.run_time_ms}ms</li>
+                            <li><strong>Runtime:</strong> ${data.run_time_ms !== null ? data.run_time_ms + 'ms' : 'n/a (batch)'}</li>
                             <li><strong>Date:</strong> ${new Date(data.created_at).toLocaleString()}</li>
                             ${data.judge_model ? `<li><strong>Judge Model:</strong> ${data.judge_model}</li>` : ''}
                         </ul>
@@ -62,6 +98,30 @@ function showBenchmarkRunDetails(runId, modalId = 'detailsModal', contentId = 'd
         });
 }
 
+function renderTraceWaterfall(trace) {
+    if (!trace || !trace.spans || !trace.spans.length) {
+        return '';
+    }
+
+    const total = trace.total_ms || 1;
+    let html = `<h6 class="mt-4">Timing (${(total / 1000).toFixed(2)}s)</h6><div class="small">`;
+    trace.spans.forEach(span => {
+        const left = (span.offset_ms / total) * 100;
+        const width = Math.max((span.duration_ms / total) * 100, 0.5);
+        const color = span.error ? '#dc2626' : '#3b82f6';
+        html += `
+            <div style="display: flex; align-items: center; margin-bottom: 2px;">
+                <div style="width: 35%; padding-left: ${span.depth * 12}px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">${span.name}</div>
+                <div style="width: 50%; position: relative; height: 10px;">
+                    <div style="position: absolute; left: ${left}%; width: ${width}%; height: 100%; background: ${color}; border-radius: 2px;"></div>
+                </div>
+                <div style="width: 15%; text-align: right;">${span.duration_ms.toFixed(0)}ms</div>
+            </div>
+        `;
+    });
+    return html + '</div>';
+}
+
 function renderBenchmarkSuiteDetails(suiteData) {
     const suite = suiteData.suite;
     const runs = suiteData.runs;
@@ -102,7 +162,14 @@ function renderBenchmarkSuiteDetails(suiteData) {
                                 <li><strong>Max Score:</strong> ${suite.max_score !== null && suite.max_score !== undefined ? (suite.max_score * 100).toFixed(1) + '%' : 'N/A'}</li>
                                 <li><strong>Avg Score:</strong> ${suite.avg_score !== null && suite.avg_score !== undefined ? (suite.avg_score * 100).toFixed(1) + '%' : 'N/A'}</li>
                                 <li><strong>Min Score:</strong> ${suite.min_score !== null && suite.min_score !== undefined ? (suite.min_score * 100).toFixed(1) + '%' : 'N/A'}</li>
+                                <li><strong>95% CI:</strong> ${suite.ci_low !== null && suite.ci_low !== undefined ? (suite.ci_low * 100).toFixed(1) + '% – ' + (suite.ci_high * 100).toFixed(1) + '%' : 'N/A'}</li>
                                 <li><strong>Total Cost:</strong> $${suite.total_cost_usd ? suite.total_cost_usd.toFixed(4) : 'N/A'}</li>
+                                <li><strong>Judge Cost:</strong> $${suite.judge_cost_usd ? suite.judge_cost_usd.toFixed(4) : 'N/A'}</li>
+                                ${suite.avg_cached_input_tokens ? `<li><strong>Avg Cached Input Tokens:</strong> ${suite.avg_cached_input_tokens.toFixed(0)}</li>` : ''}
+                                ${suite.judge_agreement !== null && suite.judge_agreement !== undefined ? `<li><strong>Judge Agreement:</strong> ${(suite.judge_agreement * 100).toFixed(1)}%</li>` : ''}
+                                ${suite.response_similarity !== null && suite.response_similarity !== undefined ? `<li><strong>Response Similarity:</strong> ${(suite.response_similarity * 100).toFixed(1)}%</li>` : ''}
+                                ${suite.duplicate_rate !== null && suite.duplicate_rate !== undefined ? `<li><strong>Duplicate Rate:</strong> ${(suite.duplicate_rate * 100).toFixed(1)}%</li>` : ''}
+                                ${suite.std_dev_output_tokens !== null && suite.std_dev_output_tokens !== undefined ? `<li><strong>Output Tokens Std Dev:</strong> ${suite.std_dev_output_tokens.toFixed(1)}</li>` : ''}
                             </ul>
                         </div>
                     </div>
@@ -117,6 +184,7 @@ function renderBenchmarkSuiteDetails(suiteData) {
     
     contentHtml += `
                     </div>
+                    ${renderTraceWaterfall(suite.trace_summary)}
                 </div>
             </div>
     `;
@@ -140,11 +208,13 @@ function renderBenchmarkSuiteDetails(suiteData) {
                             <h6>Metrics:</h6>
                             <ul class="list-unstyled">
                                 <li><strong>Score:</strong> ${run.score !== null && run.score !== undefined ? (run.score * 100).toFixed(1) + '%' : 'N/A'}</li>
-                                <li><strong>Input Tokens:</strong> ${run.input_tokens}</li>
+                                ${renderReferenceScores(run.reference_scores)}
+                                ${(run.judge_scores || []).length > 1 ? run.judge_scores.map(judge => `<li class="ms-3">${judge.judge_model}: ${judge.score !== null ? (judge.score * 100).toFixed(1) + '%' : 'N/A'}</li>`).join('') : ''}
+                                <li><strong>Input Tokens:</strong> ${run.input_tokens}${run.cached_input_tokens ? ` (${run.cached_input_tokens} cached)` : ''}</li>
                                 <li><strong>Output Tokens:</strong> ${run.output_tokens}</li>
                                 <li><strong>Total Tokens:</strong> ${run.input_tokens + run.output_tokens}</li>
                                 <li><strong>Cost:</strong> $${run.cost_usd.toFixed(4)}</li>
-                                <li><strong>Runtime:</strong> ${run.run_time_ms}ms</li>
+                                <li><strong>Runtime:</strong> ${run.run_time_ms !== null ? run.run_time_ms + 'ms' : 'n/a (batch)'}</li>
                             </ul>
                         </div>
                     </div>
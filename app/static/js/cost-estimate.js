@@ -0,0 +1,49 @@
+/**
+ * Pre-flight cost estimate for forms marked with data-estimate: the form fields are posted to
+ * /api/estimate first and the user confirms the estimated spend before anything is queued.
+ */
+
+function formatUsd(value) {
+    return '$' + Number(value || 0).toFixed(value >= 1 ? 2 : 4);
+}
+
+function describeEstimate(estimate) {
+    const lines = [
+        `${estimate.suites} suites (${estimate.runs} runs)`,
+        `Estimated cost: ${formatUsd(estimate.total_usd)}` +
+            (estimate.judge_usd ? ` (generation ${formatUsd(estimate.generation_usd)}, judge ${formatUsd(estimate.judge_usd)})` : ''),
+        `Spent today: ${formatUsd(estimate.spent_today_usd)}` +
+            (estimate.daily_budget_usd !== null ? ` of ${formatUsd(estimate.daily_budget_usd)} daily budget` : ''),
+    ];
+    if (estimate.unpriced_models.length) {
+        lines.push(`No price for ${estimate.unpriced_models.join(', ')}: counted as $0.`);
+    }
+    if (estimate.exceeds_daily_budget) {
+        lines.push('', 'This exceeds the daily budget: items over it will be paused until tomorrow.');
+    }
+    return lines.join('\n') + '\n\nQueue these runs?';
+}
+
+document.addEventListener('submit', async event => {
+    const form = event.target;
+    if (!form.matches('form[data-estimate]') || form.dataset.confirmed) {
+        return;
+    }
+    event.preventDefault();
+
+    try {
+        const response = await fetch('/api/estimate', { method: 'POST', body: new FormData(form) });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        if (!confirm(describeEstimate(await response.json()))) {
+            return;
+        }
+    } catch (error) {
+        // Never block queueing on the estimate itself
+        console.error('Cost estimate failed:', error);
+    }
+
+    form.dataset.confirmed = 'true';
+    form.submit();
+});
@@ -0,0 +1,58 @@
+/**
+ * Live worker updates over Server-Sent Events (/api/events)
+ */
+
+function subscribeToBenchmarkEvents(handlers) {
+    if (!window.EventSource) {
+        return null;
+    }
+
+    const source = new EventSource('/api/events');
+    Object.entries(handlers).forEach(([eventType, handler]) => {
+        source.addEventListener(eventType, event => handler(JSON.parse(event.data)));
+    });
+    return source;
+}
+
+function queueStatusClass(status) {
+    if (status === 'completed') return 'bg-green-600';
+    if (status === 'running') return 'bg-yellow-600';
+    if (status === 'failed') return 'bg-red-600';
+    if (status === 'paused') return 'bg-orange-600';
+    if (status === 'batched') return 'bg-blue-600';
+    return 'bg-gray-600';
+}
+
+function formatQueueDate(isoString) {
+    if (!isoString) return '';
+    const date = new Date(isoString);
+    const pad = value => String(value).padStart(2, '0');
+    return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())} ${pad(date.getHours())}:${pad(date.getMinutes())}`;
+}
+
+function upsertQueueRow(tableBody, item, maxRows = 10) {
+    let row = tableBody.querySelector(`tr[data-queue-id="${item.id}"]`);
+    if (!row) {
+        row = document.createElement('tr');
+        row.className = 'border-b border-dark-border';
+        row.dataset.queueId = item.id;
+        row.innerHTML = `
+            <td class="py-2 text-dark-text"></td>
+            <td class="py-2 text-dark-text"></td>
+            <td class="py-2"><span class="px-2 py-1 rounded text-xs text-white"></span></td>
+            <td class="py-2 text-dark-text"></td>
+        `;
+        row.children[0].textContent = item.model_name;
+        row.children[1].textContent = item.prompt_name + (item.job_type === 'rejudge' ? ' (re-judge)' : '');
+        row.children[3].textContent = formatQueueDate(item.created_at);
+        tableBody.appendChild(row);
+        while (tableBody.children.length > maxRows) {
+            tableBody.removeChild(tableBody.firstElementChild);
+        }
+    }
+
+    const badge = row.querySelector('span');
+    badge.className = `px-2 py-1 rounded text-xs text-white ${queueStatusClass(item.status)}`;
+    badge.textContent = item.status;
+    badge.title = item.status_reason || '';
+}
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# database.database creates its engine on import, so point it at a scratch file first
+_db_dir = tempfile.mkdtemp(prefix="llm-bench-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A migrated SQLite database of its own for each test"""
+    from sqlalchemy import create_engine
+    from database import migrations
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'bench.db'}", connect_args={"check_same_thread": False})
+    migrations.migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    from sqlalchemy.orm import Session
+
+    session = Session(bind=engine)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def process_running():
+    """Whether a pid is alive (Linux); killed children nobody has reaped yet are zombies"""
+    def running(pid: int) -> bool:
+        time.sleep(0.2)
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+        except FileNotFoundError:
+            return False
+    return running
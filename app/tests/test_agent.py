@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from benchmark import agent, code_execution
+
+
+def call(tools, name, arguments):
+    return asyncio.run(tools.call(name, json.dumps(arguments)))
+
+
+def test_calculator_and_lookup():
+    tools = agent.build([{"type": "calculator"},
+                         {"type": "lookup", "name": "weather", "parameter": "city", "data": {"Paris": "Sunny"}}])
+    assert call(tools, "calculator", {"expression": "2 * (3 + 4) ** 2"})["output"] == "98"
+    assert call(tools, "calculator", {"expression": "1 / 0"}) | {"ms": 0} == {
+        "name": "calculator", "ms": 0, "outcome": "error", "output": "Error: Division by zero"}
+    assert call(tools, "weather", {"city": " PARIS "})["output"] == "Sunny"
+    assert call(tools, "search", {})["outcome"] == "error"
+
+
+def test_calculator_bounds_results_before_computing():
+    tools = agent.build([{"type": "calculator"}])
+    assert call(tools, "calculator", {"expression": "2 ** 1000 // 2 ** 999"})["output"] == "2"
+    for expression in ("(((9**99)**99)**99)**99", "2**4000 * 2**4000", "10.0 ** 400"):
+        started = time.perf_counter()
+        assert call(tools, "calculator", {"expression": expression})["output"] == "Error: Result too large"
+        assert time.perf_counter() - started < 1
+
+
+def test_invalid_configs():
+    for config in ([], {"type": "nope"}, [{"type": "calculator"}, {"type": "calculator"}]):
+        with pytest.raises(ValueError):
+            agent.parse_config(config)
+
+
+def test_python_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(code_execution, "CODE_EXECUTION", False)
+    with pytest.raises(ValueError, match="CODE_EXECUTION"):
+        agent.parse_config([{"type": "python"}])
+    result = call(agent.build([{"type": "python"}]), "python", {"code": "print(1)"})
+    assert result["output"] == "Error: " + code_execution.DISABLED_MESSAGE
+
+
+@pytest.mark.skipif(code_execution.resource is None, reason="needs a POSIX system")
+def test_python(monkeypatch):
+    monkeypatch.setattr(code_execution, "CODE_EXECUTION", True)
+    tools = agent.build(agent.parse_config('[{"type": "python"}]'))
+    assert call(tools, "python", {"code": "print(sum(range(10)))"})["output"] == "45\n"
+    failed = call(tools, "python", {"code": "print('partial'); 1 / 0"})
+    assert failed["outcome"] == "error"
+    assert failed["output"] == "Error: partial\nZeroDivisionError: division by zero"
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_python_timeout_kills_background_processes(monkeypatch, tmp_path, process_running):
+    monkeypatch.setattr(code_execution, "CODE_EXECUTION", True)
+    marker = tmp_path / "sleep.pid"
+    code = (
+        "import subprocess, time\n"
+        f"open({str(marker)!r}, 'w').write(str(subprocess.Popen(['sleep', '45']).pid))\n"
+        "time.sleep(45)\n"
+    )
+    start = time.monotonic()
+    with pytest.raises(agent.ToolError, match="Timed out after 2s"):
+        agent.Python(timeout=2).call({"code": code})
+    assert time.monotonic() - start < 10
+    assert not process_running(int(marker.read_text()))
@@ -0,0 +1,74 @@
+import json
+
+from benchmark import batch
+from benchmark.runner import BenchmarkRunner
+from database import models
+from events import broker
+
+
+def _line(item_id, run_index, content):
+    return {
+        "custom_id": f"q{item_id}-r{run_index}",
+        "response": {"status_code": 200, "body": {
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+        }},
+    }
+
+
+def test_ingest_saves_and_publishes_every_run(db):
+    model = models.Model(name="gpt-4o-mini")
+    prompt = models.Prompt(name="p")
+    db.add_all([model, prompt])
+    db.flush()
+    revision = models.PromptRevision(prompt_id=prompt.id, content="Say hi", version_number=1)
+    provider_batch = models.ProviderBatch(provider_batch_id="batch_1", status="completed")
+    db.add_all([revision, provider_batch])
+    db.flush()
+    item = models.RunQueue(model_id=model.id, prompt_revision_id=revision.id, status="submitted",
+                           sampling_mode="fixed", provider_batch_id=provider_batch.id)
+    db.add(item)
+    db.commit()
+
+    # A refusal can come back with no content; run 5 is missing from the output file
+    lines = [_line(item.id, 1, "hi"), _line(item.id, 2, None), _line(item.id, 3, "hello"), _line(item.id, 4, "hey")]
+    events = broker.subscribe()
+    try:
+        ready = batch._ingest(db, BenchmarkRunner(), provider_batch, lines)
+    finally:
+        broker.unsubscribe(events)
+
+    (ready_item, suite), = ready
+    assert ready_item.status == "running"
+    assert suite.run_count == 5
+    published = [json.loads(events.get_nowait().split("data: ", 1)[1]) for _ in range(events.qsize())]
+    assert [event["run_index"] for event in published] == [1, 2, 3, 4, 5]
+    assert [event["failed"] for event in published] == [False, False, False, False, True]
+
+
+def test_recover_resumes_items_left_running(db):
+    model = models.Model(name="gpt-4o-mini")
+    prompt = models.Prompt(name="p")
+    db.add_all([model, prompt])
+    db.flush()
+    revision = models.PromptRevision(prompt_id=prompt.id, content="Say hi", version_number=1)
+    provider_batch = models.ProviderBatch(provider_batch_id="batch_1", status="completed")
+    db.add_all([revision, provider_batch])
+    db.flush()
+    ingested, lost = [
+        models.RunQueue(model_id=model.id, prompt_revision_id=revision.id, status="batched", is_urgent=False,
+                        sampling_mode="fixed", provider_batch_id=provider_batch.id)
+        for _ in range(2)
+    ]
+    db.add_all([ingested, lost])
+    db.commit()
+    lines = [_line(ingested.id, run_index, "hi") for run_index in range(1, 6)]
+    (_, suite), _ = batch._ingest(db, BenchmarkRunner(), provider_batch, lines)
+    db.commit()
+    # The other item's suite never made it to the database
+    db.delete(db.query(models.BenchmarkSuite).filter(models.BenchmarkSuite.id != suite.id).one())
+    db.commit()
+
+    assert batch.recover(db) == [(ingested, suite)]
+    assert ingested.status == "running"
+    assert (lost.status, lost.is_urgent) == ("pending", True)
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+from benchmark import batch, budget
+from database import models
+
+
+class FakeBatchRunner:
+    """Accepts every upload and batch without a provider"""
+
+    def get_client(self, config):
+        async def create_file(**kwargs):
+            return SimpleNamespace(id="file_1")
+
+        async def create_batch(**kwargs):
+            return SimpleNamespace(id="batch_1", status="validating")
+
+        return SimpleNamespace(files=SimpleNamespace(create=create_file),
+                               batches=SimpleNamespace(create=create_batch))
+
+
+def _item(db, model, revision):
+    item = models.RunQueue(model_id=model.id, prompt_revision_id=revision.id, status="pending",
+                           sampling_mode="fixed", is_urgent=False)
+    db.add(item)
+    db.commit()
+    return item
+
+
+def test_batched_items_count_against_the_model_cap(db):
+    model = models.Model(name="gpt-4o-mini")
+    prompt = models.Prompt(name="p")
+    db.add_all([model, prompt])
+    db.flush()
+    revision = models.PromptRevision(prompt_id=prompt.id, content="Say hi", version_number=1)
+    db.add(revision)
+    db.flush()
+    first = _item(db, model, revision)
+    cost = budget.item_cost(budget.Estimator(db), first)
+    # Room for one suite, not two
+    model.daily_budget_usd = cost * 1.5
+    db.commit()
+
+    asyncio.run(batch.submit_pending(db, FakeBatchRunner()))
+    assert first.status == "batched"
+    spent, per_model = budget.spent_today(db)
+    assert spent == per_model[model.id] == cost
+
+    second = _item(db, model, revision)
+    admitted, over_budget = budget.admit(db, [second], 1)
+    assert (admitted, over_budget) == ([], [second])
+    assert "gpt-4o-mini reached" in second.status_reason
+
+
+def test_running_item_is_not_counted_twice(db):
+    model = models.Model(name="gpt-4o-mini")
+    prompt = models.Prompt(name="p")
+    db.add_all([model, prompt])
+    db.flush()
+    revision = models.PromptRevision(prompt_id=prompt.id, content="Say hi", version_number=1)
+    db.add(revision)
+    db.flush()
+    item = _item(db, model, revision)
+    cost = budget.item_cost(budget.Estimator(db), item)
+    item.status = "running"
+    # The suite has recorded part of the item's cost so far
+    db.add(models.BenchmarkSuite(model_id=model.id, prompt_revision_id=revision.id, status="running",
+                                 total_cost_usd=cost / 4))
+    db.commit()
+
+    spent, _ = budget.spent_today(db)
+    assert abs(spent - cost) < 1e-12
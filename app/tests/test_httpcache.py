@@ -0,0 +1,126 @@
+import gzip
+
+import pytest
+from sqlalchemy.orm import Session
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import httpcache
+from database import models
+
+PAGE = "<html>" + "benchmark results " * 200 + "</html>"
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def client(engine, calls):
+    httpcache.track_writes(engine)
+
+    async def page(request):
+        calls.append(request.url.path)
+        return HTMLResponse(PAGE)
+
+    async def small(request):
+        return JSONResponse({"ok": True})
+
+    async def export(request):
+        async def rows():
+            for i in range(50):
+                yield f"{i},{'x' * 100}\n"
+        return StreamingResponse(rows(), media_type="text/csv")
+
+    async def events(request):
+        return StreamingResponse(iter(["data: x\n\n" * 200]), media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/", page), Route("/small", small), Route("/export", export),
+                            Route("/api/events", events)])
+    app.add_middleware(httpcache.CompressionMiddleware)
+    app.add_middleware(httpcache.ConditionalGetMiddleware, engine=engine)
+    return TestClient(app)
+
+
+def test_etag_matches():
+    assert httpcache._etag_matches('W/"1-a"', 'W/"1-a"')
+    assert httpcache._etag_matches('"1-a", "2-a"', 'W/"2-a"')
+    assert httpcache._etag_matches("*", 'W/"1-a"')
+    assert not httpcache._etag_matches('W/"1-a"', 'W/"2-a"')
+
+
+def test_not_modified_until_the_data_changes(client, engine, calls):
+    first = client.get("/")
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "no-cache"
+    assert first.headers["vary"] == "Accept-Encoding"
+    etag = first.headers["etag"]
+
+    cached = client.get("/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag
+    # Answered before the route ran
+    assert calls == ["/"]
+
+    since = client.get("/", headers={"If-Modified-Since": first.headers["last-modified"]})
+    assert since.status_code == 304
+
+    with Session(bind=engine) as db:
+        db.add(models.ModelType(name="audio"))
+        db.commit()
+    changed = client.get("/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert calls == ["/", "/"]
+
+
+def test_reads_do_not_change_the_etag(client, engine):
+    etag = client.get("/").headers["etag"]
+    with Session(bind=engine) as db:
+        db.query(models.ModelType).all()
+        db.commit()
+    assert client.get("/").headers["etag"] == etag
+
+
+def test_event_stream_is_not_cached_or_compressed(client):
+    response = client.get("/api/events", headers={"Accept-Encoding": "gzip"})
+    assert "etag" not in response.headers
+    assert "content-encoding" not in response.headers
+
+
+def test_gzip(client, monkeypatch):
+    monkeypatch.setattr(httpcache, "brotli", None)
+    response = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(PAGE) / 5
+    assert response.text == PAGE
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_brotli_when_installed(client):
+    pytest.importorskip("brotli")
+    response = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == PAGE
+
+
+def test_small_and_unaccepted_responses_are_not_compressed(client):
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_streamed_bodies_are_compressed_per_chunk(client, monkeypatch):
+    monkeypatch.setattr(httpcache, "brotli", None)
+    with client.stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw).decode() == "".join(f"{i},{'x' * 100}\n" for i in range(50))
+
+
+def test_static_url_is_versioned_by_content():
+    url = httpcache.static_url("favicon.png")
+    assert url.startswith("/static/favicon.png?v=") and len(url.split("v=")[1]) == 12
+    assert httpcache.static_url("missing.css") == "/static/missing.css"
@@ -0,0 +1,58 @@
+import asyncio
+import io
+import time
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from benchmark import images
+
+
+def test_save_rejects_files_pillow_cannot_open(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "ATTACHMENT_DIR", str(tmp_path))
+    with pytest.raises(ValueError, match="not a readable image"):
+        images.save(b"<svg onload=alert(1)>", "cat.png")
+
+    png = io.BytesIO()
+    Image.new("RGB", (3, 2)).save(png, format="PNG")
+    stored = images.save(png.getvalue(), "cat.jpg")
+    assert (stored.content_type, stored.width, stored.height) == ("image/png", 3, 2)
+
+
+def _slow_encode(monkeypatch, fail=False):
+    def encode(path, max_side):
+        time.sleep(0.2)
+        if fail:
+            raise OSError("truncated")
+        return images.EncodedImage(f"data:{path}", 10, 1, 1)
+
+    monkeypatch.setattr(images, "_encode", encode)
+    return SimpleNamespace(sha256=f"test-{fail}-{time.monotonic()}", path="a.png")
+
+
+def test_waiters_take_over_a_cancelled_encode(monkeypatch):
+    attachment = _slow_encode(monkeypatch)
+
+    async def main():
+        leader = asyncio.create_task(images.encode(attachment))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(images.encode(attachment)) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.wait_for(asyncio.gather(*waiters), 5)
+
+    results = asyncio.run(main())
+    assert [encoded.data_url for encoded, _ in results] == ["data:a.png"] * 2
+    assert not images._inflight
+
+
+def test_waiters_see_the_leaders_error(monkeypatch):
+    attachment = _slow_encode(monkeypatch, fail=True)
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(
+            images.encode(attachment), images.encode(attachment), return_exceptions=True), 5)
+
+    assert [str(result) for result in asyncio.run(main())] == ["truncated"] * 2
+    assert not images._inflight
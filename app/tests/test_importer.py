@@ -0,0 +1,43 @@
+import pytest
+
+from database import crud, models
+from database.importer import ImportFormatError, import_entries, parse_entries
+
+
+def _current(db, name):
+    return (db.query(models.PromptRevision).join(models.Prompt)
+            .filter(models.Prompt.name == name, models.PromptRevision.is_current == True).one())
+
+
+def test_partial_reimport_keeps_omitted_prompt_fields(db):
+    import_entries(db, parse_entries(
+        '{"prompts": [{"name": "p", "content": "Q?", "rubric": "1 if right", "reference": "A."}]}', "x.json"))
+
+    summary = import_entries(db, parse_entries('{"prompts": [{"name": "p", "content": "Q?"}]}', "x.json"))
+    assert summary == {"prompts_unchanged": 1}
+
+    summary = import_entries(db, parse_entries('{"prompts": [{"name": "p", "content": "Q2?"}]}', "x.json"))
+    assert summary == {"prompts_revised": 1}
+    revision = _current(db, "p")
+    assert (revision.version_number, revision.content) == (2, "Q2?")
+    assert (revision.rubric_prompt, revision.reference_answer) == ("1 if right", "A.")
+
+    # An explicit null still clears a field
+    import_entries(db, parse_entries('{"prompts": [{"name": "p", "content": "Q2?", "reference": null}]}', "x.json"))
+    assert _current(db, "p").reference_answer is None
+    assert _current(db, "p").rubric_prompt == "1 if right"
+
+
+def test_partial_reimport_keeps_omitted_model_fields(db):
+    import_entries(db, parse_entries(
+        '{"models": [{"name": "m", "api_endpoint": "http://x/v1", "daily_budget_usd": 3}]}', "x.json"))
+    import_entries(db, parse_entries('{"models": [{"name": "m", "api_key_name": "KEY"}]}', "x.json"))
+    model = db.query(models.Model).filter(models.Model.name == "m").one()
+    assert (model.api_endpoint, model.api_key_name, model.daily_budget_usd) == ("http://x/v1", "KEY", 3)
+
+
+def test_malformed_input():
+    with pytest.raises(ImportFormatError):
+        parse_entries("models: [unclosed", "x.yaml")
+    with pytest.raises(ImportFormatError):
+        parse_entries('{"a": 1}\n{broken', "x.jsonl")
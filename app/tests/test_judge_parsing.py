@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from benchmark import evaluator
+from benchmark.evaluator import LLMJudgeEvaluator, extract_verdict
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"score": 0.8, "reasoning": "Good"}', (0.8, "Good")),
+    ('Here you go:\n```json\n{"score": 1, "reasoning": "Perfect"}\n```', (1.0, "Perfect")),
+    ('I think {"score": 0.25, "reasoning": "Weak"} is fair.', (0.25, "Weak")),
+    ('{"score": 7, "reasoning": "Out of range"}', (1.0, "Out of range")),
+    ('{"score": -1}', (0.0, "No reasoning provided")),
+])
+def test_extract_verdict(text, expected):
+    assert extract_verdict(text) == expected
+
+
+def test_extract_verdict_falls_back_to_score_pair():
+    # Truncated JSON still carries the score
+    text = '{"score": 0.6, "reasoning": "The answer is mostly'
+    assert extract_verdict(text) == (0.6, text)
+    assert extract_verdict("Score = 0.4") is None
+    assert extract_verdict("score: .4")[0] == 0.4
+
+
+def test_extract_verdict_without_score():
+    assert extract_verdict("") is None
+    assert extract_verdict(None) is None
+    assert extract_verdict('{"reasoning": "no score"}') is None
+    assert extract_verdict("The response is fine.") is None
+
+
+class FakeCompletions:
+    """Replies with the given messages in turn and records each request"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.replies.pop(0), tool_calls=None))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10),
+        )
+
+
+def _judge(monkeypatch, replies):
+    monkeypatch.setattr(evaluator, "JUDGE_PROTOCOL", "text")
+    completions = FakeCompletions(replies)
+    judge = LLMJudgeEvaluator("judge", "http://127.0.0.1:1/v1")
+    monkeypatch.setattr(judge, "get_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return judge, completions
+
+
+def test_unparseable_reply_is_repaired_once(monkeypatch):
+    judge, completions = _judge(monkeypatch, ["It deserves a high mark.", '{"score": 0.9, "reasoning": "Fixed"}'])
+    result = asyncio.run(judge.evaluate_response("Hi", "Say hi", "1 if it greets"))
+
+    assert (result.score, result.reasoning, result.parse_outcome) == (0.9, "Fixed", "repaired")
+    assert (result.input_tokens, result.output_tokens) == (200, 20)
+    repair_messages = completions.requests[1]["messages"]
+    assert repair_messages[-2] == {"role": "assistant", "content": "It deserves a high mark."}
+    assert repair_messages[-1]["content"] == evaluator.REPAIR_PROMPT
+
+
+def test_failed_repair_leaves_score_empty(monkeypatch):
+    judge, completions = _judge(monkeypatch, ["No idea.", "Still no idea."])
+    result = asyncio.run(judge.evaluate_response("Hi", "Say hi", "1 if it greets"))
+
+    assert result.score is None
+    assert result.parse_outcome == "failed"
+    assert len(completions.requests) == 2
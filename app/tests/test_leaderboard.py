@@ -0,0 +1,77 @@
+from typing import List, NamedTuple
+
+import pytest
+
+from benchmark import leaderboard
+from benchmark.leaderboard import BT_PRIOR_WINS, bradley_terry
+
+np = pytest.importorskip("numpy")
+
+
+def test_two_models():
+    wins = np.array([[0.0, 3.0], [1.0, 0.0]])
+    games = np.array([[0.0, 4.0], [4.0, 0.0]])
+    strength = bradley_terry(wins, games)
+    # With the virtual tie: 3.5 wins out of 5, so p / (p + q) = 0.7
+    assert strength[0] - strength[1] == pytest.approx(np.log(3.5 / 1.5), abs=1e-5)
+    assert strength.sum() == pytest.approx(0.0, abs=1e-9)
+
+
+def test_maximum_likelihood_condition():
+    wins = np.array([[0, 4, 6], [2, 0, 3], [1, 5, 0]], dtype=float)
+    games = wins + wins.T
+    strength = np.exp(bradley_terry(wins, games))
+    # At the optimum each model's expected wins equal its (prior-adjusted) wins
+    adjusted_wins = wins + BT_PRIOR_WINS * (games > 0)
+    adjusted_games = games + 2 * BT_PRIOR_WINS * (games > 0)
+    expected = (adjusted_games * strength[:, None] / (strength[:, None] + strength[None, :])).sum(axis=1)
+    assert expected == pytest.approx(adjusted_wins.sum(axis=1), rel=1e-4)
+
+
+def test_undefeated_model_is_finite_and_loner_is_nan():
+    wins = np.array([[0, 5, 0], [0, 0, 0], [0, 0, 0]], dtype=float)
+    games = np.array([[0, 5, 0], [5, 0, 0], [0, 0, 0]], dtype=float)
+    strength = bradley_terry(wins, games)
+    assert np.isfinite(strength[:2]).all() and strength[0] > strength[1]
+    assert np.isnan(strength[2])
+
+
+def test_replicates_are_fitted_independently():
+    rng = np.random.default_rng(1)
+    games = rng.integers(1, 10, size=(5, 4, 4)).astype(float)
+    games = games + games.transpose(0, 2, 1)
+    games[:, np.arange(4), np.arange(4)] = 0
+    wins = np.floor(games * rng.random((5, 4, 4)))
+    wins = np.triu(wins, 1) + np.tril(games - wins.transpose(0, 2, 1), -1)
+    batched = bradley_terry(wins, games)
+    for replicate in range(5):
+        assert batched[replicate] == pytest.approx(bradley_terry(wins[replicate], games[replicate]), abs=1e-5)
+
+
+class Row(NamedTuple):
+    model_id: int
+    model_name: str
+    prompt_revision_id: int
+    scores: List[float]
+
+
+def test_compute():
+    rows = [
+        Row(1, "strong", 10, [0.9, 0.8]), Row(1, "strong", 11, [0.7]), Row(1, "strong", 12, [0.9]),
+        Row(2, "weak", 10, [0.2, 0.4]), Row(2, "weak", 11, [0.7]), Row(2, "weak", 12, [0.1]),
+        Row(3, "alone", 13, [0.5]),
+    ]
+    board = leaderboard.compute(rows, samples=200)
+    by_name = {entry["model_name"]: entry for entry in board["models"]}
+    assert [entry["model_name"] for entry in board["models"]] == ["strong", "weak", "alone"]
+    assert by_name["strong"]["mean_score"] == pytest.approx((0.85 + 0.7 + 0.9) / 3)
+    assert by_name["strong"]["rating"] + by_name["weak"]["rating"] == pytest.approx(2 * leaderboard.ELO_BASE)
+    assert by_name["alone"]["rating"] is None
+    for entry in by_name.values():
+        assert entry["ci_low"] <= entry["mean_score"] <= entry["ci_high"]
+
+    pairwise = board["pairwise"]
+    # Two wins and a tie out of three shared prompts
+    assert pairwise["win_rates"][0][1] == pytest.approx(2.5 / 3)
+    assert pairwise["shared_prompts"][0] == [0, 3, 0]
+    assert leaderboard.compute(rows, samples=200) == board
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from benchmark import code_execution, local_evaluators, reference_metrics
+from benchmark.local_evaluators import LocalResult, build, parse_config
+
+
+def score(config, responses, reference=None):
+    return asyncio.run(build(config, reference).evaluate_batch(responses))
+
+
+def test_exact():
+    results = score({"type": "exact", "expected": ["Paris", "paris"]}, [" Paris\n", "Paris, France"])
+    assert [result.score for result in results] == [1.0, 0.0]
+
+
+def test_normalized():
+    config = {"type": "normalized", "expected": "São Paulo"}
+    assert [r.score for r in score(config, ["sao paulo!", "It is São Paulo."])] == [1.0, 0.0]
+    config["contains"] = True
+    assert [r.score for r in score(config, ["It is São Paulo.", "sao paulonia"])] == [1.0, 0.0]
+
+
+def test_regex():
+    results = score({"type": "regex", "pattern": r"\bparis\b", "flags": "i"}, ["In PARIS.", "Parisian"])
+    assert [r.score for r in results] == [1.0, 0.0]
+    assert score({"type": "regex", "pattern": r"\d+", "fullmatch": True}, ["42", "42 apples"])[1].score == 0.0
+    with pytest.raises(ValueError):
+        build({"type": "regex", "pattern": "x", "flags": "q"})
+
+
+def test_numeric():
+    config = {"type": "numeric", "expected": 1234.5, "tolerance": 0.1}
+    results = score(config, ["About 1,234.5", "First 1234.5 then 99", "none"])
+    assert results == [LocalResult(1.0), LocalResult(0.0, "numeric: Got 99, expected 1234.5 ± 0.1"),
+                       LocalResult(0.0, "numeric: No number in response")]
+    assert score({"type": "numeric", "expected": 100, "rel_tolerance": 0.05}, ["104"])[0].score == 1.0
+
+
+def test_json_schema():
+    schema = {"type": "object", "required": ["name"], "properties": {"age": {"type": "integer"}}}
+    results = score({"type": "json_schema", "schema": schema},
+                    ['```json\n{"name": "Ada", "age": 36}\n```', '{"age": "old"}', "no json"])
+    assert [r.score for r in results] == [1.0, 0.0, 0.0]
+
+
+def test_schema_fallback_without_jsonschema(monkeypatch):
+    monkeypatch.setattr(local_evaluators, "jsonschema", None)
+    schema = {"type": "object", "required": ["name"], "additionalProperties": False,
+              "properties": {"name": {"type": "string"}}}
+    results = score({"type": "json_schema", "schema": schema}, ['{"name": "Ada"}', '{"name": "Ada", "x": 1}'])
+    assert results == [LocalResult(1.0), LocalResult(0.0, "json_schema: $: unexpected 'x'")]
+
+
+@pytest.mark.skipif(not reference_metrics.available(), reason="needs numpy")
+def test_reference():
+    config = {"type": "reference", "metric": "rouge_l", "threshold": 0.5}
+    results = score(config, ["The capital of France is Paris.", "Bananas are yellow."],
+                    reference="The capital of France is Paris.")
+    assert [r.score for r in results] == [1.0, 0.0]
+    assert score(config, ["x"])[0].score is None
+
+
+def test_checks_are_averaged_and_errors_score_zero():
+    config = [{"type": "exact", "expected": "4"}, {"type": "numeric", "expected": 4}]
+    results = score(config, ["4.0", "4", "Error: timeout"])
+    assert [r.score for r in results] == [0.5, 1.0, 0.0]
+
+
+def test_invalid_configs():
+    for config in ([], {"type": "nope"}, {"expected": "x"}, {"type": "exact", "wrong": 1}):
+        with pytest.raises(ValueError):
+            parse_config(config)
+
+
+CODE = '```python\ndef add(a, b):\n    return a + b\n```'
+
+
+def test_code_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(code_execution, "CODE_EXECUTION", False)
+    config = {"type": "code", "tests": "assert add(1, 2) == 3"}
+    with pytest.raises(ValueError, match="CODE_EXECUTION"):
+        parse_config(config)
+    assert score(config, [CODE]) == [LocalResult(None, "code: " + code_execution.DISABLED_MESSAGE)]
+
+
+@pytest.mark.skipif(code_execution.resource is None, reason="needs a POSIX system")
+def test_code(monkeypatch):
+    monkeypatch.setattr(code_execution, "CODE_EXECUTION", True)
+    config = {"type": "code", "tests": "assert add(1, 2) == 3"}
+    assert parse_config(config) == config
+    results = score(config, [CODE, CODE.replace("a + b", "a - b")])
+    assert results[0] == LocalResult(1.0)
+    assert results[1].score == 0.0 and "AssertionError" in results[1].detail
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_code_timeout_kills_background_processes(monkeypatch, tmp_path, process_running):
+    monkeypatch.setattr(code_execution, "CODE_EXECUTION", True)
+    marker = tmp_path / "child.pid"
+    code = (
+        "import subprocess, time\n"
+        "child = subprocess.Popen(['sleep', '30'])\n"
+        f"open({str(marker)!r}, 'w').write(str(child.pid))\n"
+        "time.sleep(30)\n"
+    )
+    start = time.monotonic()
+    result, = asyncio.run(local_evaluators.CodeTests("pass", timeout=1).evaluate_batch([code]))
+    assert result == LocalResult(0.0, "Timed out after 1s")
+    assert time.monotonic() - start < 10
+    assert not process_running(int(marker.read_text()))
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from database import migrations, models
+from database.database import Base
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    """A database as it was before versioning: no schema_version, derived tables or newer columns"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table in ("data_version", "leaderboard_cells", "result_points", "regressions"):
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        conn.execute(text("ALTER TABLE benchmark_runs DROP COLUMN cached_input_tokens"))
+        conn.execute(text("ALTER TABLE benchmark_runs DROP COLUMN reference_scores"))
+        conn.execute(text("ALTER TABLE benchmark_suites DROP COLUMN ci_low"))
+        conn.execute(text("INSERT INTO models (id, name, is_active) VALUES (1, 'gpt-4o', 1)"))
+        conn.execute(text("INSERT INTO prompts (id, name, is_active) VALUES (1, 'p', 1)"))
+        conn.execute(text("INSERT INTO prompt_revisions (id, prompt_id, content, version_number, is_current) "
+                          "VALUES (1, 1, 'Say hi', 1, 1)"))
+        conn.execute(text("INSERT INTO benchmark_suites (id, prompt_revision_id, model_id, status, run_count) "
+                          "VALUES (1, 1, 1, 'completed', 2)"))
+        conn.execute(text("INSERT INTO benchmark_runs (prompt_revision_id, model_id, suite_id, run_index, score, "
+                          "input_tokens, output_tokens, cost_usd, run_time_ms) "
+                          "VALUES (1, 1, 1, 1, 0.8, 10, 5, 0.001, 900), (1, 1, 1, 2, 0.6, 10, 5, 0.001, 1100)"))
+    yield engine
+    engine.dispose()
+
+
+def test_migrates_a_database_from_before_versioning(old_engine):
+    with old_engine.connect() as conn:
+        assert migrations.current_version(conn) == 0
+    with pytest.raises(migrations.SchemaOutOfDate):
+        migrations.check(old_engine)
+
+    applied = migrations.migrate(old_engine)
+    assert [migration.version for migration in applied] == list(range(1, migrations.LATEST + 1))
+    assert migrations.check(old_engine) == migrations.LATEST
+
+    inspector = inspect(old_engine)
+    assert {"cached_input_tokens", "reference_scores"} <= {c["name"] for c in inspector.get_columns("benchmark_runs")}
+    assert "ci_low" in {c["name"] for c in inspector.get_columns("benchmark_suites")}
+    with old_engine.connect() as conn:
+        assert {row.name for row in conn.execute(text("SELECT name FROM model_types"))} == {"text", "vision", "agent"}
+        # The completed suite is on the leaderboard and in the regression series
+        assert conn.execute(text("SELECT scores FROM leaderboard_cells")).scalar() is not None
+        assert conn.execute(text("SELECT score_n FROM result_points")).scalar() == 2
+        assert conn.execute(text("SELECT version FROM data_version")).scalar() >= 1
+        # Existing data is kept
+        assert conn.execute(text("SELECT count(*) FROM benchmark_runs")).scalar() == 2
+
+
+def test_migrate_is_idempotent(engine):
+    assert migrations.migrate(engine) == []
+    assert migrations.check(engine) == migrations.LATEST
+
+
+def test_newer_schema_only_warns(engine, caplog):
+    with engine.begin() as conn:
+        conn.execute(migrations.schema_version.update().values(version=migrations.LATEST + 1))
+    assert migrations.check(engine) == migrations.LATEST + 1
+    assert "newer than this code" in caplog.text
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from benchmark.pricing import PricingTable
+from database import crud, models
+
+ENTRIES = [
+    {"model": "gpt-4o", "input": 5.0, "output": 15.0, "cached_input": 2.5, "effective_from": "2024-05-13"},
+    {"model": "gpt-4o", "input": 2.5, "output": 10.0, "cached_input": 1.25, "effective_from": "2024-10-01"},
+    {"model": "gpt-4o-mini", "input": 0.15, "output": 0.6},
+    {"model": "claude-3.5-sonnet", "input": 3.0, "output": 15.0, "aliases": ["anthropic/claude-3-5-sonnet"]},
+]
+
+
+@pytest.fixture
+def table():
+    return PricingTable(ENTRIES)
+
+
+def test_exact_and_provider_prefix(table):
+    assert table.price("gpt-4o-mini").input == 0.15
+    assert table.price("openai/gpt-4o-mini").input == 0.15
+    assert table.price("OpenAI/GPT-4o-Mini").input == 0.15
+
+
+def test_longest_prefix_at_name_boundary(table):
+    # A dated snapshot of the mini model must not fall back to gpt-4o
+    assert table.price("gpt-4o-mini-2024-07-18").input == 0.15
+    assert table.price("gpt-4o-2024-08-06").output == 10.0
+    assert table.price("claude-3.5-sonnet:beta").input == 3.0
+    assert table.price("gpt-4oxyz") is None
+
+
+def test_alias(table):
+    assert table.price("anthropic/claude-3-5-sonnet").input == 3.0
+    assert table.price("anthropic/claude-3-5-sonnet-20241022").input == 3.0
+
+
+def test_effective_date(table):
+    assert table.price("gpt-4o", at=datetime(2024, 6, 1)).input == 5.0
+    assert table.price("gpt-4o", at=datetime(2024, 10, 1)).input == 2.5
+    # Before the first known price, the earliest one applies
+    assert table.price("gpt-4o", at=datetime(2023, 1, 1)).input == 5.0
+
+
+def test_cost(table):
+    at = datetime(2024, 11, 1)
+    assert table.cost("gpt-4o", 1_000_000, 1_000_000, at=at) == pytest.approx(12.5)
+    assert table.cost("gpt-4o", 1_000_000, 0, cached_input_tokens=400_000, at=at) == pytest.approx(1.5 + 0.5)
+    assert table.cost("gpt-4o", 1_000_000, 1_000_000, at=at, batch=True) == pytest.approx(6.25)
+    assert table.cost("unknown-model", 1000, 1000) == 0.0
+
+
+def test_recompute_costs_counts_each_run_once(db, table):
+    model = models.Model(name="gpt-4o")
+    db.add(model)
+    db.commit()
+    created = datetime(2024, 11, 1)
+    runs = [
+        models.BenchmarkRun(model_id=model.id, input_tokens=1000, output_tokens=1000, cost_usd=0.0,
+                            judge_model="gpt-4o-mini", created_at=created)
+        for _ in range(2)
+    ]
+    db.add_all(runs)
+    db.commit()
+    # Both the generation and the verdict of the first run are repriced
+    db.add(models.JudgeScore(run_id=runs[0].id, judge_model="gpt-4o-mini", input_tokens=1000, output_tokens=100,
+                             cost_usd=0.0, created_at=created))
+    db.commit()
+
+    assert crud.recompute_costs(db, table) == 2
+    db.refresh(runs[0])
+    assert runs[0].cost_usd == pytest.approx(0.0125)
+    assert runs[0].judge_cost_usd == pytest.approx(0.00021)
+    assert crud.recompute_costs(db, table) == 0
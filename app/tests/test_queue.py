@@ -0,0 +1,33 @@
+from database import crud, models
+
+
+def _model_and_revision(db):
+    model = models.Model(name="gpt-4o-mini")
+    prompt = models.Prompt(name="p")
+    db.add_all([model, prompt])
+    db.flush()
+    revision = models.PromptRevision(prompt_id=prompt.id, content="Say hi", version_number=1)
+    db.add(revision)
+    db.commit()
+    return model, revision
+
+
+def test_pending_rejudge_does_not_block_generation(db):
+    model, revision = _model_and_revision(db)
+    source = crud.create_benchmark_suite(db, revision.id, model.id)
+    crud.add_rejudge_to_queue(db, source, revision.id, judge_model="judge")
+
+    item = crud.add_to_queue(db, model.id, revision.id)
+    assert item.job_type == "generate"
+    added = crud.add_to_queue_batch(db, [{"model_id": model.id, "prompt_revision_id": revision.id}])
+    assert added == []
+
+
+def test_batch_skips_pending_duplicates(db):
+    model, revision = _model_and_revision(db)
+    source = crud.create_benchmark_suite(db, revision.id, model.id)
+    crud.add_rejudge_to_queue(db, source, revision.id, judge_model="judge")
+
+    added = crud.add_to_queue_batch(db, [{"model_id": model.id, "prompt_revision_id": revision.id}])
+    assert [item.job_type for item in added] == ["generate"]
+    assert crud.add_to_queue_batch(db, [{"model_id": model.id, "prompt_revision_id": revision.id}]) == []
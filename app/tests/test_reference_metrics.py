@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from benchmark import reference_metrics
+from benchmark.reference_metrics import METRICS, score_pairs
+
+pytestmark = pytest.mark.skipif(not reference_metrics.available(), reason="needs numpy")
+
+
+def _lcs(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b, 1):
+            previous, row[j] = row[j], previous + 1 if x == y else max(row[j], row[j - 1])
+    return row[-1]
+
+
+def test_identical_and_disjoint():
+    same, recased, disjoint = score_pairs([("the cat sat on the mat", "the cat sat on the mat"),
+                                           ("The cat sat on the mat.", "the cat sat on the mat"),
+                                           ("the cat sat on the mat", "a dog ran")])
+    assert same == {metric: 1.0 for metric in METRICS}
+    # Word metrics ignore case and punctuation; chrF compares characters as written
+    assert recased["chrf"] < 1.0 and recased["rouge_l"] == 1.0
+    assert {metric: disjoint[metric] for metric in ("bleu", "rouge_l", "tfidf", "bm25")} == dict.fromkeys(
+        ("bleu", "rouge_l", "tfidf", "bm25"), 0.0)
+
+
+def test_partial_overlap():
+    scores, = score_pairs([("the cat sat", "the cat sat on the mat")])
+    # All three tokens match, but the response is half as long as the reference
+    assert scores["rouge_l"] == pytest.approx(2 * 1.0 * 0.5 / 1.5, abs=1e-4)
+    assert scores["bleu"] == pytest.approx(0.3679, abs=1e-4)
+    assert all(0.0 < scores[metric] < 1.0 for metric in METRICS)
+
+
+def test_word_order_only_matters_to_sequence_metrics():
+    scores, = score_pairs([("on the mat the cat sat", "the cat sat on the mat")])
+    assert scores["tfidf"] == 1.0 and scores["bm25"] == 1.0
+    assert scores["rouge_l"] == 0.5 and scores["bleu"] < 1.0
+
+
+def test_empty_texts():
+    assert score_pairs([]) == []
+    assert score_pairs([("text", ""), ("text", "   ")]) == [None, None]
+    empty, punctuation = score_pairs([("", "the cat"), ("!!!", "the cat")])
+    assert empty == {metric: 0.0 for metric in METRICS}
+    assert punctuation == {metric: 0.0 for metric in METRICS}
+
+
+def test_batch_matches_pairs_scored_alone():
+    rng = random.Random(7)
+    words = "the a cat dog sat ran on under mat rug quickly".split()
+    references = [" ".join(rng.choices(words, k=rng.randint(3, 12))) for _ in range(3)]
+    pairs = [(" ".join(rng.choices(words, k=rng.randint(0, 15))), rng.choice(references)) for _ in range(40)]
+
+    batch = score_pairs(pairs)
+    for pair, scores in zip(pairs, batch):
+        alone, = score_pairs([pair])
+        # IDF-based metrics depend on the texts scored together; the others must not
+        for metric in ("bleu", "rouge_l", "chrf"):
+            assert scores[metric] == alone[metric]
+        response, reference = (reference_metrics.tokenize(text) for text in pair)
+        lcs = _lcs(response, reference)
+        expected = 2 * lcs / (len(response) + len(reference)) if lcs else 0.0
+        assert scores["rouge_l"] == pytest.approx(expected, abs=1e-4)
+        assert all(0.0 <= value <= 1.0 for value in scores.values())
+
+
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(reference_metrics, "np", None)
+    assert not reference_metrics.available()
+    assert score_pairs([("a", "a")]) == [None]
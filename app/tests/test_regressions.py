@@ -0,0 +1,70 @@
+import statistics
+
+import pytest
+
+from benchmark import regressions
+from benchmark.regressions import Summary, evaluate, pool, summarize, welch_t
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(regressions, "MIN_SCORE_DROP", 0.05)
+    monkeypatch.setattr(regressions, "MIN_LATENCY_INCREASE", 0.25)
+    monkeypatch.setattr(regressions, "MIN_COST_INCREASE", 0.2)
+
+
+def test_summarize():
+    assert summarize([]) == Summary(0, None, None)
+    assert summarize([None, 0.5]) == Summary(1, 0.5, None)
+    assert summarize([0.2, 0.4, 0.9]) == Summary(3, pytest.approx(0.5), pytest.approx(statistics.stdev([0.2, 0.4, 0.9])))
+
+
+def test_pool_matches_the_union_of_samples():
+    samples = [[0.2, 0.4, 0.9], [0.8], [], [0.5, 0.55, 0.6, 0.7]]
+    pooled = pool([summarize(sample) for sample in samples])
+    union = [value for sample in samples for value in sample]
+    assert pooled.n == len(union)
+    assert pooled.mean == pytest.approx(statistics.mean(union))
+    assert pooled.std == pytest.approx(statistics.stdev(union))
+    assert pool([]) == Summary(0, None, None)
+    assert pool([Summary(1, 0.3, None)]) == Summary(1, 0.3, None)
+
+
+def test_welch_t():
+    baseline, current = summarize([0.8, 0.9, 0.85, 0.95]), summarize([0.6, 0.7, 0.65])
+    t, df = welch_t(baseline, current)
+    a, b = baseline.std ** 2 / 4, current.std ** 2 / 3
+    assert t == pytest.approx((current.mean - baseline.mean) / (a + b) ** 0.5)
+    assert df == int((a + b) ** 2 / (a ** 2 / 3 + b ** 2 / 2))
+    assert welch_t(Summary(3, 0.5, 0.0), Summary(1, 0.4, None)) == (None, None)
+
+
+def test_significant_score_drop():
+    finding = evaluate("score", summarize([0.8, 0.9, 0.85, 0.95, 0.9]), summarize([0.6, 0.7, 0.65]))
+    assert finding.metric == "score" and finding.t_statistic < 0
+
+
+def test_no_finding():
+    baseline = summarize([0.8, 0.9, 0.85, 0.95, 0.9])
+    # Too small to matter
+    assert evaluate("score", baseline, summarize([0.86, 0.87, 0.85])) is None
+    # Large but within the noise
+    assert evaluate("score", summarize([0.1, 0.9, 0.5, 1.0, 0.2]), summarize([0.3, 0.6])) is None
+    # Better, not worse
+    assert evaluate("score", baseline, summarize([1.0, 1.0])) is None
+    # Not enough baseline
+    assert evaluate("score", summarize([0.9]), summarize([0.1])) is None
+    assert evaluate("score", baseline, summarize([])) is None
+
+
+def test_latency_increase_is_relative():
+    baseline = summarize([1000, 1100, 950, 1050])
+    assert evaluate("latency", baseline, summarize([1600, 1700, 1650])).metric == "latency"
+    # 20% slower is below the 25% minimum effect
+    assert evaluate("latency", baseline, summarize([1230, 1240, 1250])) is None
+    # Faster
+    assert evaluate("latency", baseline, summarize([500, 520])) is None
+
+
+def test_constant_series_flag_any_meaningful_change():
+    assert evaluate("cost", Summary(5, 0.01, 0.0), Summary(2, 0.02, 0.0)).t_statistic is None
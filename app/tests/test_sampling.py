@@ -0,0 +1,49 @@
+import statistics
+
+import pytest
+
+from benchmark import sampling
+
+
+@pytest.fixture(autouse=True)
+def defaults(monkeypatch):
+    monkeypatch.setattr(sampling, "TARGET_HALF_WIDTH", 0.05)
+    monkeypatch.setattr(sampling, "MAX_RUNS", 10)
+
+
+def test_t_critical():
+    assert sampling.t_critical(1) == 12.706
+    assert sampling.t_critical(30) == 2.042
+    assert sampling.t_critical(200) == 1.96
+
+
+def test_confidence_interval():
+    assert sampling.confidence_interval([0.7]) is None
+    low, high = sampling.confidence_interval([0.6, 0.8])
+    # t(1) * stdev / sqrt(2) = 12.706 * 0.1414 / 1.414
+    assert (low, high) == (pytest.approx(0.0), pytest.approx(1.0))
+    low, high = sampling.confidence_interval([0.7, 0.72, 0.68, 0.7])
+    width = 3.182 * statistics.stdev([0.7, 0.72, 0.68, 0.7]) / 2
+    assert (low, high) == (pytest.approx(0.7 - width), pytest.approx(0.7 + width))
+
+
+def test_stops_when_interval_is_tight():
+    assert sampling.next_batch_size([0.8, 0.8, 0.8], 3) == 0
+    assert sampling.next_batch_size([0.8, 0.81, 0.79, 0.8, 0.8], 5) == 0
+
+
+def test_sizes_next_batch_from_variance():
+    scores = [0.6, 0.8, 0.7]
+    needed = (4.303 * statistics.stdev(scores) / 0.05) ** 2
+    assert needed > 10
+    # Capped by the runs left before the limit
+    assert sampling.next_batch_size(scores, 3) == 7
+    # (4.303 * 0.0306 / 0.05) ** 2 = 6.9, so 7 runs in all
+    assert sampling.next_batch_size([0.70, 0.76, 0.72], 3) == 4
+
+
+def test_stops_at_limit_or_without_scores():
+    assert sampling.next_batch_size([0.1, 0.9, 0.5], 10) == 0
+    assert sampling.next_batch_size([0.1, 0.9, 0.5], 4, limit=4) == 0
+    assert sampling.next_batch_size([], 3) == 0
+    assert sampling.next_batch_size([0.5], 3) == 1
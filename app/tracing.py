@@ -0,0 +1,160 @@
+"""Lightweight nested timing spans for the benchmark pipeline.
+
+Spans nest through a context variable, so concurrent asyncio tasks each get their own
+parent chain. Finished traces can be appended to a JSON lines file (TRACE_EXPORT=json,
+TRACE_FILE=...) or sent to an OTLP/HTTP collector (TRACE_EXPORT=otlp,
+OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318).
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "benchmarking-llms"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.trace_id = self.root.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        if parent is None:
+            self.spans: List[Span] = []
+        self.root.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def depth(self) -> int:
+        return 0 if self.parent is None else self.parent.depth() + 1
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a child of the current span, or as a new trace if there is none"""
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = str(e)
+        raise
+    finally:
+        current.end = time.time()
+        _current_span.reset(token)
+        if parent is None:
+            export(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def summarize(root: Span) -> Dict[str, Any]:
+    """Waterfall summary of a trace: every span with its offset and duration relative to the root"""
+    return {
+        "trace_id": root.trace_id,
+        "total_ms": round(root.duration_ms, 1),
+        "spans": [
+            {
+                "name": s.name,
+                "depth": s.depth(),
+                "offset_ms": round((s.start - root.start) * 1000, 1),
+                "duration_ms": round(s.duration_ms, 1),
+                "error": s.error,
+                **({"attributes": s.attributes} if s.attributes else {}),
+            }
+            for s in sorted(root.spans, key=lambda s: s.start)
+        ],
+    }
+
+
+def export(root: Span) -> None:
+    mode = os.getenv("TRACE_EXPORT", "none").lower()
+    try:
+        if mode == "json":
+            _export_json(root)
+        elif mode == "otlp":
+            _export_otlp(root)
+    except Exception as e:
+        logger.warning(f"Failed to export trace {root.trace_id}: {e}")
+
+
+def _export_json(root: Span) -> None:
+    path = os.getenv("TRACE_FILE", "traces.jsonl")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(summarize(root), default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(root: Span) -> Dict[str, Any]:
+    spans = []
+    for s in root.spans:
+        otlp_span = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(s.start * 1e9)),
+            "endTimeUnixNano": str(int((s.end or time.time()) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent is not None:
+            otlp_span["parentSpanId"] = s.parent.span_id
+        spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+        }]
+    }
+
+
+def _export_otlp(root: Span) -> None:
+    import httpx
+
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+    payload = to_otlp(root)
+
+    def post():
+        try:
+            httpx.post(f"{endpoint}/v1/traces", json=payload, timeout=5)
+        except Exception as e:
+            logger.warning(f"Failed to send trace {root.trace_id} to {endpoint}: {e}")
+
+    # Don't block the event loop on the collector
+    try:
+        asyncio.get_running_loop().run_in_executor(None, post)
+    except RuntimeError:
+        post()